@@ -15,13 +15,50 @@ Características:
 
 import asyncio
 import os
+import re
 import sqlite3
 import sys
 from datetime import datetime, date, timedelta
-from typing import List, Tuple, Optional
-from playwright.async_api import async_playwright, Page
+from typing import Dict, List, Mapping, NamedTuple, Optional, Set, Tuple
+from playwright.async_api import async_playwright, Locator, Page
 from dotenv import load_dotenv
 
+from calendario_reservas import CalendarioReservas, parsear_fecha
+from captura_red import (
+    CapturaRed,
+    captura_red_activa,
+    disponibilidad_desde_json,
+    endpoint_disponibilidad,
+    endpoint_reservas,
+    reservas_desde_json,
+    respuesta_completa,
+)
+from cliente_demonio import delegar
+from cliente_http import (
+    ConsultaHttpFallida,
+    consulta_http_activa,
+    consultar_con_sesion_guardada,
+)
+from esperas_pagina import (
+    esperar_alerta,
+    esperar_quietud_dom,
+    esperar_respuesta,
+    esperar_selector,
+    imprimir_resumen_esperas,
+)
+from extraccion_tablas import extraer_columna, extraer_filas_kendo, extraer_tabla
+from perfil_navegador import abrir_navegador, crear_contexto, obtener_pagina
+from persistencia_async import cerrar_persistencias, obtener_persistencia
+from repositorio_reservaciones import (
+    DB_NAME,
+    Reserva,
+    ResultadoLote,
+    cerrar_repositorios,
+    obtener_repositorio,
+    reserva_desde_celdas,
+)
+from sesion_navegador import GestorSesion
+
 
 # ====================================================================
 # CONFIGURACIÓN Y CONSTANTES GLOBALES
@@ -41,10 +78,6 @@ NOMBRES_DIAS = {
     6: "Domingo",
 }
 
-# Base de datos SQLite
-DB_NAME = "reservaciones.db"
-
-
 # ====================================================================
 # FUNCIONES DE UTILIDAD Y VALIDACIÓN
 # ====================================================================
@@ -89,17 +122,26 @@ def validar_dias(dias: List[str]) -> List[int]:
     return dias_validos
 
 
-def configurar_variables_entorno() -> Tuple[List[str], List[int]]:
-    """Configura y valida las variables de entorno."""
+def configurar_variables_entorno(
+    valores: Optional[Mapping[str, Optional[str]]] = None,
+) -> Tuple[List[str], List[int]]:
+    """Configura y valida las variables de entorno.
+
+    `valores` permite leerlas de otro lado (p.ej. el `.env` de cada perfil del
+    orquestador) en lugar del entorno del proceso.
+    """
+    entorno = os.environ if valores is None else valores
     # Obtener lugares desde variable de entorno como lista
-    lugares_env = os.getenv("LUGARES_RESERVA", "P17-1001,P17-1002,P17-1003")
+    lugares_env = (
+        entorno.get("LUGARES_RESERVA", "P17-1001,P17-1002,P17-1003") or ""
+    )
     lugares_sin_validar = [
         lugar.strip() for lugar in lugares_env.split(",") if lugar.strip()
     ]
     lugares_disponibles = validar_lugares(lugares_sin_validar)
 
     # Obtener días desde variable de entorno como lista
-    dias_env = os.getenv("DIAS_RESERVA", "2,3")
+    dias_env = entorno.get("DIAS_RESERVA", "2,3") or ""
     dias_sin_validar = [dia.strip() for dia in dias_env.split(",") if dia.strip()]
     dias_reserva = validar_dias(dias_sin_validar)
 
@@ -137,142 +179,90 @@ def mostrar_configuracion(
 
 
 def inicializar_base_datos() -> None:
-    """Inicializa la base de datos SQLite para guardar las reservaciones."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
-    # Crear tabla de reservaciones si no existe
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS reservaciones (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            fecha_consulta TEXT NOT NULL,
-            columna_1 TEXT,
-            columna_2 TEXT,
-            columna_3 TEXT,
-            columna_4 TEXT,
-            columna_5 TEXT,
-            columna_6 TEXT,
-            columna_7 TEXT,
-            fecha_reserva TEXT,
-            columna_9 TEXT,
-            columna_10 TEXT,
-            fila_completa TEXT,
-            UNIQUE(fecha_reserva, columna_1, columna_2, columna_3)
-        )
-    """)
+    """Inicializa la base de datos SQLite para guardar las reservaciones.
 
-    conn.commit()
-    conn.close()
+    También archiva las reservas con más de `ARCHIVO_DIAS_RETENCION` días de
+    antigüedad (7 por omisión), para que la tabla activa sólo tenga lo vigente.
+    """
+    repo = obtener_repositorio(DB_NAME)
+    repo.inicializar()
     print("📊 Base de datos inicializada correctamente")
 
+    try:
+        dias_retencion = int(os.getenv("ARCHIVO_DIAS_RETENCION", "7"))
+        archivadas = repo.archivar(date.today() - timedelta(days=dias_retencion))
+        if archivadas:
+            print(f"🗄️ Reservaciones pasadas archivadas: {archivadas}")
+    except (sqlite3.Error, ValueError) as e:
+        print(f"⚠️ Error al archivar reservaciones pasadas: {e}")
+
 
 def guardar_reservacion(datos_fila: str, fecha_reserva: str) -> bool:
-    """Guarda una reservación en la base de datos."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    """Guarda una reservación (fila del grid unida por ' | ') en la base de datos."""
+    reserva = reserva_desde_celdas(datos_fila.split(" | "))
+    if reserva is None:
+        print(f"⚠️ Fila sin lugar o fecha válidos, no se guarda: {fecha_reserva}")
+        return False
 
     try:
-        # Dividir los datos de la fila en columnas
-        columnas = datos_fila.split(" | ")
-
-        # Asegurar que tenemos al menos 10 columnas, completar con cadena vacía si faltan
-        while len(columnas) < 10:
-            columnas.append("")
-
-        fecha_actual = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-        cursor.execute(
-            """
-            INSERT OR REPLACE INTO reservaciones 
-            (fecha_consulta, columna_1, columna_2, columna_3, columna_4, columna_5, 
-             columna_6, columna_7, fecha_reserva, columna_9, columna_10, fila_completa)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-            (
-                fecha_actual,
-                columnas[0] if len(columnas) > 0 else "",
-                columnas[1] if len(columnas) > 1 else "",
-                columnas[2] if len(columnas) > 2 else "",
-                columnas[3] if len(columnas) > 3 else "",
-                columnas[4] if len(columnas) > 4 else "",
-                columnas[5] if len(columnas) > 5 else "",
-                columnas[6] if len(columnas) > 6 else "",
-                fecha_reserva,
-                columnas[8] if len(columnas) > 8 else "",
-                columnas[9] if len(columnas) > 9 else "",
-                datos_fila,
-            ),
-        )
-
-        conn.commit()
+        obtener_repositorio(DB_NAME).guardar(reserva)
         return True
     except sqlite3.Error as e:
         print(f"❌ Error al guardar reservación: {e}")
         return False
-    finally:
-        conn.close()
 
 
-def mostrar_reservaciones_guardadas() -> None:
-    """Muestra las reservaciones guardadas en la base de datos."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+async def guardar_reservaciones_lote(
+    reservas: List[Reserva], completo_desde: Optional[date] = None
+) -> Optional[ResultadoLote]:
+    """Guarda todas las reservas en una sola transacción (en el hilo escritor).
 
+    Con `completo_desde`, las reservas activas desde esa fecha que no vienen
+    en `reservas` se marcan como inactivas (canceladas fuera de este script).
+    """
+    persistencia = obtener_persistencia(DB_NAME)
     try:
-        cursor.execute("""
-            SELECT fecha_consulta, fecha_reserva, columna_1, columna_2, columna_3, fila_completa 
-            FROM reservaciones 
-            ORDER BY fecha_reserva DESC
-        """)
+        return await persistencia.ejecutar(
+            persistencia.repo.guardar_lote, reservas, completo_desde=completo_desde
+        )
+    except sqlite3.Error as e:
+        print(f"❌ Error al guardar reservaciones en lote: {e}")
+        return None
+
 
-        reservaciones = cursor.fetchall()
+def mostrar_reservaciones_guardadas() -> None:
+    """Muestra las reservaciones guardadas en la base de datos."""
+    try:
+        reservaciones = obtener_repositorio(DB_NAME).listar()
 
         if reservaciones:
             print(
                 f"\n📋 Reservaciones guardadas en la base de datos ({len(reservaciones)}):"
             )
             print("-" * 80)
-            for reservacion in reservaciones:
-                fecha_consulta, fecha_reserva, col1, col2, col3, fila_completa = (
-                    reservacion
-                )
-                print(f"📅 {fecha_reserva} | {col1} | {col2} | {col3}")
-                print(f"   Consultado: {fecha_consulta}")
-                print(f"   Datos completos: {fila_completa}")
+            for reserva in reservaciones:
+                print(f"📅 {reserva.fecha_str} | {reserva.lugar} | {reserva.estado_str}")
+                print(f"   Consultado: {reserva.actualizado}")
+                print(f"   Detalle: {reserva.detalle}")
                 print("-" * 80)
         else:
             print("📋 No hay reservaciones guardadas en la base de datos")
 
     except sqlite3.Error as e:
         print(f"❌ Error al consultar la base de datos: {e}")
-    finally:
-        conn.close()
 
 
-def obtener_ultima_fecha_reservada() -> Optional[date]:
+async def obtener_ultima_fecha_reservada() -> Optional[date]:
     """Obtiene la fecha más reciente con reservaciones existentes desde la base de datos."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
+    persistencia = obtener_persistencia(DB_NAME)
     try:
-        cursor.execute("""
-            SELECT MAX(fecha_reserva) 
-            FROM reservaciones 
-            WHERE fecha_reserva >= date('now')
-        """)
-
-        resultado = cursor.fetchone()
+        fecha_obj = await persistencia.ejecutar(
+            persistencia.repo.ultima_fecha_reservada
+        )
 
-        if resultado and resultado[0]:
-            try:
-                # Convertir de DD/MM/YYYY a objeto date
-                fecha_str = resultado[0]
-                fecha_obj = datetime.strptime(fecha_str, "%d/%m/%Y").date()
-                print(f"📅 Última reservación encontrada: {fecha_str}")
-                return fecha_obj
-            except ValueError:
-                print(f"⚠️ Formato de fecha inválido en DB: {resultado[0]}")
-                return None
+        if fecha_obj:
+            print(f"📅 Última reservación encontrada: {fecha_obj.strftime('%d/%m/%Y')}")
+            return fecha_obj
         else:
             print("📅 No se encontraron reservaciones existentes")
             return None
@@ -280,13 +270,11 @@ def obtener_ultima_fecha_reservada() -> Optional[date]:
     except sqlite3.Error as e:
         print(f"❌ Error al consultar última fecha: {e}")
         return None
-    finally:
-        conn.close()
 
 
-def obtener_siguiente_fecha_disponible() -> date:
+async def obtener_siguiente_fecha_disponible() -> date:
     """Obtiene la siguiente fecha disponible para reservar (después de la última reservación)."""
-    ultima_fecha = obtener_ultima_fecha_reservada()
+    ultima_fecha = await obtener_ultima_fecha_reservada()
 
     if ultima_fecha:
         # Agregar un día a la última fecha reservada
@@ -309,87 +297,178 @@ def obtener_siguiente_fecha_disponible() -> date:
 # ====================================================================
 
 
+async def sincronizar_reservaciones(
+    filas_vigentes: List[Reserva],
+    reservaciones_omitidas: int,
+    total_leidas: int,
+    corte_temprano: bool = False,
+    fuente_confirmada: bool = True,
+) -> None:
+    """Guarda las reservas vigentes leídas del sitio e imprime el resumen.
+
+    `reservaciones_omitidas` son las de fecha pasada; `total_leidas`, todas
+    las que entregó el sitio (para saber si la lectura fue completa).
+    `fuente_confirmada` es False si los datos no se sabe que sean el grid
+    completo (p.ej. un JSON paginado).
+    """
+    # La foto del grid es completa si todas las filas se leyeron bien y se
+    # llegó a una fecha pasada (el rango futuro no quedó cortado por paginado).
+    # Sólo entonces las reservas que ya no aparecen se marcan como inactivas.
+    lectura_completa = (
+        fuente_confirmada
+        and reservaciones_omitidas > 0
+        and len(filas_vigentes) + reservaciones_omitidas == total_leidas
+    )
+
+    # Persistir todas las filas vigentes en una sola transacción
+    resultado = await guardar_reservaciones_lote(
+        filas_vigentes, completo_desde=date.today() if lectura_completa else None
+    )
+
+    print(f"\n📊 Resumen de consulta:")
+    if resultado is not None:
+        print(f"  🆕 Reservaciones nuevas: {resultado.insertadas}")
+        print(f"  ✏️ Reservaciones actualizadas: {resultado.actualizadas}")
+        print(f"  ✅ Reservaciones sin cambios: {resultado.sin_cambios}")
+        print(
+            f"  🚫 Reservaciones que ya no aparecen (inactivas): {len(resultado.desaparecidas)}"
+        )
+        for reserva in resultado.desaparecidas:
+            print(f"     • {reserva.fecha_str} | {reserva.lugar}")
+    print(f"  ⏭️ Reservaciones omitidas (fechas pasadas): {reservaciones_omitidas}")
+    print(f"  📋 Total procesadas: {len(filas_vigentes) + reservaciones_omitidas}")
+    if reservaciones_omitidas > 0 and corte_temprano:
+        print("  🚀 Optimización: Procesamiento detenido en primera fecha pasada")
+
+
+async def sincronizar_reservas_tipadas(
+    reservas: List[Reserva], fuente_confirmada: bool
+) -> None:
+    """Como `sincronizar_reservaciones`, para reservas ya parseadas (JSON, HTTP).
+
+    `fuente_confirmada` es False si no está probado que `reservas` sea la
+    lista completa del sitio; así no se marcan reservas como desaparecidas.
+    """
+    hoy = date.today()
+    vigentes = [r for r in reservas if r.fecha >= hoy]
+    await sincronizar_reservaciones(
+        vigentes,
+        len(reservas) - len(vigentes),
+        len(reservas),
+        fuente_confirmada=fuente_confirmada,
+    )
+
+
 async def consultar_reservaciones_actuales(page: Page) -> None:
     """Consulta las reservaciones actuales desde el sitio web y las guarda en la base de datos."""
     print("🔍 Consultando reservaciones actuales...")
 
+    # En modo captura de red se escucha el JSON que llena el grid desde antes
+    # de navegar, para no perder la respuesta
+    captura = CapturaRed(page) if captura_red_activa() else None
     try:
         # Navegar a la página de consulta de reservaciones
         await page.goto(
             "https://intranet.mx.deloitte.com/ReservacionesHoteling/ConsultarReservaciones",
             timeout=90000,
         )
-        await page.wait_for_timeout(5000)
-
-        # Esperar a que aparezca la tabla de reservaciones
-        await page.wait_for_selector(
-            "//div[@id='gridmisreservas']//table[1]/tbody/tr", timeout=30000
-        )
-
-        # Obtener todas las filas de la tabla
-        filas = await page.locator(
-            "//div[@id='gridmisreservas']//table[1]/tbody/tr"
-        ).all()
 
         fecha_hoy = date.today()
-        reservaciones_guardadas = 0
         reservaciones_omitidas = 0
+        # Reservas con fecha de hoy en adelante leídas del grid
+        filas_vigentes: List[Reserva] = []
 
-        print(f"📋 Encontradas {len(filas)} reservaciones para procesar")
+        reservas_red = (
+            await captura.esperar_datos(
+                reservas_desde_json, tope_ms=30000, endpoint=endpoint_reservas()
+            )
+            if captura is not None
+            else None
+        )
+        if reservas_red is not None:
+            # Datos tipados del JSON: no hace falta esperar a que se pinte el grid
+            filas: List[List[str]] = []
+            for reserva in reservas_red:
+                if reserva.fecha >= fecha_hoy:
+                    filas_vigentes.append(reserva)
+                else:
+                    reservaciones_omitidas += 1
+            print(
+                f"📋 Encontradas {len(reservas_red)} reservaciones en la respuesta del grid"
+            )
+        else:
+            if captura is not None:
+                print("⚠️ No se capturó el JSON del grid; leyendo el grid de la página")
 
-        for i, fila in enumerate(filas):
+            # Leer el dataSource del grid Kendo: trae todas las páginas del grid
+            # en una sola llamada, sin esperar a que se pinte la tabla
             try:
-                # Obtener todas las celdas de la fila
-                celdas = await fila.locator("td").all()
+                filas_kendo = await extraer_filas_kendo(
+                    page.locator("#gridmisreservas"), espera_ms=10000, columna_fecha=7
+                )
+            except Exception as e:
+                print(f"⚠️ No se pudo leer el modelo del grid: {e}")
+                filas_kendo = None
+
+            if filas_kendo is not None:
+                # Los datos vienen en el orden del dataSource: ordenar por fecha
+                # descendente como el grid para que el corte en la primera
+                # fecha pasada siga siendo válido
+                filas = sorted(
+                    filas_kendo,
+                    key=lambda c: (len(c) > 7 and parsear_fecha(c[7])) or date.min,
+                    reverse=True,
+                )
+                print(f"📋 Encontradas {len(filas)} reservaciones en el modelo del grid")
+            else:
+                # Sin widget Kendo: esperar a que aparezca la tabla y termine de pintarse
+                await page.wait_for_selector(
+                    "//div[@id='gridmisreservas']//table[1]/tbody/tr", timeout=30000
+                )
+                await esperar_quietud_dom(
+                    page, descripcion="grid de reservaciones", reemplaza_ms=5000
+                )
+
+                # Leer todas las filas de la tabla en una sola evaluación en la página
+                filas = await extraer_tabla(
+                    page.locator("//div[@id='gridmisreservas']//table[1]/tbody/tr")
+                )
 
-                if len(celdas) >= 8:  # Asegurar que tenemos al menos 8 columnas
-                    # Obtener el contenido de todas las celdas
-                    datos_celdas = []
-                    for celda in celdas:
-                        texto = await celda.inner_text()
-                        datos_celdas.append(texto.strip())
+                print(f"📋 Encontradas {len(filas)} reservaciones para procesar")
 
+        for i, datos_celdas in enumerate(filas):
+            try:
+                if len(datos_celdas) >= 8:  # Asegurar que tenemos al menos 8 columnas
                     # La columna 8 (índice 7) contiene la fecha
-                    if len(datos_celdas) > 7:
-                        fecha_str = datos_celdas[7]  # Columna 8 (índice 7)
-
-                        try:
-                            # Parsear la fecha en formato DD/MM/YYYY
-                            fecha_reserva = datetime.strptime(
-                                fecha_str, "%d/%m/%Y"
-                            ).date()
-
-                            # Solo procesar si la fecha es hoy o futura
-                            if fecha_reserva >= fecha_hoy:
-                                datos_fila = " | ".join(datos_celdas)
-
-                                if guardar_reservacion(datos_fila, fecha_str):
-                                    reservaciones_guardadas += 1
-                                    print(
-                                        f"✅ Reservación guardada: {fecha_str} - {datos_celdas[0] if datos_celdas else 'N/A'}"
-                                    )
-                                else:
-                                    print(
-                                        f"❌ Error al guardar reservación: {fecha_str}"
-                                    )
+                    fecha_str = datos_celdas[7]
+
+                    try:
+                        # Parsear la fecha en formato DD/MM/YYYY
+                        fecha_reserva = datetime.strptime(fecha_str, "%d/%m/%Y").date()
+
+                        # Solo procesar si la fecha es hoy o futura
+                        if fecha_reserva >= fecha_hoy:
+                            reserva = reserva_desde_celdas(datos_celdas)
+                            if reserva is not None:
+                                filas_vigentes.append(reserva)
                             else:
-                                # Primera fecha pasada encontrada - detener procesamiento
-                                reservaciones_omitidas += 1
-                                print(
-                                    f"⏭️ Primera reservación con fecha pasada encontrada: {fecha_str}"
-                                )
-                                print(
-                                    f"🛑 Deteniendo procesamiento - las siguientes {len(filas) - i - 1} reservaciones también serán fechas pasadas"
-                                )
-                                reservaciones_omitidas += (
-                                    len(filas) - i - 1
-                                )  # Contar las restantes como omitidas
-                                break  # Salir del bucle
-
-                        except ValueError:
-                            print(f"⚠️ Fecha inválida en fila {i + 1}: '{fecha_str}'")
-                    else:
-                        print(f"⚠️ Fila {i + 1} no tiene suficientes columnas")
+                                print(f"⚠️ Fila {i + 1} sin lugar válido")
+                        else:
+                            # Primera fecha pasada encontrada - detener procesamiento
+                            reservaciones_omitidas += 1
+                            print(
+                                f"⏭️ Primera reservación con fecha pasada encontrada: {fecha_str}"
+                            )
+                            print(
+                                f"🛑 Deteniendo procesamiento - las siguientes {len(filas) - i - 1} reservaciones también serán fechas pasadas"
+                            )
+                            reservaciones_omitidas += (
+                                len(filas) - i - 1
+                            )  # Contar las restantes como omitidas
+                            break  # Salir del bucle
+
+                    except ValueError:
+                        print(f"⚠️ Fecha inválida en fila {i + 1}: '{fecha_str}'")
                 else:
                     print(
                         f"⚠️ Fila {i + 1} no tiene el número mínimo de celdas requeridas"
@@ -398,23 +477,101 @@ async def consultar_reservaciones_actuales(page: Page) -> None:
             except Exception as e:
                 print(f"❌ Error procesando fila {i + 1}: {e}")
 
-        print(f"\n📊 Resumen de consulta:")
-        print(f"  ✅ Reservaciones guardadas: {reservaciones_guardadas}")
-        print(f"  ⏭️ Reservaciones omitidas (fechas pasadas): {reservaciones_omitidas}")
-        print(
-            f"  📋 Total procesadas: {reservaciones_guardadas + reservaciones_omitidas}"
+        await sincronizar_reservaciones(
+            filas_vigentes,
+            reservaciones_omitidas,
+            len(reservas_red) if reservas_red is not None else len(filas),
+            corte_temprano=reservas_red is None,
+            # Un JSON sólo cuenta como el grid completo si su origen se confirma
+            fuente_confirmada=(
+                reservas_red is None or respuesta_completa(captura.fuente)
+            ),
         )
-        if reservaciones_omitidas > 0:
-            print("  🚀 Optimización: Procesamiento detenido en primera fecha pasada")
 
     except Exception as e:
         print(f"❌ Error durante la consulta de reservaciones: {e}")
+    finally:
+        if captura is not None:
+            captura.detener()
 
 
 # ====================================================================
 # FUNCIONES DE RESERVA
 # ====================================================================
 
+# Filas de la tabla de fechas disponibles del lugar seleccionado
+SELECTOR_FILAS_FECHAS = "xpath=/html/body/section/main/div[2]/div/div/div/div[1]/div[1]/div[2]/div[2]/div[1]/div[2]/table/tbody/tr"
+
+
+class FilaFecha(NamedTuple):
+    """Fila de la tabla de fechas de un lugar, tomada de una sola lectura."""
+
+    indice: int
+    fecha_str: str
+    fecha: date
+    dia_semana: int
+    checkbox: Locator
+
+
+# Se ejecuta en la página: True cuando la tabla de fechas tiene `n` filas
+_JS_FILAS_PINTADAS = """
+([xpath, n]) => document.evaluate(
+    xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null
+).snapshotLength >= n
+"""
+
+
+async def capturar_filas_fechas(
+    page: Page, captura: Optional[CapturaRed] = None, lugar: Optional[str] = None
+) -> List[FilaFecha]:
+    """Foto de la tabla de fechas: índice, fecha, día de la semana y checkbox por fila.
+
+    Los textos se leen en una sola evaluación; el checkbox es un locator
+    ligado a la posición de la fila, así que hacer clic no requiere volver a
+    leer la tabla. Las filas sin fecha válida se omiten.
+
+    Con `captura` (escuchando desde antes de elegir el lugar), la respuesta
+    JSON de la tabla dice cuántas filas esperar antes de leerla y qué fechas
+    de `lugar` están ocupadas: ésas se omiten.
+    """
+    filas = page.locator(SELECTOR_FILAS_FECHAS)
+    ocupadas: Set[date] = set()
+    if captura is not None:
+        disponibilidad = await captura.esperar_datos(
+            disponibilidad_desde_json, tope_ms=15000, endpoint=endpoint_disponibilidad()
+        )
+        if disponibilidad is not None and lugar is not None:
+            disponibilidad = [d for d in disponibilidad if d.lugar == lugar] or None
+        if disponibilidad is None:
+            print("⚠️ No se capturó el JSON de fechas; leyendo la tabla de la página")
+        else:
+            ocupadas = {d.fecha for d in disponibilidad if not d.disponible}
+            try:
+                await page.wait_for_function(
+                    _JS_FILAS_PINTADAS,
+                    arg=[SELECTOR_FILAS_FECHAS[len("xpath=") :], len(disponibilidad)],
+                    timeout=15000,
+                )
+            except Exception as e:
+                print(f"⚠️ La tabla de fechas no mostró todas las filas: {e}")
+    foto: List[FilaFecha] = []
+    for indice, fecha_str in enumerate(await extraer_columna(filas, 0)):
+        fecha = parsear_fecha(fecha_str)
+        if fecha is None or fecha in ocupadas:
+            continue
+        foto.append(
+            FilaFecha(
+                indice=indice,
+                fecha_str=fecha_str,
+                fecha=fecha,
+                dia_semana=fecha.weekday(),
+                checkbox=filas.nth(indice).locator(
+                    "input[type='checkbox'][name='seleccionar']"
+                ),
+            )
+        )
+    return foto
+
 
 async def intentar_reserva_lugar(
     page: Page,
@@ -422,6 +579,8 @@ async def intentar_reserva_lugar(
     fecha_minima: Optional[date],
     dias_reserva: List[int],
     target_dates: Optional[List[str]] = None,
+    calendario: Optional[CalendarioReservas] = None,
+    prioridad: Optional[int] = None,
 ) -> Tuple[List[str], List[str]]:
     """Intenta reservar fechas para un lugar específico.
 
@@ -430,6 +589,9 @@ async def intentar_reserva_lugar(
       (>= fecha_minima y con día en `dias_reserva`) y las intenta reservar todas.
     - Si `target_dates` está provisto: sólo intentará reservar las fechas dentro de ese set
       (si aparecen en la tabla del lugar).
+    - Si `calendario` está provisto, se omiten las fechas que ya tienen reserva.
+    - Si `prioridad` está provista (posición del lugar en la lista, 1 = primero),
+      los éxitos y fallos se suman al resumen de intentos de la base de datos.
 
     Retorna una tupla (fechas_reservadas, fechas_pendientes) donde `fechas_pendientes`
     son las fechas de entrada que no se pudieron reservar (por alerta) o que no estaban
@@ -440,156 +602,180 @@ async def intentar_reserva_lugar(
     if fecha_minima:
         print(f"📅 Solo procesando fechas desde: {fecha_minima.strftime('%d/%m/%Y')}")
 
-    # Abrir dropdown y seleccionar lugar
-    await page.click(
-        "xpath= /html/body/section/main/div[2]/div/div/div/div[1]/form/div[4]/div/div[1]/span/span[1]/span/span[1]"
-    )
-    await page.wait_for_selector("#select2-lugaresDisponibles-results")
-    await page.click(f"#select2-lugaresDisponibles-results li:has-text('{lugar}')")
+    # En modo captura de red se escucha desde antes de elegir el lugar: la
+    # elección dispara la petición que llena la tabla de fechas
+    captura = CapturaRed(page) if captura_red_activa() else None
+    try:
+        # Abrir dropdown y seleccionar lugar
+        await page.click(
+            "xpath= /html/body/section/main/div[2]/div/div/div/div[1]/form/div[4]/div/div[1]/span/span[1]/span/span[1]"
+        )
+        await page.wait_for_selector("#select2-lugaresDisponibles-results")
+        await page.click(f"#select2-lugaresDisponibles-results li:has-text('{lugar}')")
 
-    print(f"✅ Lugar {lugar} seleccionado")
+        print(f"✅ Lugar {lugar} seleccionado")
 
-    # Obtener las filas de fechas disponibles para este lugar
-    filas = await page.locator(
-        "xpath=/html/body/section/main/div[2]/div/div/div/div[1]/div[1]/div[2]/div[2]/div[1]/div[2]/table/tbody/tr"
-    ).all()
+        # Foto única de la tabla de fechas de este lugar: una sola lectura de
+        # textos; la fase de clics va directo a las filas elegidas
+        foto = await capturar_filas_fechas(page, captura, lugar)
+    finally:
+        if captura is not None:
+            captura.detener()
 
     # Recolectar las fechas visibles que cumplen criterios (si target_dates no está dado)
-    fechas_visibles = []  # en formato 'DD/MM/YYYY' string
-    for fila in filas:
-        try:
-            celdas = await fila.locator("xpath=td").all()
-            datos_fila = " | ".join([await celda.inner_text() for celda in celdas])
-            fecha_str = datos_fila.split(" | ")[0]
-            fecha_obj = datetime.strptime(fecha_str, "%d/%m/%Y").date()
-            dia_semana = fecha_obj.weekday()
-
-            if fecha_minima and fecha_obj <= fecha_minima:
-                # Omitir fechas anteriores o iguales a la mínima
-                continue
+    fechas_visibles: Dict[str, FilaFecha] = {}
+    for fila in foto:
+        if fecha_minima and fila.fecha <= fecha_minima:
+            # Omitir fechas anteriores o iguales a la mínima
+            continue
 
-            if dia_semana in dias_reserva:
-                fechas_visibles.append(fecha_str)
-        except Exception:
+        if calendario is not None and calendario.esta_reservada(fila.fecha):
+            # Ya hay una reserva para ese día (DB o grid)
             continue
 
+        if fila.dia_semana in dias_reserva:
+            fechas_visibles.setdefault(fila.fecha_str, fila)
+
     # Si no se proporcionaron target_dates, intentamos todas las fechas visibles
     if target_dates is None:
-        target_dates = fechas_visibles
-
-    # Convertir a conjuntos para lógica eficiente
-    target_set = set(target_dates)
-    visibles_set = set(fechas_visibles)
-
-    # Las fechas que realmente intentaremos en este lugar son la intersección
-    fechas_a_intentar = sorted(
-        list(target_set & visibles_set), key=lambda s: datetime.strptime(s, "%d/%m/%Y")
+        target_dates = list(fechas_visibles)
+
+    # Las filas que realmente intentaremos en este lugar son la intersección,
+    # de la fecha más cercana a la más lejana (la tabla no siempre viene
+    # ordenada y las fechas próximas son las que primero se agotan)
+    objetivos = set(target_dates)
+    filas_a_intentar = sorted(
+        (fila for fila in fechas_visibles.values() if fila.fecha_str in objetivos),
+        key=lambda fila: fila.fecha,
     )
 
     fechas_reservadas = []
-    fechas_intentadas = set()
     fechas_fallidas = []
 
-    for fila in filas:
+    for fila in filas_a_intentar:
+        fecha_str = fila.fecha_str
         try:
-            celdas = await fila.locator("xpath=td").all()
-            datos_fila = " | ".join([await celda.inner_text() for celda in celdas])
-            fecha_str = datos_fila.split(" | ")[0]
-
-            if fecha_str not in fechas_a_intentar:
-                continue
-
-            fechas_intentadas.add(fecha_str)
+            await fila.checkbox.click()
 
+            # Detectar alerta que indique que el día está ocupado
+            # (sólo hasta que la página se aquiete tras el clic, máximo 3 s)
+            alerta_visible = False
             try:
-                checkbox = fila.locator("input[type='checkbox'][name='seleccionar']")
-                await checkbox.click()
-
-                # Detectar alerta que indique que el día está ocupado
+                alerta_visible = await esperar_alerta(
+                    page,
+                    "div.alert.alert-warning.fade.show",
+                    tope_ms=3000,
+                    descripcion=f"alerta tras marcar {fecha_str}",
+                )
+            except Exception:
                 alerta_visible = False
+
+            if alerta_visible:
+                alerta = page.locator(
+                    "div.alert.alert-warning.fade.show",
+                    has_text="No se puede reservar",
+                )
+                aux = ""
                 try:
-                    alerta_visible = await page.is_visible(
-                        "div.alert.alert-warning.fade.show", timeout=3000
-                    )
+                    aux = await alerta.inner_text()
                 except Exception:
-                    alerta_visible = False
+                    aux = "Día ocupado"
 
-                if alerta_visible:
-                    alerta = page.locator(
-                        "div.alert.alert-warning.fade.show",
-                        has_text="No se puede reservar",
-                    )
-                    aux = ""
-                    try:
-                        aux = await alerta.inner_text()
-                    except Exception:
-                        aux = "Día ocupado"
-
-                    # Desmarcar checkbox y marcar como fallo
-                    try:
-                        await checkbox.click()
-                    except Exception:
-                        pass
+                # Desmarcar checkbox y marcar como fallo
+                try:
+                    await fila.checkbox.click()
+                except Exception:
+                    pass
 
-                    print(f"❌ Día ocupado para {lugar}: {aux}")
-                    # esperar a que la alerta desaparezca para dejar la página limpia
-                    try:
-                        await page.wait_for_selector(
-                            "div.alert.alert-warning.fade.show",
-                            state="detached",
-                            timeout=8000,
-                        )
-                    except Exception:
-                        pass
-
-                    fechas_fallidas.append(fecha_str)
-                    continue
-                else:
-                    dia_nombre = NOMBRES_DIAS[
-                        datetime.strptime(fecha_str, "%d/%m/%Y").weekday()
-                    ]
-                    print(
-                        f"✅ Día reservado exitosamente para {lugar} ({dia_nombre}): {fecha_str}"
+                print(f"❌ Día ocupado para {lugar}: {aux}")
+                # esperar a que la alerta desaparezca para dejar la página limpia
+                try:
+                    await page.wait_for_selector(
+                        "div.alert.alert-warning.fade.show",
+                        state="detached",
+                        timeout=8000,
                     )
-                    fechas_reservadas.append(fecha_str)
+                except Exception:
+                    pass
 
-            except Exception as e:
-                print(f"❌ Error intentando reservar {fecha_str} en {lugar}: {e}")
                 fechas_fallidas.append(fecha_str)
+                continue
+            else:
+                dia_nombre = NOMBRES_DIAS[fila.dia_semana]
+                print(
+                    f"✅ Día reservado exitosamente para {lugar} ({dia_nombre}): {fecha_str}"
+                )
+                fechas_reservadas.append(fecha_str)
+                if calendario is not None:
+                    calendario.marcar(fila.fecha, lugar)
 
-        except Exception:
-            continue
+        except Exception as e:
+            print(f"❌ Error intentando reservar {fecha_str} en {lugar}: {e}")
+            fechas_fallidas.append(fecha_str)
 
     # Las fechas pendientes que devolvemos son las del target_set que no fueron reservadas
-    pendientes = [d for d in target_dates if d not in fechas_reservadas]
+    reservadas_set = set(fechas_reservadas)
+    pendientes = [d for d in target_dates if d not in reservadas_set]
 
     # Resumen
     print(
         f"📊 Resumen para {lugar}: reservadas={len(fechas_reservadas)} fallidas={len(fechas_fallidas)} pendientes_totales={len(pendientes)}"
     )
 
+    if prioridad is not None:
+        try:
+            persistencia = obtener_persistencia()
+            await persistencia.ejecutar(
+                persistencia.repo.registrar_intentos,
+                lugar,
+                prioridad,
+                [fechas_visibles[f].fecha for f in fechas_reservadas],
+                [fechas_visibles[f].fecha for f in fechas_fallidas],
+            )
+        except sqlite3.Error as e:
+            print(f"⚠️ Error al registrar intentos de {lugar}: {e}")
+
     return fechas_reservadas, pendientes
 
 
+def _en_pagina_reservacion(page: Page) -> bool:
+    return page.url.split("?")[0].rstrip("/").endswith(
+        "/ReservacionesHoteling/Reservacion"
+    )
+
+
 async def realizar_proceso_reserva(
     page: Page,
     lugares_disponibles: List[str],
     dias_reserva: List[int],
     fecha_minima: Optional[date],
+    calendario: Optional[CalendarioReservas] = None,
+    consulta: Optional[Page] = None,
 ) -> bool:
-    """Realiza el proceso completo de reserva con todos los lugares configurados."""
+    """Realiza el proceso completo de reserva con todos los lugares configurados.
+
+    Las consultas intermedias usan `consulta` (por omisión, la misma página).
+    """
+    consulta = consulta or page
     print(
         f"\n🚀 Iniciando proceso de reserva desde {fecha_minima.strftime('%d/%m/%Y') if fecha_minima else 'hoy'}"
     )
 
     # await page.click("xpath=//h5[contains(text(),'Solicitar reservación')]")
-    await page.goto(
-        "https://intranet.mx.deloitte.com/ReservacionesHoteling/Reservacion",
-        timeout=90000,
+    # Una página que ya está en Reservacion (la del demonio) no se recarga
+    if not _en_pagina_reservacion(page):
+        await page.goto(
+            "https://intranet.mx.deloitte.com/ReservacionesHoteling/Reservacion",
+            timeout=90000,
+        )
+    await esperar_selector(
+        page,
+        "#select2-tipoLugar-container",
+        tope_ms=30000,
+        descripcion="formulario de reservación",
+        reemplaza_ms=15000,
     )
-    await page.wait_for_timeout(5000)
-
-    await page.wait_for_timeout(10000)
+    await esperar_quietud_dom(page, descripcion="formulario de reservación estable")
 
     print("👤 Seleccionando tipo de usuario Staff...")
 
@@ -623,14 +809,26 @@ async def realizar_proceso_reserva(
         if i == 0:
             # Primer lugar: no limitamos target_dates (el método recolectará las fechas visibles)
             reservadas, pendientes = await intentar_reserva_lugar(
-                page, lugar, fecha_minima, dias_reserva, target_dates=None
+                page,
+                lugar,
+                fecha_minima,
+                dias_reserva,
+                target_dates=None,
+                calendario=calendario,
+                prioridad=i + 1,
             )
         else:
             if not fechas_pendientes:
                 # Si no quedan pendientes, nada más por intentar
                 break
             reservadas, pendientes = await intentar_reserva_lugar(
-                page, lugar, fecha_minima, dias_reserva, target_dates=fechas_pendientes
+                page,
+                lugar,
+                fecha_minima,
+                dias_reserva,
+                target_dates=fechas_pendientes,
+                calendario=calendario,
+                prioridad=i + 1,
             )
 
         todas_reservadas.extend(reservadas)
@@ -645,12 +843,14 @@ async def realizar_proceso_reserva(
             except Exception as e:
                 print(f"⚠️ Error al confirmar reservas en {lugar}: {e}")
 
-            # Pequeña espera para que el servidor procese la reservación
-            await page.wait_for_timeout(3000)
+            # Esperar a que la página termine de reflejar la reservación
+            await esperar_quietud_dom(
+                page, descripcion="página tras confirmar", reemplaza_ms=3000
+            )
 
             # Actualizar la base de datos/local view consultando reservaciones actuales
             try:
-                await consultar_reservaciones_actuales(page)
+                await consultar_reservaciones_actuales(consulta)
             except Exception as e:
                 print(
                     f"⚠️ Error al consultar/actualizar reservaciones después de confirmar: {e}"
@@ -658,11 +858,18 @@ async def realizar_proceso_reserva(
 
             # Volver a la página de reservación y re-seleccionar tipo 'Staff' para continuar
             try:
-                await page.goto(
-                    "https://intranet.mx.deloitte.com/ReservacionesHoteling/Reservacion",
-                    timeout=90000,
+                if not _en_pagina_reservacion(page):
+                    await page.goto(
+                        "https://intranet.mx.deloitte.com/ReservacionesHoteling/Reservacion",
+                        timeout=90000,
+                    )
+                await esperar_selector(
+                    page,
+                    "#select2-tipoLugar-container",
+                    tope_ms=30000,
+                    descripcion="formulario de reservación",
+                    reemplaza_ms=5000,
                 )
-                await page.wait_for_timeout(5000)
                 try:
                     await page.wait_for_selector("#btnCerrarPredictivo", timeout=5000)
                     await page.click("#btnCerrarPredictivo", timeout=3000)
@@ -676,7 +883,9 @@ async def realizar_proceso_reserva(
 
         if fechas_pendientes and i < len(lugares_disponibles) - 1:
             print("🔄 Quedan fechas pendientes, intentando en el siguiente lugar...")
-            await page.wait_for_timeout(2000)
+            await esperar_quietud_dom(
+                page, descripcion="página entre lugares", reemplaza_ms=2000
+            )
         elif not fechas_pendientes:
             print("🎉 Se reservaron todas las fechas objetivo.")
             reserva_exitosa = len(todas_reservadas) > 0
@@ -698,15 +907,58 @@ async def realizar_proceso_reserva(
     return reserva_exitosa
 
 
+# Botón "Reservar" del formulario de reservación
+BOTON_RESERVAR = "xpath=/html/body/section/main/div[2]/div/div/div/div[1]/div[1]/div[2]/div[3]/div/div/button"
+
+
+def patron_endpoint_reservar() -> Optional["re.Pattern[str]"]:
+    """Expresión de la URL del endpoint de reserva (`RESERVA_ENDPOINT` en el .env).
+
+    None si no está configurado: el endpoint real no se conoce y otros POST
+    del sitio (búsquedas, lecturas del grid) no confirman nada.
+    """
+    patron = os.getenv("RESERVA_ENDPOINT")
+    return re.compile(patron, re.IGNORECASE) if patron else None
+
+
 async def finalizar_reserva(page: Page) -> None:
     """Finaliza el proceso de reserva haciendo clic en el botón Reservar."""
     try:
         print("💾 Finalizando reserva...")
-        await page.click(
-            "xpath=/html/body/section/main/div[2]/div/div/div/div[1]/div[1]/div[2]/div[3]/div/div/button"
-        )
-        print("✅ Clic en el botón 'Reservar' realizado.")
-        await page.wait_for_timeout(25000)
+        patron = patron_endpoint_reservar()
+        if patron is None:
+            # Sin endpoint conocido se espera la alerta del sitio (o que la
+            # página cambie) con el tope completo de antes, sin ventana de quietud
+            print(
+                "ℹ️ RESERVA_ENDPOINT no configurado: no se espera la respuesta del"
+                " endpoint, sólo la alerta del sitio (hasta 25 s)"
+            )
+            await page.click(BOTON_RESERVAR)
+            print("✅ Clic en el botón 'Reservar' realizado.")
+            await esperar_alerta(
+                page,
+                "div.alert.fade.show",
+                quietud_ms=None,
+                tope_ms=25000,
+                descripcion="alerta tras 'Reservar'",
+            )
+            return
+        # Esperar la respuesta del servidor a la reservación en vez de 25 s fijos
+        async with esperar_respuesta(
+            page,
+            patron,
+            metodo="POST",
+            tope_ms=25000,
+            descripcion="respuesta de 'Reservar'",
+            reemplaza_ms=25000,
+        ) as respuestas:
+            await page.click(BOTON_RESERVAR)
+            print("✅ Clic en el botón 'Reservar' realizado.")
+        if not respuestas:
+            print("⚠️ No llegó la respuesta del endpoint de reserva")
+        elif respuestas[0].status >= 400:
+            print(f"⚠️ El endpoint de reserva respondió {respuestas[0].status}")
+        await esperar_quietud_dom(page, descripcion="página tras 'Reservar'")
     except Exception as e:
         print(f"⚠️ Error al finalizar: {e}")
 
@@ -716,6 +968,49 @@ async def finalizar_reserva(page: Page) -> None:
 # ====================================================================
 
 
+async def reservar_en_pagina(
+    page: Page,
+    lugares_disponibles: List[str],
+    dias_reserva: List[int],
+    consulta: Optional[Page] = None,
+) -> bool:
+    """Pasos 1 a 5 del proceso de reserva sobre una página ya autenticada.
+
+    La usan `ejecutar_proceso_completo` y el demonio (con su página abierta).
+    Con `consulta`, las consultas de reservaciones se hacen en esa otra
+    página y `page` se queda en Reservacion: la página residente del demonio
+    se aprovecha sin recargarla.
+    """
+    consulta = consulta or page
+
+    # PASO 1: Consultar reservaciones existentes primero
+    print("🔍 PASO 1: Consultando reservaciones existentes...")
+    await consultar_reservaciones_actuales(consulta)
+
+    # PASO 2: Determinar fecha mínima para nuevas reservas y cargar
+    # (una sola vez) el índice de fechas ya reservadas
+    fecha_minima = await obtener_siguiente_fecha_disponible()
+    persistencia = obtener_persistencia(DB_NAME)
+    calendario = await persistencia.ejecutar(
+        CalendarioReservas.desde_repositorio, persistencia.repo
+    )
+
+    # PASO 3: Proceder con las reservas normales
+    reserva_exitosa = await realizar_proceso_reserva(
+        page, lugares_disponibles, dias_reserva, fecha_minima, calendario, consulta
+    )
+
+    # PASO 4: Finalizar reserva si fue exitosa
+    if reserva_exitosa:
+        await finalizar_reserva(page)
+
+        # PASO 5: Actualizar la base de datos con las nuevas reservas
+        print("\n🔄 PASO 4: Actualizando base de datos con nuevas reservas...")
+        await consultar_reservaciones_actuales(consulta)
+
+    return reserva_exitosa
+
+
 async def ejecutar_proceso_completo() -> None:
     """Función principal que ejecuta el proceso completo de reserva."""
     # Configurar variables de entorno
@@ -728,9 +1023,10 @@ async def ejecutar_proceso_completo() -> None:
     inicializar_base_datos()
 
     async with async_playwright() as playwright:
-        browser = await playwright.chromium.launch(headless=False)
-        context = await browser.new_context(ignore_https_errors=True)
-        page = await context.new_page()
+        browser = await abrir_navegador(playwright, headless=False)
+        sesion = GestorSesion()
+        context = await crear_contexto(browser, **await sesion.opciones_contexto())
+        page = await obtener_pagina(context)
 
         try:
             print("🌐 Navegando al sitio de reservas...")
@@ -743,31 +1039,21 @@ async def ejecutar_proceso_completo() -> None:
                 timeout=90000,
             )
 
-            # PASO 1: Consultar reservaciones existentes primero
-            print("🔍 PASO 1: Consultando reservaciones existentes...")
-            await consultar_reservaciones_actuales(page)
-
-            # PASO 2: Determinar fecha mínima para nuevas reservas
-            fecha_minima = obtener_siguiente_fecha_disponible()
-
-            # PASO 3: Proceder con las reservas normales
-            reserva_exitosa = await realizar_proceso_reserva(
-                page, lugares_disponibles, dias_reserva, fecha_minima
+            # Sesión autenticada: guardarla para la próxima ejecución y
+            # mantenerla fresca mientras el navegador siga abierto
+            await sesion.guardar(
+                context, page, "xpath=//h3[contains(text(),'Solicitar reservación')]"
             )
+            sesion.refrescar_en_segundo_plano(context)
 
-            # PASO 4: Finalizar reserva si fue exitosa
-            if reserva_exitosa:
-                await finalizar_reserva(page)
-
-                # PASO 5: Actualizar la base de datos con las nuevas reservas
-                print("\n🔄 PASO 4: Actualizando base de datos con nuevas reservas...")
-                await consultar_reservaciones_actuales(page)
+            await reservar_en_pagina(page, lugares_disponibles, dias_reserva)
 
         except Exception as e:
             print(f"❌ Error durante el proceso de reserva: {e}")
         finally:
             await browser.close()
             print("🔒 Navegador cerrado")
+            imprimir_resumen_esperas()
 
 
 async def consultar_reservaciones_main() -> None:
@@ -775,10 +1061,24 @@ async def consultar_reservaciones_main() -> None:
     # Inicializar base de datos
     inicializar_base_datos()
 
+    # Intentar primero sin navegador, con las cookies de la última sesión
+    if consulta_http_activa():
+        try:
+            consulta = await asyncio.to_thread(consultar_con_sesion_guardada)
+        except (ConsultaHttpFallida, OSError) as e:
+            print(f"ℹ️ Consulta HTTP no disponible ({e}); usando el navegador")
+        else:
+            await sincronizar_reservas_tipadas(
+                consulta.reservas, fuente_confirmada=consulta.completa
+            )
+            mostrar_reservaciones_guardadas()
+            return
+
     async with async_playwright() as playwright:
-        browser = await playwright.chromium.launch(headless=False)
-        context = await browser.new_context(ignore_https_errors=True)
-        page = await context.new_page()
+        browser = await abrir_navegador(playwright, headless=False)
+        sesion = GestorSesion()
+        context = await crear_contexto(browser, **await sesion.opciones_contexto())
+        page = await obtener_pagina(context)
 
         try:
             print("🌐 Navegando al sitio de reservas para consulta...")
@@ -791,6 +1091,12 @@ async def consultar_reservaciones_main() -> None:
                 timeout=90000,
             )
 
+            # Guardar la sesión para que la próxima consulta no pida login
+            # (y pueda hacerse por HTTP sin abrir el navegador)
+            await sesion.guardar(
+                context, page, "xpath=//h5[contains(text(),'Solicitar reservación')]"
+            )
+
             # Ir directamente a consultar reservaciones
             await consultar_reservaciones_actuales(page)
 
@@ -802,6 +1108,7 @@ async def consultar_reservaciones_main() -> None:
         finally:
             await browser.close()
             print("🔒 Navegador cerrado")
+            imprimir_resumen_esperas()
 
 
 # ====================================================================
@@ -811,16 +1118,27 @@ async def consultar_reservaciones_main() -> None:
 
 def main() -> None:
     """Punto de entrada principal del programa."""
+    # Si el demonio está corriendo, él atiende la operación con su navegador
+    # ya abierto (python demonio.py)
+    consultar = len(sys.argv) > 1 and sys.argv[1] == "--consultar"
+    if delegar("sincronizar" if consultar else "reservar") is not None:
+        return
+
     # Verificar si se solicita consultar reservaciones
-    if len(sys.argv) > 1 and sys.argv[1] == "--consultar":
-        print("🔍 Modo consulta de reservaciones activado")
-        asyncio.run(consultar_reservaciones_main())
-    else:
-        print("🚀 Modo reserva normal activado")
-        print(
-            "💡 Para consultar reservaciones existentes, usa: python CargaLugar.py --consultar"
-        )
-        asyncio.run(ejecutar_proceso_completo())
+    try:
+        if consultar:
+            print("🔍 Modo consulta de reservaciones activado")
+            asyncio.run(consultar_reservaciones_main())
+        else:
+            print("🚀 Modo reserva normal activado")
+            print(
+                "💡 Para consultar reservaciones existentes, usa: python CargaLugar.py --consultar"
+            )
+            asyncio.run(ejecutar_proceso_completo())
+    finally:
+        # Aplicar escrituras pendientes y cerrar la conexión compartida
+        cerrar_persistencias()
+        cerrar_repositorios()
 
 
 if __name__ == "__main__":
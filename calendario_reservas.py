@@ -0,0 +1,132 @@
+"""
+Índice en memoria de fechas ya reservadas.
+
+Se construye una sola vez por ejecución (desde la base de datos y, si se
+tiene, desde el grid del sitio) y responde "¿esta fecha ya está reservada?"
+en O(1), sin volver a parsear cadenas DD/MM/YYYY. Internamente guarda un
+mapa de bits por ordinal de día: uno general y uno por lugar.
+
+Uso típico:
+
+    calendario = CalendarioReservas.desde_repositorio(obtener_repositorio(), hoy)
+    calendario.marcar_fechas(fechas_del_grid)
+    pendientes = [f for f in objetivos if not calendario.esta_reservada(f)]
+"""
+
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Union
+
+from repositorio_reservaciones import FORMATO_FECHA_SITIO, RepositorioReservaciones
+
+
+FechaLike = Union[date, str]
+
+
+@lru_cache(maxsize=4096)
+def parsear_fecha(fecha_str: str) -> Optional[date]:
+    """Parsea DD/MM/YYYY (ignorando sufijos como la hora) con caché; None si no es válida."""
+    try:
+        solo_fecha = fecha_str.strip().split(" ")[0]
+        return datetime.strptime(solo_fecha, FORMATO_FECHA_SITIO).date()
+    except (ValueError, IndexError):
+        return None
+
+
+def _a_ordinal(fecha: FechaLike) -> Optional[int]:
+    if isinstance(fecha, date):
+        return fecha.toordinal()
+    parsed = parsear_fecha(fecha)
+    return parsed.toordinal() if parsed else None
+
+
+class _MapaBits:
+    """Conjunto de ordinales de día respaldado por un bytearray que crece a demanda."""
+
+    __slots__ = ("base", "bits")
+
+    def __init__(self, base: int) -> None:
+        self.base = base
+        self.bits = bytearray()
+
+    def agregar(self, ordinal: int) -> None:
+        if ordinal < self.base:
+            # Extender hacia atrás (raro: fechas anteriores a la base)
+            faltan = (self.base - ordinal + 7) // 8
+            self.bits[:0] = bytes(faltan)
+            self.base -= faltan * 8
+        pos = ordinal - self.base
+        byte = pos >> 3
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(byte - len(self.bits) + 1))
+        self.bits[byte] |= 1 << (pos & 7)
+
+    def contiene(self, ordinal: int) -> bool:
+        pos = ordinal - self.base
+        if pos < 0:
+            return False
+        byte = pos >> 3
+        return byte < len(self.bits) and bool(self.bits[byte] & (1 << (pos & 7)))
+
+    def __len__(self) -> int:
+        return sum(bin(b).count("1") for b in self.bits)
+
+
+class CalendarioReservas:
+    """Fechas reservadas, en general y por lugar, indexadas por ordinal de día."""
+
+    def __init__(self, base: Optional[date] = None) -> None:
+        self._base = (base or date.today()).toordinal()
+        self._general = _MapaBits(self._base)
+        self._por_lugar: Dict[str, _MapaBits] = {}
+
+    @classmethod
+    def desde_repositorio(
+        cls, repo: RepositorioReservaciones, desde: Optional[date] = None
+    ) -> "CalendarioReservas":
+        """Carga las reservas activas desde `desde` (hoy por omisión)."""
+        desde = desde or date.today()
+        calendario = cls(desde)
+        for lugar, dia in repo.dias_reservados(desde):
+            calendario._marcar_ordinal(dia, lugar)
+        return calendario
+
+    def _marcar_ordinal(self, ordinal: int, lugar: Optional[str] = None) -> None:
+        self._general.agregar(ordinal)
+        if lugar:
+            mapa = self._por_lugar.get(lugar)
+            if mapa is None:
+                mapa = self._por_lugar[lugar] = _MapaBits(self._base)
+            mapa.agregar(ordinal)
+
+    def marcar(self, fecha: FechaLike, lugar: Optional[str] = None) -> bool:
+        """Marca `fecha` como reservada (opcionalmente para `lugar`).
+
+        Devuelve False si la fecha no se pudo interpretar.
+        """
+        ordinal = _a_ordinal(fecha)
+        if ordinal is None:
+            return False
+        self._marcar_ordinal(ordinal, lugar)
+        return True
+
+    def marcar_fechas(self, fechas: Iterable[FechaLike]) -> None:
+        """Marca varias fechas (p.ej. las leídas del grid del sitio)."""
+        for fecha in fechas:
+            self.marcar(fecha)
+
+    def esta_reservada(self, fecha: FechaLike, lugar: Optional[str] = None) -> bool:
+        """True si `fecha` ya está reservada (en cualquier lugar, o en `lugar`)."""
+        ordinal = _a_ordinal(fecha)
+        if ordinal is None:
+            return False
+        if lugar is None:
+            return self._general.contiene(ordinal)
+        mapa = self._por_lugar.get(lugar)
+        return mapa is not None and mapa.contiene(ordinal)
+
+    def __contains__(self, fecha: FechaLike) -> bool:
+        return self.esta_reservada(fecha)
+
+    def __len__(self) -> int:
+        return len(self._general)
@@ -17,9 +17,10 @@ Opciones:
 
 Notas:
  - La página puede requerir autenticación previa en la intranet; este
-   script no realiza login automático. Ejecutar desde una sesión donde
-   la intranet ya esté accesible o agregar pasos de autenticación según
-   necesidad.
+   script no realiza login automático. Reutiliza la sesión guardada por
+   cualquier script del proyecto (`sesion_navegador.json`, ver
+   `sesion_navegador.py`); sin ella, iniciar sesión en la ventana del
+   navegador.
 """
 
 import asyncio
@@ -35,6 +36,15 @@ from playwright.async_api import (
 )
 from dotenv import load_dotenv
 
+from cliente_demonio import delegar
+from perfil_navegador import (
+    abrir_navegador,
+    crear_contexto,
+    es_contexto_prestado,
+    obtener_pagina,
+)
+from sesion_navegador import GestorSesion
+
 
 # Cargar .env si existe
 load_dotenv()
@@ -254,9 +264,10 @@ async def main(headless: bool = False, url: Optional[str] = None) -> None:
     url = url or TARGET_URL
 
     async with async_playwright() as playwright:
-        browser = await playwright.chromium.launch(headless=headless)
-        context = await browser.new_context(ignore_https_errors=True)
-        page = await context.new_page()
+        browser = await abrir_navegador(playwright, headless=headless)
+        sesion = GestorSesion()
+        context = await crear_contexto(browser, **await sesion.opciones_contexto())
+        page = await obtener_pagina(context)
 
         try:
             print(f"🌐 Navegando a: {url}")
@@ -274,6 +285,10 @@ async def main(headless: bool = False, url: Optional[str] = None) -> None:
                     "⚠️ No se detectó la tabla de reservaciones; se buscarán botones igualmente"
                 )
 
+            # La página cargó autenticada: guardar la sesión para la próxima vez
+            await sesion.guardar(context, page, "#gridmisreservas")
+            sesion.refrescar_en_segundo_plano(context)
+
             # Ejecutar la cancelación iterativa
             total = await cancelar_todas(page)
             print(f"🎯 Intentos de cancelación realizados: {total}")
@@ -281,10 +296,14 @@ async def main(headless: bool = False, url: Optional[str] = None) -> None:
         except Exception as e:
             print(f"❌ Error general en el proceso: {e}")
         finally:
-            await context.close()
+            # El contexto del navegador del usuario (CDP) no se cierra
+            if not es_contexto_prestado(context):
+                await context.close()
             await browser.close()
 
 
 if __name__ == "__main__":
     # headless_flag = "--headless" in sys.argv
-    asyncio.run(main(headless=False))
+    # Con el demonio corriendo se cancela en su navegador ya abierto
+    if delegar("cancelar") is None:
+        asyncio.run(main(headless=False))
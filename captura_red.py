@@ -0,0 +1,353 @@
+"""
+Captura de las respuestas JSON (XHR/fetch) que alimentan las tablas del sitio.
+
+El grid `gridmisreservas` de ConsultarReservaciones y las tablas de lugares y
+fechas de Reservacion se llenan con peticiones asíncronas. En lugar de esperar
+a que el HTML se pinte y leer celdas de texto, `CapturaRed` escucha las
+respuestas de la página y guarda los cuerpos JSON; los parsers de abajo
+convierten esos datos en objetos tipados (`Reserva`, `Disponibilidad`).
+
+Los nombres de los campos del JSON no están documentados: se buscan entre
+varios candidatos (`CAMPOS_LUGAR`, `CAMPOS_FECHA`, ...) sin distinguir
+mayúsculas. Si una respuesta no tiene la forma esperada el parser devuelve
+None y el llamador sigue con la lectura del HTML.
+
+Sólo se aceptan los datos del endpoint que llena cada tabla
+(`endpoint_reservas()`, `endpoint_disponibilidad()`): otra respuesta del
+sitio con registros parecidos no se confunde con el grid. Aun así, una
+lectura JSON sólo cuenta como foto completa del grid (`respuesta_completa`)
+si vino de ese endpoint con 200 y sin paginar.
+
+Se activa con `CAPTURA_RED=1` en el `.env`:
+
+    captura = CapturaRed(page)
+    await page.goto(URL_CONSULTA)
+    reservas = await captura.esperar_datos(
+        reservas_desde_json, tope_ms=15000, endpoint=endpoint_reservas()
+    )
+    if reservas is None:
+        ...  # leer el grid HTML como antes
+"""
+
+import asyncio
+import os
+import re
+import time
+from datetime import date, datetime, timedelta
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Pattern,
+    Sequence,
+    TypeVar,
+)
+
+from playwright.async_api import Page, Response
+
+from calendario_reservas import parsear_fecha
+from repositorio_reservaciones import (
+    ESTADO_ACTIVA,
+    ESTADO_CANCELADA,
+    FORMATO_FECHA_SITIO,
+    Reserva,
+    detalle_reserva,
+)
+
+T = TypeVar("T")
+
+# Subcadena de URL de las peticiones del sitio que interesa capturar
+PATRON_SITIO = "ReservacionesHoteling"
+
+# Endpoints de datos de cada tabla (acciones de su controlador), ajustables
+# con CAPTURA_ENDPOINT_RESERVAS / CAPTURA_ENDPOINT_DISPONIBILIDAD
+PATRON_GRID_RESERVAS = r"/ReservacionesHoteling/ConsultarReservaciones/\w+"
+PATRON_DISPONIBILIDAD = r"/ReservacionesHoteling/Reservacion/\w+"
+
+# Total de registros que declara una respuesta paginada (Kendo DataSourceResult)
+_LLAVES_TOTAL = ("Total", "total", "TotalCount", "totalCount")
+
+# Campos candidatos (en orden de preferencia) de cada dato en el JSON
+CAMPOS_LUGAR = ("Lugar", "NombreLugar", "ClaveLugar", "Espacio", "NumeroLugar")
+CAMPOS_FECHA = ("Fecha", "FechaReservacion", "FechaReserva", "FechaInicio", "Dia")
+CAMPOS_ESTADO = (
+    "Estatus", "Estado", "Status", "EstatusReservacion", "Disponibilidad"
+)
+CAMPOS_DISPONIBLE = ("Disponible", "EsDisponible", "Libre")
+
+# Llaves que envuelven la lista de registros (Kendo DataSourceResult, ASP.NET "d")
+_LLAVES_CONTENEDOR = (
+    "Data", "data", "d", "Items", "items", "Result", "result", "value"
+)
+
+# Fechas serializadas por ASP.NET: "/Date(1718000000000)/" o "/Date(1718000000000-0600)/"
+_FECHA_ASPNET = re.compile(r"/Date\((-?\d+)(?:[+-]\d{4})?\)/")
+_FECHA_ISO = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+# Identificadores internos de un registro (Id, IdLugar, LugarId, id_lugar):
+# el grid no los muestra, así que no forman parte del detalle
+_LLAVE_ID = re.compile(r"^(?:id|Id|ID)(?:[A-Z_]|$)|[a-z]Id$|_id$")
+
+
+def captura_red_activa() -> bool:
+    """True si el `.env` pide leer las tablas desde la red (`CAPTURA_RED=1`)."""
+    return os.getenv("CAPTURA_RED", "0").strip().lower() in ("1", "true", "si", "sí")
+
+
+def endpoint_reservas() -> Pattern[str]:
+    """URL del endpoint que llena `gridmisreservas`."""
+    return re.compile(
+        os.getenv("CAPTURA_ENDPOINT_RESERVAS") or PATRON_GRID_RESERVAS, re.IGNORECASE
+    )
+
+
+def endpoint_disponibilidad() -> Pattern[str]:
+    """URL del endpoint con los lugares/fechas de la búsqueda en Reservacion."""
+    return re.compile(
+        os.getenv("CAPTURA_ENDPOINT_DISPONIBILIDAD") or PATRON_DISPONIBILIDAD,
+        re.IGNORECASE,
+    )
+
+
+class RespuestaJson(NamedTuple):
+    """Cuerpo JSON de una respuesta XHR/fetch capturada."""
+
+    url: str
+    metodo: str
+    estado: int
+    datos: Any
+
+
+class Disponibilidad(NamedTuple):
+    """Un lugar en una fecha de la tabla de resultados de Reservacion."""
+
+    lugar: str
+    fecha: date
+    disponible: bool
+    estado: str = ""
+
+
+# ====================================================================
+# CAPTURA
+# ====================================================================
+
+
+class CapturaRed:
+    """Guarda las respuestas JSON de la página cuya URL contiene `patron`.
+
+    Se registra al crearse y deja de escuchar con `detener()`. Las respuestas
+    se conservan en orden de llegada; `esperar_datos` recorre primero las ya
+    capturadas (de la más reciente a la más antigua) y después espera nuevas.
+    """
+
+    def __init__(self, page: Page, patron: str = PATRON_SITIO) -> None:
+        self.page = page
+        self.patron = patron
+        self.respuestas: List[RespuestaJson] = []
+        # Respuesta de la que salió el último resultado de `esperar_datos`
+        self.fuente: Optional[RespuestaJson] = None
+        self._nueva = asyncio.Event()
+        page.on("response", self._al_responder)
+
+    def detener(self) -> None:
+        self.page.remove_listener("response", self._al_responder)
+
+    def limpiar(self) -> None:
+        """Olvida lo capturado (p.ej. antes de una nueva búsqueda)."""
+        self.respuestas.clear()
+        self.fuente = None
+
+    async def _al_responder(self, respuesta: Response) -> None:
+        if self.patron not in respuesta.url:
+            return
+        if respuesta.request.resource_type not in ("xhr", "fetch"):
+            return
+        if "json" not in respuesta.headers.get("content-type", ""):
+            return
+        try:
+            datos = await respuesta.json()
+        except Exception:
+            return  # cuerpo no disponible (redirección, página cerrada)
+        self.respuestas.append(
+            RespuestaJson(
+                respuesta.url, respuesta.request.method, respuesta.status, datos
+            )
+        )
+        self._nueva.set()
+
+    async def esperar_datos(
+        self,
+        parser: Callable[[Any], Optional[T]],
+        tope_ms: int = 15000,
+        endpoint: Optional[Pattern[str]] = None,
+    ) -> Optional[T]:
+        """Primer resultado no-None de `parser` sobre las respuestas capturadas.
+
+        Con `endpoint` sólo se consideran las respuestas cuya URL coincide.
+        La respuesta usada queda en `self.fuente`. Devuelve None si ninguna
+        respuesta tiene la forma esperada antes de `tope_ms`.
+        """
+        inicio = time.perf_counter()
+        limite = inicio + tope_ms / 1000
+        revisadas = 0
+        while True:
+            nuevas = self.respuestas[revisadas:]
+            revisadas = len(self.respuestas)
+            for respuesta in reversed(nuevas):
+                if endpoint is not None and not endpoint.search(respuesta.url):
+                    continue
+                resultado = parser(respuesta.datos)
+                if resultado is not None:
+                    ms = (time.perf_counter() - inicio) * 1000
+                    print(f"📡 Datos leídos de {respuesta.url} ({ms:.0f} ms)")
+                    self.fuente = respuesta
+                    return resultado
+            restante = limite - time.perf_counter()
+            if restante <= 0:
+                return None
+            self._nueva.clear()
+            try:
+                await asyncio.wait_for(self._nueva.wait(), restante)
+            except asyncio.TimeoutError:
+                pass
+
+
+# ====================================================================
+# PARSERS
+# ====================================================================
+
+
+def registros_json(datos: Any) -> List[Dict[str, Any]]:
+    """Lista de registros (dicts) de una respuesta, desenvolviendo contenedores."""
+    for _ in range(4):
+        if isinstance(datos, list):
+            return [r for r in datos if isinstance(r, dict)]
+        if not isinstance(datos, dict):
+            return []
+        datos = next(
+            (datos[llave] for llave in _LLAVES_CONTENEDOR if llave in datos), None
+        )
+    return []
+
+
+def respuesta_completa(respuesta: RespuestaJson) -> bool:
+    """True si `respuesta` es la foto completa del grid de reservaciones.
+
+    Tiene que venir del endpoint del grid con 200 y, si declara un total de
+    registros (respuesta paginada), traerlos todos.
+    """
+    if respuesta.estado != 200 or not endpoint_reservas().search(respuesta.url):
+        return False
+    return total_coincide(respuesta.datos) is not False
+
+
+def total_coincide(datos: Any) -> Optional[bool]:
+    """Si `datos` declara un total de registros (`Total` de Kendo), si los trae todos.
+
+    None si la respuesta no declara total.
+    """
+    total = None
+    if isinstance(datos, dict):
+        total = next((datos[llave] for llave in _LLAVES_TOTAL if llave in datos), None)
+    if total is None:
+        return None
+    return isinstance(total, int) and total == len(registros_json(datos))
+
+
+def _valor(registro: Dict[str, Any], campos: Sequence[str]) -> Any:
+    minusculas = {llave.lower(): valor for llave, valor in registro.items()}
+    for campo in campos:
+        valor = minusculas.get(campo.lower())
+        if valor not in (None, ""):
+            return valor
+    return None
+
+
+def fecha_json(valor: Any) -> Optional[date]:
+    """Fecha de un valor JSON: /Date(ms)/, ISO (con o sin hora) o DD/MM/YYYY."""
+    if not isinstance(valor, str):
+        return None
+    coincidencia = _FECHA_ASPNET.search(valor)
+    if coincidencia:
+        epoca = datetime(1970, 1, 1)
+        return (epoca + timedelta(milliseconds=int(coincidencia[1]))).date()
+    try:
+        return date.fromisoformat(valor[:10])
+    except ValueError:
+        return parsear_fecha(valor)
+
+
+def _texto(valor: Any) -> str:
+    if isinstance(valor, bool):
+        return "Sí" if valor else "No"
+    if isinstance(valor, str) and (
+        _FECHA_ASPNET.search(valor) or _FECHA_ISO.match(valor)
+    ):
+        # Como la muestra el grid, para que `detalle` no dependa de la lectura
+        fecha = fecha_json(valor)
+        if fecha is not None:
+            return fecha.strftime(FORMATO_FECHA_SITIO)
+    return str(valor).strip()
+
+
+def reservas_desde_json(datos: Any) -> Optional[List[Reserva]]:
+    """Reservas de la respuesta que llena `gridmisreservas`.
+
+    None si los registros no tienen lugar y fecha (no es la respuesta del
+    grid). El resto de los campos escalares visibles se conserva en
+    `detalle`, normalizado igual que desde las celdas del grid.
+    """
+    registros = registros_json(datos)
+    if not registros:
+        return None
+    reservas: List[Reserva] = []
+    for registro in registros:
+        lugar = _valor(registro, CAMPOS_LUGAR)
+        fecha = fecha_json(_valor(registro, CAMPOS_FECHA))
+        if not isinstance(lugar, str) or fecha is None:
+            continue
+        estado = _texto(_valor(registro, CAMPOS_ESTADO) or "")
+        resto = [
+            _texto(valor)
+            for llave, valor in registro.items()
+            if valor not in (None, "")
+            and not isinstance(valor, (dict, list))
+            and not _LLAVE_ID.search(llave)
+            and llave.lower() not in {c.lower() for c in CAMPOS_LUGAR + CAMPOS_FECHA}
+        ]
+        reservas.append(
+            Reserva(
+                lugar=lugar.strip(),
+                fecha=fecha,
+                estado=(
+                    ESTADO_CANCELADA if "cancelad" in estado.lower() else ESTADO_ACTIVA
+                ),
+                detalle=detalle_reserva(resto),
+            )
+        )
+    return reservas if reservas else None
+
+
+def disponibilidad_desde_json(datos: Any) -> Optional[List[Disponibilidad]]:
+    """Lugares y su disponibilidad de la respuesta de búsqueda en Reservacion.
+
+    La disponibilidad se toma de un campo booleano (`CAMPOS_DISPONIBLE`) o,
+    si no existe, de que el estado contenga "disponible". None si la
+    respuesta no tiene esa forma.
+    """
+    resultado: List[Disponibilidad] = []
+    for registro in registros_json(datos):
+        lugar = _valor(registro, CAMPOS_LUGAR)
+        fecha = fecha_json(_valor(registro, CAMPOS_FECHA))
+        if not isinstance(lugar, str) or fecha is None:
+            continue
+        estado = _texto(_valor(registro, CAMPOS_ESTADO) or "")
+        disponible = _valor(registro, CAMPOS_DISPONIBLE)
+        if not isinstance(disponible, bool):
+            texto = estado.lower()
+            disponible = "disponible" in texto and "no disp" not in texto
+        resultado.append(Disponibilidad(lugar.strip(), fecha, disponible, estado))
+    return resultado if resultado else None
@@ -1,18 +1,50 @@
 import asyncio
 import os
 import re
-from datetime import date, timedelta
-from typing import List
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
 from dotenv import load_dotenv
-from playwright.async_api import async_playwright, Page
-
-# Reusar la función de persistencia existente
-try:
-    from CargaLugar import guardar_reservacion
-except Exception:
-
-    def guardar_reservacion(datos_fila: str, fecha_reserva: str) -> bool:
-        return False
+from playwright.async_api import BrowserContext, Locator, async_playwright, Page
+
+from calendario_reservas import CalendarioReservas
+from captura_red import (
+    CapturaRed,
+    captura_red_activa,
+    disponibilidad_desde_json,
+    endpoint_disponibilidad,
+    endpoint_reservas,
+    reservas_desde_json,
+)
+from cliente_http import (
+    ConsultaHttpFallida,
+    consulta_http_activa,
+    consultar_con_sesion_guardada,
+)
+from esperas_pagina import (
+    esperar_quietud_dom,
+    esperar_selector,
+    imprimir_resumen_esperas,
+)
+from extraccion_tablas import extraer_columna, extraer_filas_kendo, extraer_tabla
+from perfil_navegador import (
+    abrir_navegador,
+    crear_contexto,
+    es_contexto_prestado,
+    obtener_pagina,
+)
+from persistencia_async import cerrar_persistencias, obtener_persistencia
+
+# Persistencia compartida con CargaLugar.py (una conexión por ejecución)
+from repositorio_reservaciones import Reserva, cerrar_repositorios
+from selectores_adaptativos import (
+    Estrategia,
+    actuar,
+    guardar_aprendizaje,
+    registrar_accion,
+)
+from sesion_navegador import GestorSesion
 
 
 load_dotenv()
@@ -32,6 +64,79 @@ CONSULTAR_GOTO_TIMEOUT = int(os.getenv("CONSULTAR_GOTO_TIMEOUT_MS", "120000"))
 CONSULTAR_WAIT_LOAD_TIMEOUT = int(os.getenv("CONSULTAR_WAIT_LOAD_TIMEOUT_MS", "120000"))
 CONSULTAR_SELECTOR_TIMEOUT = int(os.getenv("CONSULTAR_SELECTOR_TIMEOUT_MS", "90000"))
 
+# Páginas que procesan fechas a la vez en el mismo contexto (1 = una tras otra).
+# Bajarlo si la intranet empieza a rechazar o frenar peticiones
+CONCURRENCIA_FECHAS = max(1, int(os.getenv("CONCURRENCIA_FECHAS", "1")))
+
+# Acciones de la UI con varias formas de encontrar el elemento, en el orden
+# inicial; `selectores_adaptativos` recuerda cuál funciona y la prueba primero
+FECHA_INICIAL = registrar_accion(
+    "fecha_inicial",
+    Estrategia(
+        "combobox",
+        lambda r: r.get_by_role("combobox", name=re.compile("Fecha inicial", re.I)),
+    ),
+    Estrategia("id", lambda r: r.locator("#fechaInicio")),
+)
+FECHA_FINAL = registrar_accion(
+    "fecha_final",
+    Estrategia(
+        "combobox",
+        lambda r: r.get_by_role("combobox", name=re.compile("Fecha final", re.I)),
+    ),
+    Estrategia("id", lambda r: r.locator("#fechaFinal")),
+)
+BOTON_BUSCAR = registrar_accion(
+    "boton_buscar",
+    Estrategia(
+        "rol", lambda r: r.get_by_role("button", name=re.compile("buscar", re.I))
+    ),
+    Estrategia("texto", lambda r: r.locator("button:has-text('Buscar')")),
+)
+# Relativa a la fila del lugar
+CASILLA_FILA = registrar_accion(
+    "casilla_fila",
+    Estrategia("checkbox", lambda r: r.locator("input[type='checkbox']")),
+    Estrategia("id", lambda r: r.locator("#Tr")),
+)
+BOTON_RESERVAR = registrar_accion(
+    "boton_reservar",
+    Estrategia(
+        "rol", lambda r: r.get_by_role("button", name=re.compile("Reservar", re.I))
+    ),
+    Estrategia("texto", lambda r: r.locator("button:has-text('Reservar')")),
+)
+BOTON_GENERAR = registrar_accion(
+    "boton_generar",
+    Estrategia(
+        "rol",
+        lambda r: r.get_by_role(
+            "button", name=re.compile("Generar reserva|Generar", re.I)
+        ),
+    ),
+    Estrategia("texto", lambda r: r.locator("button:has-text('Generar reserva')")),
+)
+
+
+async def _clic(locator: Locator, timeout: float) -> None:
+    await locator.click(timeout=timeout)
+
+
+async def _visible(locator: Locator, timeout: float) -> None:
+    await locator.wait_for(state="visible", timeout=timeout)
+
+
+def _llenar_fecha(
+    fecha_str: str, clic: bool = True
+) -> Callable[[Locator, float], Awaitable[None]]:
+    async def llenar(locator: Locator, timeout: float) -> None:
+        if clic:
+            await locator.click(timeout=timeout)
+        await locator.fill(fecha_str, timeout=timeout)
+        await locator.press("Tab", timeout=timeout)
+
+    return llenar
+
 
 def generar_fechas_objetivo(dias_semana: List[int], dias_adelante: int) -> List[str]:
     hoy = date.today()
@@ -76,39 +181,18 @@ async def seleccionar_fecha_en_ui(page: Page, fecha_str: str) -> bool:
 
         # Rellenar fechas en los campos (intentos con role-based API y fallbacks)
         try:
-            # Fecha inicial: intentar primero por role (combobox) y si falla, por id
-            try:
-                await page.get_by_role(
-                    "combobox", name=re.compile("Fecha inicial", re.I)
-                ).click()
-                await page.get_by_role(
-                    "combobox", name=re.compile("Fecha inicial", re.I)
-                ).fill(fecha_str)
-                await page.get_by_role(
-                    "combobox", name=re.compile("Fecha inicial", re.I)
-                ).press("Tab")
-            except Exception:
-                try:
-                    await page.locator("#fechaInicio").fill(fecha_str)
-                    await page.locator("#fechaInicio").press("Tab")
-                except Exception:
-                    pass
-
-            # Fecha final: role-based y fallback a id
-            try:
-                await page.get_by_role(
-                    "combobox", name=re.compile("Fecha final", re.I)
-                ).click()
-                await page.get_by_role(
-                    "combobox", name=re.compile("Fecha final", re.I)
-                ).fill(fecha_str)
-                await page.get_by_role(
-                    "combobox", name=re.compile("Fecha final", re.I)
-                ).press("Tab")
-            except Exception:
+            # Fechas inicial y final: combobox por rol o input por id (primero
+            # la estrategia que funcionó la última vez)
+            for accion in (FECHA_INICIAL, FECHA_FINAL):
                 try:
-                    await page.locator("#fechaFinal").fill(fecha_str)
-                    await page.locator("#fechaFinal").press("Tab")
+                    # Como antes de las estrategias: el combobox con clic, el
+                    # input por id sólo se llena
+                    await actuar(
+                        page,
+                        accion,
+                        _llenar_fecha(fecha_str),
+                        por_estrategia={"id": _llenar_fecha(fecha_str, clic=False)},
+                    )
                 except Exception:
                     pass
 
@@ -137,18 +221,23 @@ async def seleccionar_fecha_en_ui(page: Page, fecha_str: str) -> bool:
             except Exception:
                 pass
 
-            await page.wait_for_timeout(200)
+            # El dropdown de select2 de la hora se cierra al aplicar la opción
+            await esperar_selector(
+                page,
+                ".select2-container--open",
+                estado="detached",
+                tope_ms=3000,
+                descripcion="selector de hora cerrado",
+                reemplaza_ms=200,
+            )
         except Exception:
             pass
 
         # Click Buscar
         try:
-            await page.get_by_role("button", name=re.compile("buscar", re.I)).click()
+            await actuar(page, BOTON_BUSCAR, _clic)
         except Exception:
-            try:
-                await page.click("button:has-text('Buscar')")
-            except Exception:
-                pass
+            pass
 
         # esperar resultados
         try:
@@ -165,10 +254,40 @@ async def seleccionar_fecha_en_ui(page: Page, fecha_str: str) -> bool:
         return False
 
 
+async def _registrar_intentos(
+    fecha_str: str,
+    lugares_prioridad: List[str],
+    intentados: List[str],
+    reservado: Optional[str],
+) -> None:
+    """Suma al resumen de intentos (por prioridad) los lugares probados para la fecha."""
+    fecha = datetime.strptime(fecha_str, "%d/%m/%Y").date()
+    persistencia = obtener_persistencia()
+    for lugar in intentados:
+        exito = lugar == reservado
+        try:
+            await persistencia.ejecutar(
+                persistencia.repo.registrar_intentos,
+                lugar,
+                lugares_prioridad.index(lugar) + 1,
+                [fecha] if exito else [],
+                [] if exito else [fecha],
+            )
+        except sqlite3.Error as e:
+            print(f"⚠️ Error al registrar intentos de {lugar}: {e}")
+
+
 async def intentar_reservar_para_fecha(
     page: Page, fecha_str: str, lugares_prioridad: List[str]
 ) -> bool:
-    """Flujo robusto: re-query, find row by lugar+fecha, mark checkbox, confirm by reading td[7]."""
+    """Flujo robusto: re-query, find row by lugar+fecha, mark checkbox, confirm by reading td[7].
+
+    Cada lugar con fila disponible que se intenta cuenta como éxito o fallo
+    de su prioridad en el resumen de intentos.
+    """
+    # Lugares con fila disponible que se intentaron, y el que quedó reservado
+    intentados: List[str] = []
+    reservado: Optional[str] = None
     try:
         # asegurar que hay resultados (esperar la segunda fila para evitar falsos positivos)
         try:
@@ -178,22 +297,18 @@ async def intentar_reservar_para_fecha(
             return False
 
         for lugar in lugares_prioridad:
-            # re-query filas
+            # re-query filas: lugar, fecha y estado de todas en una sola evaluación
+            filas = page.locator("tbody tr")
             try:
-                filas = await page.locator("tbody tr").all()
+                datos_filas = await extraer_tabla(filas, [0, 1, 2])
             except Exception as e:
                 print(f"⚠️ Error al obtener filas: {e}")
-                filas = []
+                datos_filas = []
 
             matched_row = None
-            for r in filas:
-                try:
-                    col_lugar = (await r.locator("td").nth(0).inner_text()).strip()
-                    col_fecha = (await r.locator("td").nth(1).inner_text()).strip()
-                    col_estado = (await r.locator("td").nth(2).inner_text()).strip()
-                except Exception:
-                    continue
-
+            for indice_fila, (col_lugar, col_fecha, col_estado) in enumerate(
+                datos_filas
+            ):
                 if col_lugar != lugar:
                     continue
                 if fecha_str not in col_fecha:
@@ -204,23 +319,18 @@ async def intentar_reservar_para_fecha(
                     )
                     continue
 
-                matched_row = r
+                matched_row = filas.nth(indice_fila)
                 break
 
             if not matched_row:
                 continue
+            intentados.append(lugar)
 
             # marcar checkbox
-            chk = None
             try:
-                chk = matched_row.locator("input[type='checkbox']")
-                await chk.wait_for(state="visible", timeout=90_000)
+                chk = await actuar(matched_row, CASILLA_FILA, _visible, tope_ms=90_000)
             except Exception:
-                try:
-                    chk = matched_row.locator("#Tr")
-                    await chk.wait_for(state="visible", timeout=90_000)
-                except Exception:
-                    chk = None
+                chk = None
 
             if chk is None:
                 print(
@@ -239,27 +349,17 @@ async def intentar_reservar_para_fecha(
 
             # Click Reservar
             try:
-                await page.get_by_role(
-                    "button", name=re.compile("Reservar", re.I)
-                ).click()
-            except Exception:
-                try:
-                    await page.click("button:has-text('Reservar')")
-                except Exception as e:
-                    print(f"⚠️ Error al clicar 'Reservar': {e}")
-                    continue
+                await actuar(page, BOTON_RESERVAR, _clic)
+            except Exception as e:
+                print(f"⚠️ Error al clicar 'Reservar': {e}")
+                continue
 
             # Click Generar reserva / confirmar
             try:
-                await page.get_by_role(
-                    "button", name=re.compile("Generar reserva|Generar", re.I)
-                ).click()
-            except Exception:
-                try:
-                    await page.click("button:has-text('Generar reserva')")
-                except Exception as e:
-                    print(f"⚠️ Error al clicar 'Generar reserva': {e}")
-                    continue
+                await actuar(page, BOTON_GENERAR, _clic)
+            except Exception as e:
+                print(f"⚠️ Error al clicar 'Generar reserva': {e}")
+                continue
 
             # esperar que la UI procese
             try:
@@ -304,18 +404,12 @@ async def intentar_reservar_para_fecha(
             for _ in range(3):
                 await asyncio.sleep(0.4)
                 try:
-                    filas_post = await page.locator("tbody tr").all()
+                    filas_post = await extraer_tabla(page.locator("tbody tr"), [6, 7])
                 except Exception as e:
                     print(f"⚠️ No se pudieron obtener filas tras generar reserva: {e}")
                     filas_post = []
 
-                for rf in filas_post:
-                    try:
-                        rlugar = (await rf.locator("td").nth(6).inner_text()).strip()
-                        rfecha = (await rf.locator("td").nth(7).inner_text()).strip()
-                    except Exception:
-                        continue
-
+                for rlugar, rfecha in filas_post:
                     # Si la fila reportada tiene el mismo lugar y la fecha objetivo está
                     if lugar in rlugar and fecha_str in rfecha:
                         confirmado = True
@@ -329,19 +423,20 @@ async def intentar_reservar_para_fecha(
                     f"⚠️ No se confirmó la reserva para {lugar} {fecha_str} tras retries; continúo con siguiente lugar"
                 )
                 continue
+            reservado = lugar
 
             # Persistir
             try:
                 hora_inicio = "09:00"
                 hora_fin = "16:00"
-                datos_fila = f"{lugar} | {fecha_str} | {hora_inicio}-{hora_fin}"
-                ok_db = guardar_reservacion(datos_fila, fecha_str)
-                if ok_db:
-                    print(f"💾 Reservación guardada en DB: {lugar} | {fecha_str}")
-                else:
-                    print(
-                        f"⚠️ No se pudo guardar reservación en DB para {lugar} {fecha_str}"
-                    )
+                reserva = Reserva(
+                    lugar=lugar,
+                    fecha=datetime.strptime(fecha_str, "%d/%m/%Y").date(),
+                    detalle=f"{hora_inicio}-{hora_fin}",
+                )
+                # Dispara y olvida: el hilo escritor la agrupa con otras
+                obtener_persistencia().encolar_guardado(reserva)
+                print(f"💾 Reservación encolada para DB: {lugar} | {fecha_str}")
             except Exception as e:
                 print(f"⚠️ Error guardando en DB: {e}")
 
@@ -359,7 +454,13 @@ async def intentar_reservar_para_fecha(
                 except Exception:
                     pass
 
-            await page.wait_for_timeout(800)
+            await esperar_selector(
+                page,
+                "li#tabstrip-tab-2[role='tab']",
+                tope_ms=30000,
+                descripcion="vista de Reservacion",
+                reemplaza_ms=800,
+            )
             return True
 
         # fin for lugares
@@ -369,6 +470,100 @@ async def intentar_reservar_para_fecha(
     except Exception as e:
         print(f"⚠️ Error intentando reservar para {fecha_str}: {e}")
         return False
+    finally:
+        await _registrar_intentos(fecha_str, lugares_prioridad, intentados, reservado)
+
+
+async def procesar_fecha(
+    page: Page, fecha: str, captura: Optional[CapturaRed] = None
+) -> bool:
+    """Busca `fecha` en `page` y reserva el primer lugar disponible por prioridad."""
+    if captura is not None:
+        captura.limpiar()
+    ok = await seleccionar_fecha_en_ui(page, fecha)
+    if not ok:
+        print(f"⚠️ No se pudo preparar la búsqueda para {fecha}")
+        return False
+
+    lugares = LUGARES_RESERVA
+    # Modo captura de red: la disponibilidad de la búsqueda se lee del JSON de
+    # resultados para no recorrer lugares que ya están ocupados
+    if captura is not None:
+        disponibilidad = await captura.esperar_datos(
+            disponibilidad_desde_json, tope_ms=5000, endpoint=endpoint_disponibilidad()
+        )
+        if disponibilidad is not None:
+            libres = {
+                d.lugar
+                for d in disponibilidad
+                if d.disponible and d.fecha.strftime("%d/%m/%Y") == fecha
+            }
+            lugares = [l for l in LUGARES_RESERVA if l in libres]
+            if not lugares:
+                print(f"⛔ Ningún lugar configurado disponible para {fecha}")
+                return False
+
+    reservado = await intentar_reservar_para_fecha(page, fecha, lugares)
+    await esperar_quietud_dom(
+        page,
+        tope_ms=5000,
+        descripcion=f"página tras {fecha}",
+        reemplaza_ms=1200 if reservado else 800,
+    )
+    return reservado
+
+
+async def reservar_fechas(
+    context: BrowserContext, primera: Page, fechas: List[str], concurrencia: int = 1
+) -> Dict[str, bool]:
+    """Procesa `fechas` con hasta `concurrencia` páginas del mismo contexto.
+
+    Las fechas son independientes: cada trabajador toma la siguiente de una
+    cola y la procesa en su propia página (con su propia captura de red), así
+    que nunca hay más de `concurrencia` búsquedas a la vez contra la intranet.
+    Las reservas confirmadas las guarda el hilo escritor de
+    `persistencia_async`, el único que escribe en la base. Devuelve si se
+    reservó cada fecha.
+    """
+    pendientes: "asyncio.Queue[str]" = asyncio.Queue()
+    for fecha in fechas:
+        pendientes.put_nowait(fecha)
+    resultados: Dict[str, bool] = {}
+    trabajadores = max(1, min(concurrencia, len(fechas)))
+
+    async def trabajador(numero: int) -> None:
+        page = primera
+        captura: Optional[CapturaRed] = None
+        etiqueta = f"[página {numero + 1}] " if trabajadores > 1 else ""
+        try:
+            if numero:
+                # Página nueva (no se reutiliza ninguna pestaña abierta). Si
+                # no se puede abrir, las demás páginas procesan sus fechas
+                try:
+                    page = await obtener_pagina(context, reutilizar="")
+                except Exception as e:
+                    print(f"⚠️ {etiqueta}No se pudo abrir la página: {e}")
+                    return
+            captura = CapturaRed(page) if captura_red_activa() else None
+            while not pendientes.empty():
+                fecha = pendientes.get_nowait()
+                print(f"\n--- {etiqueta}Procesando fecha {fecha} ---")
+                try:
+                    resultados[fecha] = await procesar_fecha(page, fecha, captura)
+                except Exception as e:
+                    print(f"⚠️ {etiqueta}Error procesando {fecha}: {e}")
+                    resultados[fecha] = False
+        finally:
+            if captura is not None:
+                captura.detener()
+            if page is not primera:
+                try:
+                    await page.close()
+                except Exception:
+                    pass  # el navegador ya se cerró
+
+    await asyncio.gather(*(trabajador(n) for n in range(trabajadores)))
+    return resultados
 
 
 async def obtener_fechas_reservadas(page: Page) -> List[str]:
@@ -380,39 +575,66 @@ async def obtener_fechas_reservadas(page: Page) -> List[str]:
     """
     fechas_reservadas: List[str] = []
 
+    # Sin navegador si las cookies de la última sesión siguen vigentes
+    if consulta_http_activa():
+        try:
+            consulta = await asyncio.to_thread(consultar_con_sesion_guardada)
+            return list(dict.fromkeys(r.fecha_str for r in consulta.reservas))
+        except (ConsultaHttpFallida, OSError) as e:
+            print(f"ℹ️ Consulta HTTP no disponible ({e}); usando el navegador")
+
+    captura = CapturaRed(page) if captura_red_activa() else None
     try:
         # Aumentar timeouts porque la página puede tardar más en responder en algunos entornos
         await page.goto(
             "https://intranet.mx.deloitte.com/ReservacionesHoteling/ConsultarReservaciones",
             timeout=120_000,
         )
-        await page.wait_for_load_state("networkidle", timeout=120_000)
 
-        # Esperar al menos una fila en la tabla de reservas (aumentado a 90s)
+        # Modo captura de red: las fechas salen del JSON que llena el grid
+        if captura is not None:
+            reservas = await captura.esperar_datos(
+                reservas_desde_json, tope_ms=30_000, endpoint=endpoint_reservas()
+            )
+            if reservas is not None:
+                return list(dict.fromkeys(r.fecha_str for r in reservas))
+            print("⚠️ No se capturó el JSON del grid; leyendo la tabla HTML")
+
+        # Modelo del grid Kendo: todas las páginas del grid en una sola llamada
         try:
-            await page.wait_for_selector(
-                "//div[@id='gridmisreservas']//table[1]/tbody/tr", timeout=90_000
+            filas_kendo = await extraer_filas_kendo(
+                page.locator("#gridmisreservas"), espera_ms=30_000, columna_fecha=7
             )
         except Exception as e:
-            # Registrar el motivo y devolver lista vacía si no aparece la tabla
-            print(f"⚠️ Timeout o error esperando filas en gridmisreservas: {e}")
-            return fechas_reservadas
+            print(f"⚠️ No se pudo leer el modelo del grid: {e}")
+            filas_kendo = None
 
-        # Seleccionar todas las celdas de la columna 8 (td[8])
-        celdas = await page.locator(
-            "//div[@id='gridmisreservas']//table[1]/tbody/tr/td[8]"
-        ).all()
+        if filas_kendo is not None:
+            celdas = [c[7] if len(c) > 7 else "" for c in filas_kendo]
+        else:
+            await page.wait_for_load_state("networkidle", timeout=120_000)
 
-        for cel in celdas:
+            # Esperar al menos una fila en la tabla de reservas (aumentado a 90s)
             try:
-                txt = (await cel.inner_text()).strip()
-                if not txt:
-                    continue
-                # Normalizar: tomar la primera parte si viene con hora u otro sufijo
-                fecha = txt.split()[0]
-                fechas_reservadas.append(fecha)
-            except Exception:
+                await page.wait_for_selector(
+                    "//div[@id='gridmisreservas']//table[1]/tbody/tr", timeout=90_000
+                )
+            except Exception as e:
+                # Registrar el motivo y devolver lista vacía si no aparece la tabla
+                print(f"⚠️ Timeout o error esperando filas en gridmisreservas: {e}")
+                return fechas_reservadas
+
+            # Columna 8 (td[8]) de todas las filas en una sola evaluación
+            celdas = await extraer_columna(
+                page.locator("//div[@id='gridmisreservas']//table[1]/tbody/tr"), 7
+            )
+
+        for txt in celdas:
+            if not txt:
                 continue
+            # Normalizar: tomar la primera parte si viene con hora u otro sufijo
+            fecha = txt.split()[0]
+            fechas_reservadas.append(fecha)
 
         # Devolver únicos preservando orden
         seen = set()
@@ -422,11 +644,17 @@ async def obtener_fechas_reservadas(page: Page) -> List[str]:
                 seen.add(f)
                 uniq.append(f)
 
+        # Guardar la sesión para la próxima ejecución (y la consulta sin navegador)
+        await GestorSesion().guardar(page.context, page, "#gridmisreservas")
+
         return uniq
 
     except Exception as e:
         print(f"⚠️ Error obteniendo fechas reservadas desde UI: {e}")
         return []
+    finally:
+        if captura is not None:
+            captura.detener()
 
 
 async def main() -> None:
@@ -437,30 +665,55 @@ async def main() -> None:
 
     print(f"🔎 Fechas objetivo: {fechas_sin_filtrar}")
 
+    persistencia = obtener_persistencia()
+    await persistencia.ejecutar(persistencia.repo.inicializar)
+
     async with async_playwright() as playwright:
-        browser = await playwright.chromium.launch(headless=False)
-        context = await browser.new_context(ignore_https_errors=True)
-        page = await context.new_page()
-
-        fechas_reservadas = await obtener_fechas_reservadas(page)
-        fechas = [f for f in fechas_sin_filtrar if f not in fechas_reservadas]
-
-        for fecha in fechas:
-            print(f"\n--- Procesando fecha {fecha} ---")
-            ok = await seleccionar_fecha_en_ui(page, fecha)
-            if not ok:
-                print(f"⚠️ No se pudo preparar la búsqueda para {fecha}")
-                continue
+        browser = await abrir_navegador(playwright, headless=False)
+        sesion = GestorSesion()
+        context = None
+        try:
+            context = await crear_contexto(
+                browser, **await sesion.opciones_contexto()
+            )
+            page = await obtener_pagina(context)
+            sesion.refrescar_en_segundo_plano(context)
 
-            reservado = await intentar_reservar_para_fecha(page, fecha, LUGARES_RESERVA)
-            if reservado:
-                await page.wait_for_timeout(1200)
-            else:
-                await page.wait_for_timeout(800)
+            # Índice de fechas ya reservadas (DB + grid del sitio), construido una vez:
+            # el filtrado es O(1) por fecha en lugar de recorrer una lista
+            calendario = await persistencia.ejecutar(
+                CalendarioReservas.desde_repositorio, persistencia.repo
+            )
+            calendario.marcar_fechas(await obtener_fechas_reservadas(page))
+            fechas = [
+                f for f in fechas_sin_filtrar if not calendario.esta_reservada(f)
+            ]
+
+            inicio = time.perf_counter()
+            resultados = await reservar_fechas(
+                context, page, fechas, CONCURRENCIA_FECHAS
+            )
+            reservadas = sum(resultados.values())
+            paginas = min(CONCURRENCIA_FECHAS, len(fechas))
+            print(
+                f"\n📊 {reservadas}/{len(fechas)} fechas reservadas en "
+                f"{time.perf_counter() - inicio:.1f} s con {paginas} página(s)"
+            )
+        finally:
+            # El contexto del navegador del usuario (CDP) no se cierra
+            if context is not None and not es_contexto_prestado(context):
+                await context.close()
+            await browser.close()
 
-        await context.close()
-        await browser.close()
+    # Esperar a que se apliquen las reservas encoladas
+    await persistencia.vaciar()
+    imprimir_resumen_esperas()
+    guardar_aprendizaje()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        asyncio.run(main())
+    finally:
+        cerrar_persistencias()
+        cerrar_repositorios()
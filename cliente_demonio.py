@@ -0,0 +1,120 @@
+"""
+Cliente del demonio de reservas (ver `demonio.py`).
+
+Sólo usa la biblioteca estándar para arrancar rápido: no importa Playwright.
+El protocolo es una línea JSON por petición y otra por respuesta sobre TCP
+en 127.0.0.1; cada petición lleva el token que el demonio escribe al
+arrancar en `DEMONIO_TOKEN_ARCHIVO` (sólo legible por el usuario).
+
+Uso:
+  python cliente_demonio.py [reservar|sincronizar|cancelar|estado|detener]
+
+`--consultar` equivale a `sincronizar` (como en CargaLugar.py). Sale con
+código 3 si el demonio no está corriendo, para que quien lo llame pueda
+usar los scripts normales.
+"""
+
+import json
+import os
+import socket
+import sys
+from typing import Any, Dict, Optional
+
+HOST_DEMONIO = "127.0.0.1"
+PUERTO_DEMONIO = 47615
+TOKEN_ARCHIVO = ".demonio_token"
+
+METODOS = ("reservar", "sincronizar", "cancelar", "estado", "detener")
+
+# Código de salida cuando no hay demonio al que delegar
+SALIDA_SIN_DEMONIO = 3
+
+
+class DemonioNoDisponible(Exception):
+    """No hay un demonio escuchando (o no se puede leer su token)."""
+
+
+def puerto_demonio() -> int:
+    return int(os.getenv("DEMONIO_PUERTO", str(PUERTO_DEMONIO)))
+
+
+def archivo_token() -> str:
+    return os.getenv("DEMONIO_TOKEN_ARCHIVO", TOKEN_ARCHIVO)
+
+
+def _leer_token() -> str:
+    try:
+        with open(archivo_token(), encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        raise DemonioNoDisponible("el demonio no está corriendo") from None
+
+
+def llamar(
+    metodo: str,
+    params: Optional[Dict[str, Any]] = None,
+    timeout: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Invoca `metodo` en el demonio y devuelve su respuesta.
+
+    La respuesta trae `ok`, `resultado`, `salida` (lo que la operación
+    imprimió en el demonio), `ms` y, si falló, `error`. `timeout` limita la
+    espera de la respuesta (None = sin límite; reservar puede tardar).
+    """
+    token = _leer_token()
+    try:
+        conexion = socket.create_connection(
+            (HOST_DEMONIO, puerto_demonio()), timeout=0.5
+        )
+    except OSError:
+        raise DemonioNoDisponible("el demonio no está corriendo") from None
+    with conexion:
+        conexion.settimeout(timeout)
+        peticion = {"token": token, "metodo": metodo, "params": params or {}}
+        conexion.sendall(json.dumps(peticion).encode("utf-8") + b"\n")
+        with conexion.makefile("rb") as lector:
+            linea = lector.readline()
+    if not linea:
+        raise DemonioNoDisponible("el demonio cerró la conexión")
+    respuesta = json.loads(linea)
+    if not isinstance(respuesta, dict):
+        raise ValueError(f"respuesta inesperada del demonio: {linea[:80]!r}")
+    return respuesta
+
+
+def delegar(metodo: str) -> Optional[bool]:
+    """Ejecuta `metodo` en el demonio e imprime su salida.
+
+    Devuelve None si no hay demonio o la comunicación con él falla (conexión
+    cortada, respuesta ilegible): hay que hacerlo localmente. Si respondió,
+    devuelve si la operación terminó bien.
+    """
+    try:
+        respuesta = llamar(metodo)
+    except DemonioNoDisponible:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Falló la comunicación con el demonio ({e}); se ejecuta localmente")
+        return None
+    if respuesta.get("salida"):
+        print(respuesta["salida"], end="")
+    if respuesta.get("resultado") is not None:
+        print(json.dumps(respuesta["resultado"], ensure_ascii=False, indent=2))
+    if respuesta.get("ok"):
+        print(f"⚡ Atendido por el demonio en {respuesta.get('ms', 0):.0f} ms")
+    else:
+        print(f"❌ El demonio respondió con error: {respuesta.get('error')}")
+    return bool(respuesta.get("ok"))
+
+
+if __name__ == "__main__":
+    argumento = sys.argv[1] if len(sys.argv) > 1 else "reservar"
+    metodo = "sincronizar" if argumento == "--consultar" else argumento.lstrip("-")
+    if metodo not in METODOS:
+        print(f"Uso: python cliente_demonio.py [{'|'.join(METODOS)}]")
+        sys.exit(2)
+    resultado = delegar(metodo)
+    if resultado is None:
+        print("ℹ️ El demonio no está corriendo (python demonio.py)")
+        sys.exit(SALIDA_SIN_DEMONIO)
+    sys.exit(0 if resultado else 1)
@@ -0,0 +1,331 @@
+"""
+Cliente HTTP ligero para consultas de sólo lectura, sin navegador.
+
+Leer las reservaciones no necesita Chromium: basta con las cookies de una
+sesión de Playwright ya autenticada (`context.storage_state()`, guardado en
+`ARCHIVO_SESION`) y una petición al sitio. `ClienteIntranet` mantiene una
+conexión keep-alive que se reutiliza entre peticiones y se reabre si el
+servidor la cierra.
+
+La respuesta puede ser JSON (endpoint de datos del grid, configurable con
+`CONSULTA_HTTP_RUTA`/`CONSULTA_HTTP_METODO`/`CONSULTA_HTTP_CUERPO`) o la
+página HTML con las filas de `gridmisreservas`. Si la sesión expiró o la
+respuesta no trae reservaciones se lanza `ConsultaHttpFallida` y el llamador
+usa el navegador como siempre.
+
+`INTRANET_URL` permite apuntar a un servidor local para pruebas:
+
+    INTRANET_URL=http://127.0.0.1:8000 python CargaLugar.py --consultar
+"""
+
+import http.client
+import json
+import os
+import ssl
+import time
+from html.parser import HTMLParser
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
+
+from captura_red import reservas_desde_json, total_coincide
+from repositorio_reservaciones import Reserva, reserva_desde_celdas
+
+URL_INTRANET = "https://intranet.mx.deloitte.com"
+RUTA_CONSULTA = "/ReservacionesHoteling/ConsultarReservaciones"
+ARCHIVO_SESION = "sesion_navegador.json"
+
+
+class ConsultaHttpFallida(Exception):
+    """La consulta HTTP no produjo reservaciones; hay que usar el navegador."""
+
+
+class SesionExpirada(ConsultaHttpFallida):
+    """No hay cookies guardadas o el sitio pidió volver a iniciar sesión."""
+
+
+class ConsultaHttp(NamedTuple):
+    """Reservaciones leídas por HTTP y si son la lista completa del sitio."""
+
+    reservas: List[Reserva]
+    # True sólo si la respuesta prueba que no faltan páginas: JSON con
+    # `Total` igual al número de registros, o HTML sin paginador en el grid
+    completa: bool
+
+
+def url_intranet() -> str:
+    return os.getenv("INTRANET_URL", URL_INTRANET).rstrip("/")
+
+
+def archivo_sesion() -> str:
+    """Ruta del storage state de Playwright compartido entre ejecuciones."""
+    return os.getenv("ARCHIVO_SESION", ARCHIVO_SESION)
+
+
+def consulta_http_activa() -> bool:
+    """El modo HTTP se intenta salvo que el `.env` lo apague (`CONSULTA_HTTP=0`)."""
+    return os.getenv("CONSULTA_HTTP", "1").strip().lower() not in ("0", "false", "no")
+
+
+def cookies_de_sesion(ruta: str, host: str) -> Dict[str, str]:
+    """Cookies vigentes para `host` de un archivo `storage_state` de Playwright."""
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            estado = json.load(f)
+    except FileNotFoundError:
+        raise SesionExpirada(f"no hay sesión guardada en {ruta}") from None
+    except (OSError, ValueError) as e:
+        raise SesionExpirada(f"no se pudo leer {ruta}: {e}") from None
+
+    ahora = time.time()
+    cookies: Dict[str, str] = {}
+    for cookie in estado.get("cookies", []):
+        dominio = cookie.get("domain", "").lstrip(".")
+        if host != dominio and not host.endswith("." + dominio):
+            continue
+        expira = cookie.get("expires", -1)
+        if expira not in (-1, None) and expira < ahora:
+            continue
+        cookies[cookie["name"]] = cookie["value"]
+    if not cookies:
+        raise SesionExpirada(
+            f"la sesión guardada no tiene cookies vigentes para {host}"
+        )
+    return cookies
+
+
+# ====================================================================
+# CLIENTE
+# ====================================================================
+
+
+class ClienteIntranet:
+    """Peticiones al sitio con las cookies de sesión sobre una conexión keep-alive.
+
+    El certificado no se verifica, igual que el navegador
+    (`ignore_https_errors=True`). Las cookies que el servidor renueva con
+    `Set-Cookie` se usan en las peticiones siguientes.
+    """
+
+    def __init__(
+        self,
+        cookies: Dict[str, str],
+        base_url: Optional[str] = None,
+        timeout: float = 15.0,
+    ) -> None:
+        partes = urlsplit(base_url or url_intranet())
+        self.esquema = partes.scheme
+        self.host = partes.hostname or ""
+        self.puerto = partes.port
+        self.cookies = dict(cookies)
+        # Cabeceras Set-Cookie recibidas, completas (con Expires/Max-Age)
+        self.set_cookie: List[str] = []
+        self.timeout = timeout
+        self._conn: Optional[http.client.HTTPConnection] = None
+
+    def _conexion(self) -> http.client.HTTPConnection:
+        if self._conn is None:
+            if self.esquema == "https":
+                contexto = ssl.create_default_context()
+                contexto.check_hostname = False
+                contexto.verify_mode = ssl.CERT_NONE
+                self._conn = http.client.HTTPSConnection(
+                    self.host, self.puerto, timeout=self.timeout, context=contexto
+                )
+            else:
+                self._conn = http.client.HTTPConnection(
+                    self.host, self.puerto, timeout=self.timeout
+                )
+        return self._conn
+
+    def cerrar(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self) -> "ClienteIntranet":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.cerrar()
+
+    def solicitar(
+        self, metodo: str, ruta: str, cuerpo: Optional[str] = None
+    ) -> Tuple[int, Dict[str, str], bytes]:
+        """Envía la petición y devuelve (status, cabeceras en minúsculas, cuerpo).
+
+        Si el servidor cerró la conexión keep-alive se reabre y se reintenta
+        una vez. Una respuesta HTTP malformada lanza `ConsultaHttpFallida`.
+        """
+        cabeceras = {
+            "Cookie": "; ".join(f"{k}={v}" for k, v in self.cookies.items()),
+            "Accept": "application/json, text/html;q=0.9",
+            "Connection": "keep-alive",
+            "X-Requested-With": "XMLHttpRequest",
+        }
+        if cuerpo is not None:
+            cabeceras["Content-Type"] = "application/x-www-form-urlencoded"
+        for intento in range(2):
+            conn = self._conexion()
+            try:
+                conn.request(metodo, ruta, body=cuerpo, headers=cabeceras)
+                respuesta = conn.getresponse()
+                datos = respuesta.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionError):
+                self.cerrar()
+                if intento:
+                    raise
+            except http.client.HTTPException as e:
+                self.cerrar()
+                raise ConsultaHttpFallida(
+                    f"respuesta HTTP inválida: {type(e).__name__}: {e}"
+                ) from e
+        for nombre, valor in respuesta.getheaders():
+            if nombre.lower() == "set-cookie":
+                self.set_cookie.append(valor)
+                par = valor.split(";", 1)[0]
+                if "=" in par:
+                    k, v = par.split("=", 1)
+                    self.cookies[k.strip()] = v.strip()
+        encabezados = {k.lower(): v for k, v in respuesta.getheaders()}
+        return respuesta.status, encabezados, datos
+
+
+# ====================================================================
+# LECTURA DE RESERVACIONES
+# ====================================================================
+
+
+class _FilasGrid(HTMLParser):
+    """Textos de las celdas `td` de las filas dentro de `div#<id_grid>`.
+
+    `paginado` indica si el grid trae paginador (Kendo `k-pager` o
+    `data-role="pager"`): en ese caso las filas pueden ser sólo una página.
+    """
+
+    def __init__(self, id_grid: str) -> None:
+        super().__init__()
+        self.id_grid = id_grid
+        self.encontrado = False
+        self.paginado = False
+        self.filas: List[List[str]] = []
+        self._profundidad = 0  # divs abiertos dentro del grid (0 = fuera)
+        self._fila: Optional[List[str]] = None
+        self._celda: Optional[List[str]] = None
+
+    def handle_starttag(self, tag: str, attrs) -> None:
+        if self._profundidad:
+            atributos = dict(attrs)
+            if atributos.get("data-role") == "pager" or "k-pager" in (
+                atributos.get("class") or ""
+            ):
+                self.paginado = True
+        if tag == "div":
+            if self._profundidad:
+                self._profundidad += 1
+            elif dict(attrs).get("id") == self.id_grid:
+                self.encontrado = True
+                self._profundidad = 1
+        elif not self._profundidad:
+            return
+        elif tag == "tr":
+            self._fila = []
+        elif tag == "td" and self._fila is not None:
+            self._celda = []
+
+    def handle_endtag(self, tag: str) -> None:
+        if not self._profundidad:
+            return
+        if tag == "div":
+            self._profundidad -= 1
+        elif tag == "td" and self._celda is not None and self._fila is not None:
+            self._fila.append(" ".join("".join(self._celda).split()))
+            self._celda = None
+        elif tag == "tr" and self._fila is not None:
+            if self._fila:
+                self.filas.append(self._fila)
+            self._fila = None
+
+    def handle_data(self, data: str) -> None:
+        if self._celda is not None:
+            self._celda.append(data)
+
+
+def filas_html_grid(
+    html: str, id_grid: str = "gridmisreservas"
+) -> Optional[Tuple[List[List[str]], bool]]:
+    """Filas de la tabla del grid en el HTML y si el grid está paginado.
+
+    None si la página no tiene el grid.
+    """
+    lector = _FilasGrid(id_grid)
+    lector.feed(html)
+    lector.close()
+    return (lector.filas, lector.paginado) if lector.encontrado else None
+
+
+def parece_login(html: str) -> bool:
+    """True si el HTML es la página de inicio de sesión (formulario o SSO)."""
+    texto = html.lower()
+    return 'type="password"' in texto or "login.microsoftonline" in texto
+
+
+def consultar_reservaciones_http(cliente: ClienteIntranet) -> ConsultaHttp:
+    """Lee las reservaciones del sitio con una sola petición.
+
+    Lanza `SesionExpirada` si el sitio redirige al login o rechaza las
+    cookies, y `ConsultaHttpFallida` si la respuesta no trae reservaciones.
+    """
+    ruta = os.getenv("CONSULTA_HTTP_RUTA", RUTA_CONSULTA)
+    metodo = os.getenv("CONSULTA_HTTP_METODO", "GET").upper()
+    cuerpo = os.getenv("CONSULTA_HTTP_CUERPO") or None
+
+    estado, cabeceras, datos = cliente.solicitar(metodo, ruta, cuerpo)
+    if estado in (401, 403) or 300 <= estado < 400:
+        destino = cabeceras.get("location", "")
+        raise SesionExpirada(f"el sitio respondió {estado} {destino}".strip())
+    if estado != 200:
+        raise ConsultaHttpFallida(f"el sitio respondió {estado}")
+
+    texto = datos.decode("utf-8", errors="replace")
+    if "json" in cabeceras.get("content-type", ""):
+        try:
+            contenido = json.loads(texto)
+        except ValueError as e:
+            raise ConsultaHttpFallida(f"la respuesta JSON no es válida: {e}") from e
+        reservas = reservas_desde_json(contenido)
+        if reservas is None:
+            raise ConsultaHttpFallida(
+                "la respuesta JSON no tiene reservaciones reconocibles"
+            )
+        # Sin `Total` no hay forma de saber si faltan páginas
+        return ConsultaHttp(reservas, completa=total_coincide(contenido) is True)
+
+    grid = filas_html_grid(texto)
+    if grid is None:
+        if parece_login(texto):
+            raise SesionExpirada("el sitio devolvió la página de inicio de sesión")
+        raise ConsultaHttpFallida("la página no contiene gridmisreservas")
+    filas, paginado = grid
+    if not filas:
+        # El grid existe pero sus filas se cargan por XHR: hace falta el
+        # endpoint de datos (CONSULTA_HTTP_RUTA) o el navegador
+        raise ConsultaHttpFallida("gridmisreservas viene vacío en el HTML")
+    reservas = [r for r in map(reserva_desde_celdas, filas) if r is not None]
+    return ConsultaHttp(reservas, completa=not paginado)
+
+
+def consultar_con_sesion_guardada() -> ConsultaHttp:
+    """Consulta HTTP completa con las cookies de `archivo_sesion()`, con tiempos."""
+    inicio = time.perf_counter()
+    host = urlsplit(url_intranet()).hostname or ""
+    with ClienteIntranet(cookies_de_sesion(archivo_sesion(), host)) as cliente:
+        consulta = consultar_reservaciones_http(cliente)
+    ms = (time.perf_counter() - inicio) * 1000
+    print(
+        f"⚡ Consulta HTTP sin navegador: {len(consulta.reservas)} reservaciones"
+        f" en {ms:.0f} ms"
+    )
+    if not consulta.completa:
+        print("ℹ️ La respuesta HTTP no prueba que la lista esté completa")
+    return consulta
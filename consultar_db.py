@@ -1,44 +1,228 @@
 # Archivo de ejemplo para consultar la base de datos de reservaciones
+#
+# Uso:
+#   python consultar_db.py                                  # todas, en pantalla
+#   python consultar_db.py --desde 01/01/2025 --hasta 31/01/2025 --lugar A-12
+#   python consultar_db.py --estado activa --formato csv --salida enero.csv
+#   python consultar_db.py --formato jsonl --limite 1000 --despues-de 739252:418
+#   python consultar_db.py --buscar 'P17- "piso 17"'
+#
+# Los resultados se leen por páginas (paginación por clave sobre `dia, id`) y
+# se escriben a medida que llegan, sin cargar la tabla completa en memoria.
+import argparse
+import csv
+import json
 import sqlite3
+import sys
 from datetime import datetime, date, timedelta
+from typing import Iterable, Iterator, List, Optional, TextIO
 
+from repositorio_reservaciones import (
+    ESTADO_ACTIVA,
+    ESTADOS,
+    FORMATO_FECHA_SITIO,
+    CursorPagina,
+    FiltroReservas,
+    Reserva,
+    cerrar_repositorios,
+    cursor_de,
+    obtener_repositorio,
+)
+
+
+COLUMNAS_EXPORTACION = [
+    "id",
+    "fecha",
+    "lugar",
+    "franja",
+    "estado",
+    "detalle",
+    "actualizado",
+]
+
+
+def _parsear_fecha(fecha: Optional[str]) -> Optional[date]:
+    return datetime.strptime(fecha, FORMATO_FECHA_SITIO).date() if fecha else None
+
+
+def _a_registro(reserva: Reserva) -> dict:
+    return {
+        "id": reserva.id,
+        "fecha": reserva.fecha.isoformat(),
+        "lugar": reserva.lugar,
+        "franja": reserva.franja,
+        "estado": reserva.estado_str,
+        "detalle": reserva.detalle,
+        "actualizado": reserva.actualizado,
+    }
+
+
+def _aplanar(paginas: Iterable[List[Reserva]]) -> Iterator[Reserva]:
+    for pagina in paginas:
+        yield from pagina
+
+
+# ====================================================================
+# EXPORTADORES (reciben páginas y escriben a medida que llegan)
+# ====================================================================
+
+
+def exportar_texto(paginas: Iterable[List[Reserva]], salida: TextIO) -> int:
+    """Formato legible, una reserva por bloque."""
+    total = 0
+    for reserva in _aplanar(paginas):
+        salida.write(f"ID: {reserva.id}\n")
+        salida.write(f"Fecha consulta: {reserva.actualizado}\n")
+        salida.write(f"Fecha reserva: {reserva.fecha_str}\n")
+        salida.write(f"Lugar: {reserva.lugar} ({reserva.estado_str})\n")
+        salida.write(f"Datos: {reserva.detalle}\n")
+        salida.write("-" * 50 + "\n")
+        total += 1
+    return total
+
+
+def exportar_csv(paginas: Iterable[List[Reserva]], salida: TextIO) -> int:
+    escritor = csv.DictWriter(salida, fieldnames=COLUMNAS_EXPORTACION)
+    escritor.writeheader()
+    total = 0
+    for pagina in paginas:
+        escritor.writerows(_a_registro(r) for r in pagina)
+        total += len(pagina)
+    return total
 
-def consultar_reservaciones_por_fecha(fecha_inicio=None, fecha_fin=None):
-    """Consulta reservaciones en un rango de fechas específico."""
-    conn = sqlite3.connect("reservaciones.db")
-    cursor = conn.cursor()
 
+def exportar_jsonl(paginas: Iterable[List[Reserva]], salida: TextIO) -> int:
+    total = 0
+    for reserva in _aplanar(paginas):
+        salida.write(json.dumps(_a_registro(reserva), ensure_ascii=False) + "\n")
+        total += 1
+    return total
+
+
+def exportar_parquet(paginas: Iterable[List[Reserva]], ruta: str) -> int:
+    """Archivo columnar Parquet, un row group por página (requiere pyarrow)."""
     try:
-        if fecha_inicio and fecha_fin:
-            cursor.execute(
-                """
-                SELECT * FROM reservaciones 
-                WHERE fecha_reserva BETWEEN ? AND ?
-                ORDER BY fecha_reserva ASC
-            """,
-                (fecha_inicio, fecha_fin),
-            )
-        else:
-            cursor.execute("""
-                SELECT * FROM reservaciones 
-                ORDER BY fecha_reserva ASC
-            """)
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError(
+            "El formato parquet requiere pyarrow (pip install pyarrow)"
+        ) from None
+
+    esquema = pa.schema(
+        [
+            ("id", pa.int64()),
+            ("fecha", pa.date32()),
+            ("lugar", pa.string()),
+            ("franja", pa.string()),
+            ("estado", pa.string()),
+            ("detalle", pa.string()),
+            ("actualizado", pa.string()),
+        ]
+    )
+    total = 0
+    with pq.ParquetWriter(ruta, esquema) as escritor:
+        for pagina in paginas:
+            columnas = {
+                "id": [r.id for r in pagina],
+                "fecha": [r.fecha for r in pagina],
+                "lugar": [r.lugar for r in pagina],
+                "franja": [r.franja for r in pagina],
+                "estado": [r.estado_str for r in pagina],
+                "detalle": [r.detalle for r in pagina],
+                "actualizado": [r.actualizado for r in pagina],
+            }
+            escritor.write_table(pa.table(columnas, schema=esquema))
+            total += len(pagina)
+    return total
+
+
+EXPORTADORES = {
+    "texto": exportar_texto,
+    "csv": exportar_csv,
+    "jsonl": exportar_jsonl,
+}
+
+
+# ====================================================================
+# CONSULTAS
+# ====================================================================
+
+
+def exportar_reservaciones(
+    filtro: Optional[FiltroReservas] = None,
+    formato: str = "texto",
+    salida: Optional[str] = None,
+    limite: Optional[int] = None,
+    despues_de: Optional[CursorPagina] = None,
+    tamano_pagina: int = 500,
+) -> Optional[CursorPagina]:
+    """Escribe las reservas que cumplen `filtro` en `formato` (a `salida` o stdout).
+
+    Con `limite` se detiene tras esa cantidad de filas y devuelve el cursor
+    para pedir la página siguiente con `despues_de` (None si no quedan más).
+    """
+    repo = obtener_repositorio()
+    entregadas: List[Reserva] = []
+
+    def paginas() -> Iterator[List[Reserva]]:
+        restantes = limite
+        for pagina in repo.paginar(filtro, tamano_pagina, despues_de):
+            if restantes is not None:
+                pagina = pagina[:restantes]
+                restantes -= len(pagina)
+            if pagina:
+                # Sólo se conserva la última fila, para calcular el cursor
+                entregadas[:] = pagina[-1:]
+                yield pagina
+            if restantes == 0:
+                return
+
+    if formato == "parquet":
+        if not salida:
+            raise ValueError("El formato parquet requiere --salida")
+        total = exportar_parquet(paginas(), salida)
+    elif salida:
+        with open(salida, "w", newline="", encoding="utf-8") as archivo:
+            total = EXPORTADORES[formato](paginas(), archivo)
+    else:
+        total = EXPORTADORES[formato](paginas(), sys.stdout)
+
+    # Mensajes a stderr para no mezclarlos con la exportación en stdout
+    print(f"📋 Reservaciones exportadas: {total}", file=sys.stderr)
 
-        reservaciones = cursor.fetchall()
+    if limite is None or total < limite or not entregadas:
+        return None
+    siguiente = cursor_de(entregadas[-1])
+    # Confirmar que realmente hay más filas antes de ofrecer el cursor
+    if next(repo.paginar(filtro, 1, siguiente), None) is None:
+        return None
+    return siguiente
 
-        print(f"📋 Reservaciones encontradas: {len(reservaciones)}")
 
-        for reservacion in reservaciones:
-            print(f"ID: {reservacion[0]}")
-            print(f"Fecha consulta: {reservacion[1]}")
-            print(f"Fecha reserva: {reservacion[8]}")
-            print(f"Datos: {reservacion[12]}")
-            print("-" * 50)
+def buscar_reservaciones(
+    texto: str, formato: str = "texto", limite: Optional[int] = None
+) -> int:
+    """Búsqueda de texto completo (lugar, fecha, estado, detalle) a stdout.
+
+    Ejemplos: `P17-` (prefijo de código), `"piso 17"` (frase), `cancelada 2025-03*`.
+    """
+    resultados = obtener_repositorio().buscar(texto, limite or 50)
+    total = EXPORTADORES[formato]([resultados], sys.stdout)
+    print(f"🔎 Coincidencias: {total}", file=sys.stderr)
+    return total
+
+
+def consultar_reservaciones_por_fecha(fecha_inicio=None, fecha_fin=None):
+    """Consulta reservaciones en un rango de fechas específico (DD/MM/YYYY)."""
+    try:
+        filtro = FiltroReservas(
+            desde=_parsear_fecha(fecha_inicio), hasta=_parsear_fecha(fecha_fin)
+        )
+        exportar_reservaciones(filtro)
 
     except sqlite3.Error as e:
         print(f"❌ Error al consultar: {e}")
-    finally:
-        conn.close()
 
 
 def reservaciones_proximas(dias=7):
@@ -50,11 +234,167 @@ def reservaciones_proximas(dias=7):
     consultar_reservaciones_por_fecha(fecha_hoy, fecha_limite)
 
 
+# ====================================================================
+# REPORTES (se responden desde las tablas de resumen)
+# ====================================================================
+
+DIAS_SEMANA = ["Lun", "Mar", "Mié", "Jue", "Vie", "Sáb", "Dom"]
+
+
+def reporte_ocupacion(
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    estado: Optional[int] = ESTADO_ACTIVA,
+) -> None:
+    """Tabla lugar × día de la semana por mes."""
+    filas = obtener_repositorio().resumen_ocupacion(
+        desde_mes=desde.strftime("%Y-%m") if desde else None,
+        hasta_mes=hasta.strftime("%Y-%m") if hasta else None,
+        estado=estado,
+    )
+    if not filas:
+        print("📋 Sin reservaciones para el reporte")
+        return
+
+    # mes -> lugar -> [conteo por día de la semana]
+    tabla: dict = {}
+    for fila in filas:
+        conteos = tabla.setdefault(fila.mes, {}).setdefault(fila.lugar, [0] * 7)
+        conteos[fila.dia_semana] += fila.cantidad
+
+    for mes, lugares in tabla.items():
+        print(f"\n📅 {mes}")
+        encabezado = "".join(f"{d:>6}" for d in DIAS_SEMANA)
+        print(f"{'Lugar':<20}{encabezado}{'Total':>8}")
+        for lugar, conteos in sorted(lugares.items()):
+            print(
+                f"{lugar:<20}"
+                + "".join(f"{c:>6}" for c in conteos)
+                + f"{sum(conteos):>8}"
+            )
+
+
+def reporte_intentos() -> None:
+    """Éxitos y fallos de cada lugar según su prioridad en la configuración."""
+    filas = obtener_repositorio().resumen_intentos()
+    if not filas:
+        print("📋 Aún no hay intentos de reserva registrados")
+        return
+
+    # (prioridad, lugar) -> [éxitos, fallos]
+    totales: dict = {}
+    for fila in filas:
+        total = totales.setdefault((fila.prioridad, fila.lugar), [0, 0])
+        total[0] += fila.exitos
+        total[1] += fila.fallos
+
+    print(f"{'Prioridad':>9}  {'Lugar':<20}{'Éxitos':>8}{'Fallos':>8}{'% fallo':>9}")
+    for (prioridad, lugar), (exitos, fallos) in sorted(totales.items()):
+        porcentaje = 100 * fallos / (exitos + fallos) if exitos + fallos else 0
+        print(
+            f"{prioridad:>9}  {lugar:<20}{exitos:>8}{fallos:>8}{porcentaje:>8.1f}%"
+        )
+
+
+def _parsear_estado(valor: str) -> int:
+    for codigo, nombre in ESTADOS.items():
+        if valor.lower() in (str(codigo), nombre.lower()):
+            return codigo
+    raise argparse.ArgumentTypeError(f"estado desconocido: {valor}")
+
+
+def _parsear_cursor(valor: str) -> CursorPagina:
+    try:
+        dia, id_ = valor.split(":")
+        return int(dia), int(id_)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"cursor inválido: {valor}") from None
+
+
+def _argumentos(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Consulta y exporta reservaciones")
+    parser.add_argument("--desde", help="Fecha inicial DD/MM/YYYY")
+    parser.add_argument("--hasta", help="Fecha final DD/MM/YYYY")
+    parser.add_argument("--lugar", help="Código de lugar")
+    parser.add_argument(
+        "--estado", type=_parsear_estado, help="activa, cancelada o inactiva"
+    )
+    parser.add_argument(
+        "--formato",
+        choices=sorted(EXPORTADORES) + ["parquet"],
+        default="texto",
+    )
+    parser.add_argument("--salida", help="Archivo de salida (por omisión stdout)")
+    parser.add_argument("--limite", type=int, help="Máximo de filas a exportar")
+    parser.add_argument(
+        "--despues-de",
+        type=_parsear_cursor,
+        help="Cursor DIA:ID devuelto por una exportación anterior con --limite",
+    )
+    parser.add_argument("--tamano-pagina", type=int, default=500)
+    parser.add_argument(
+        "--buscar",
+        metavar="TEXTO",
+        help='Búsqueda de texto completo, p.ej. P17- o "piso 17" (máx. --limite, 50)',
+    )
+    parser.add_argument(
+        "--archivar",
+        type=int,
+        metavar="DIAS",
+        help="Archiva las reservas con más de DIAS días de antigüedad",
+    )
+    parser.add_argument(
+        "--reporte",
+        choices=["ocupacion", "intentos"],
+        help="Muestra un reporte agregado en lugar de las reservaciones",
+    )
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    print("📊 Consultando base de datos de reservaciones")
+    args = _argumentos()
+    print("📊 Consultando base de datos de reservaciones", file=sys.stderr)
 
-    # Mostrar todas las reservaciones
-    consultar_reservaciones_por_fecha()
+    try:
+        obtener_repositorio().inicializar()
+        filtro = FiltroReservas(
+            desde=_parsear_fecha(args.desde),
+            hasta=_parsear_fecha(args.hasta),
+            lugar=args.lugar,
+            estado=args.estado,
+        )
+        if args.archivar is not None:
+            archivadas = obtener_repositorio().archivar(
+                date.today() - timedelta(days=args.archivar)
+            )
+            print(f"🗄️ Reservaciones archivadas: {archivadas}", file=sys.stderr)
+        elif args.buscar:
+            if args.formato == "parquet":
+                raise ValueError("--buscar admite los formatos texto, csv y jsonl")
+            buscar_reservaciones(args.buscar, args.formato, args.limite)
+        elif args.reporte == "ocupacion":
+            reporte_ocupacion(filtro.desde, filtro.hasta, args.estado or ESTADO_ACTIVA)
+        elif args.reporte == "intentos":
+            reporte_intentos()
+        else:
+            siguiente = exportar_reservaciones(
+                filtro,
+                formato=args.formato,
+                salida=args.salida,
+                limite=args.limite,
+                despues_de=args.despues_de,
+                tamano_pagina=args.tamano_pagina,
+            )
+            if siguiente:
+                print(
+                    f"➡️  Siguiente página: --despues-de {siguiente[0]}:{siguiente[1]}",
+                    file=sys.stderr,
+                )
 
-    # Mostrar solo próximas reservaciones
-    # reservaciones_proximas(14)  # Próximos 14 días
+        # Mostrar solo próximas reservaciones
+        # reservaciones_proximas(14)  # Próximos 14 días
+    except (sqlite3.Error, RuntimeError, ValueError) as e:
+        print(f"❌ Error al consultar: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        cerrar_repositorios()
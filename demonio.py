@@ -0,0 +1,256 @@
+"""
+Demonio de reservas: un navegador residente y una RPC local.
+
+Cada ejecución de `run_cargalugar.bat` arranca Python, importa Playwright,
+lanza Chromium e inicia sesión antes de hacer algo útil. El demonio hace
+todo eso una sola vez y deja abiertas (y autenticadas) una página en
+`Reservacion` y otra en `ConsultarReservaciones`; después atiende
+peticiones de `cliente_demonio.py`:
+
+- `reservar`: el proceso completo de CargaLugar.py en la página de reserva
+- `sincronizar`: lee el grid de reservaciones y actualiza la base de datos
+- `cancelar`: cancela las reservaciones (como cancelar_reservaciones.py)
+- `estado`: páginas abiertas, operaciones atendidas, última operación
+- `detener`: cierra el navegador y termina
+
+Las operaciones se atienden de una en una (comparten el navegador). Lo que
+imprime cada operación se devuelve al cliente además de mostrarse aquí.
+`CargaLugar.py` y `cancelar_reservaciones.py` delegan en el demonio si está
+corriendo.
+
+Uso:
+  python demonio.py [--headless]
+"""
+
+import asyncio
+import contextlib
+import io
+import json
+import os
+import secrets
+import sys
+import time
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+from playwright.async_api import Browser, BrowserContext, Page, async_playwright
+
+from CargaLugar import (
+    configurar_variables_entorno,
+    consultar_reservaciones_actuales,
+    inicializar_base_datos,
+    reservar_en_pagina,
+)
+from cancelar_reservaciones import TARGET_URL as URL_CONSULTA, cancelar_todas
+from cliente_demonio import HOST_DEMONIO, METODOS, archivo_token, puerto_demonio
+from esperas_pagina import imprimir_resumen_esperas, reiniciar_mediciones
+from perfil_navegador import abrir_navegador, crear_contexto, obtener_pagina
+from persistencia_async import cerrar_persistencias
+from repositorio_reservaciones import cerrar_repositorios
+from sesion_navegador import GestorSesion
+
+URL_RESERVACION = "https://intranet.mx.deloitte.com/ReservacionesHoteling/Reservacion"
+
+
+class _Duplicador(io.StringIO):
+    """Guarda lo escrito y además lo pasa a la salida original del demonio."""
+
+    def __init__(self, original) -> None:
+        super().__init__()
+        self.original = original
+
+    def write(self, texto: str) -> int:
+        self.original.write(texto)
+        return super().write(texto)
+
+
+class Demonio:
+    """Navegador residente con páginas precargadas y las operaciones de la RPC."""
+
+    def __init__(self, headless: bool = False) -> None:
+        self.headless = headless
+        self.token = secrets.token_hex(16)
+        self.inicio = time.time()
+        self.atendidas = 0
+        self.ultima: Optional[Dict[str, Any]] = None
+        self.terminar = asyncio.Event()
+        self._turno = asyncio.Lock()
+        self._playwright = None
+        self.browser: Optional[Browser] = None
+        self.context: Optional[BrowserContext] = None
+        self.sesion = GestorSesion()
+        self.paginas: Dict[str, Page] = {}
+
+    # ----------------------------------------------------------------
+    # Navegador
+    # ----------------------------------------------------------------
+
+    async def abrir_navegador(self) -> None:
+        self._playwright = await async_playwright().start()
+        self.browser = await abrir_navegador(self._playwright, headless=self.headless)
+        self.context = await crear_contexto(
+            self.browser, **await self.sesion.opciones_contexto()
+        )
+        for nombre, url in (("reserva", URL_RESERVACION), ("consulta", URL_CONSULTA)):
+            await self.pagina(nombre, url)
+        # Sólo se guarda la sesión cuando el grid (que exige login) aparece
+        consulta = self.paginas["consulta"]
+        try:
+            await consulta.wait_for_selector("#gridmisreservas", timeout=90000)
+        except Exception as e:
+            print(f"⚠️ No apareció gridmisreservas: {e}")
+        await self.sesion.guardar(self.context, consulta, "#gridmisreservas")
+        self.sesion.refrescar_en_segundo_plano(self.context)
+
+    async def pagina(self, nombre: str, url: str) -> Page:
+        """Página residente `nombre`; se vuelve a abrir si se cerró o falló."""
+        page = self.paginas.get(nombre)
+        if page is None or page.is_closed():
+            # Con CDP se reutiliza la pestaña que ya esté en esa URL
+            page = await obtener_pagina(self.context, reutilizar=url)
+            self.paginas[nombre] = page
+            print(f"🌐 Precargando {nombre}: {url}")
+            await page.goto(url, timeout=90000)
+        return page
+
+    async def cerrar_navegador(self) -> None:
+        if self.browser is not None:
+            await self.browser.close()
+        if self._playwright is not None:
+            await self._playwright.stop()
+        print("🔒 Navegador cerrado")
+
+    # ----------------------------------------------------------------
+    # Operaciones
+    # ----------------------------------------------------------------
+
+    def estado(self) -> Dict[str, Any]:
+        return {
+            "activo_s": round(time.time() - self.inicio),
+            "atendidas": self.atendidas,
+            "paginas": {
+                nombre: (None if page.is_closed() else page.url)
+                for nombre, page in self.paginas.items()
+            },
+            "ocupado": self._turno.locked(),
+            "ultima": self.ultima,
+        }
+
+    async def _reservar(self) -> bool:
+        # Releer el .env: la configuración puede cambiar sin reiniciar el demonio
+        load_dotenv(override=True)
+        lugares, dias = configurar_variables_entorno()
+        page = await self.pagina("reserva", URL_RESERVACION)
+        # Las consultas van a la página de consulta: la de reserva sigue
+        # cargada en Reservacion y se usa tal cual
+        consulta = await self.pagina("consulta", URL_CONSULTA)
+        exito = await reservar_en_pagina(page, lugares, dias, consulta)
+        await page.goto(URL_RESERVACION, timeout=90000)
+        return exito
+
+    async def _sincronizar(self) -> None:
+        page = await self.pagina("consulta", URL_CONSULTA)
+        await consultar_reservaciones_actuales(page)
+
+    async def _cancelar(self) -> int:
+        page = await self.pagina("consulta", URL_CONSULTA)
+        await page.goto(URL_CONSULTA, timeout=90000)
+        return await cancelar_todas(page)
+
+    async def ejecutar(self, metodo: str) -> Dict[str, Any]:
+        """Ejecuta una operación en turno y devuelve la respuesta de la RPC."""
+        if metodo == "estado":
+            return {"ok": True, "resultado": self.estado(), "ms": 0}
+        if metodo == "detener":
+            self.terminar.set()
+            return {"ok": True, "resultado": None, "ms": 0}
+
+        operaciones = {
+            "reservar": self._reservar,
+            "sincronizar": self._sincronizar,
+            "cancelar": self._cancelar,
+        }
+        async with self._turno:
+            inicio = time.perf_counter()
+            salida = _Duplicador(sys.stdout)
+            respuesta: Dict[str, Any] = {"ok": True, "resultado": None}
+            with contextlib.redirect_stdout(salida):
+                print(f"\n📨 Operación: {metodo}")
+                # El resumen de esperas es de esta operación, no de todo el demonio
+                reiniciar_mediciones()
+                try:
+                    respuesta["resultado"] = await operaciones[metodo]()
+                except Exception as e:
+                    print(f"❌ Error en {metodo}: {e}")
+                    respuesta.update(ok=False, error=str(e))
+                imprimir_resumen_esperas()
+            respuesta["ms"] = (time.perf_counter() - inicio) * 1000
+            respuesta["salida"] = salida.getvalue()
+            self.atendidas += 1
+            self.ultima = {
+                "metodo": metodo,
+                "ok": respuesta["ok"],
+                "ms": round(respuesta["ms"]),
+                "hora": time.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            return respuesta
+
+    # ----------------------------------------------------------------
+    # RPC
+    # ----------------------------------------------------------------
+
+    async def _atender(
+        self, lector: asyncio.StreamReader, escritor: asyncio.StreamWriter
+    ) -> None:
+        try:
+            linea = await lector.readline()
+            try:
+                peticion = json.loads(linea)
+            except ValueError:
+                respuesta = {"ok": False, "error": "petición inválida"}
+            else:
+                metodo = peticion.get("metodo")
+                if not secrets.compare_digest(str(peticion.get("token", "")), self.token):
+                    respuesta = {"ok": False, "error": "token inválido"}
+                elif metodo not in METODOS:
+                    respuesta = {"ok": False, "error": f"método desconocido: {metodo}"}
+                else:
+                    respuesta = await self.ejecutar(metodo)
+            escritor.write(json.dumps(respuesta, ensure_ascii=False).encode() + b"\n")
+            await escritor.drain()
+        except ConnectionError:
+            pass  # el cliente se fue antes de la respuesta
+        finally:
+            escritor.close()
+
+    def _publicar_token(self) -> None:
+        fd = os.open(archivo_token(), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(self.token)
+
+    async def servir(self) -> None:
+        inicializar_base_datos()
+        await self.abrir_navegador()
+        servidor = await asyncio.start_server(
+            self._atender, HOST_DEMONIO, puerto_demonio()
+        )
+        self._publicar_token()
+        print(f"🟢 Demonio escuchando en {HOST_DEMONIO}:{puerto_demonio()}")
+        try:
+            async with servidor:
+                await self.terminar.wait()
+        finally:
+            with contextlib.suppress(OSError):
+                os.remove(archivo_token())
+            await self.cerrar_navegador()
+
+
+if __name__ == "__main__":
+    demonio = Demonio(headless="--headless" in sys.argv)
+    try:
+        asyncio.run(demonio.servir())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        cerrar_persistencias()
+        cerrar_repositorios()
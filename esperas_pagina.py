@@ -0,0 +1,258 @@
+"""
+Esperas por condiciones concretas en lugar de pausas fijas.
+
+`page.wait_for_timeout(25000)` espera 25 s aunque el servidor haya respondido
+en 400 ms. Las funciones de este módulo esperan a que ocurra algo observable
+y siempre tienen un tope (`tope_ms`) para no quedarse colgadas:
+
+- `esperar_selector`: un elemento llega a un estado (visible, oculto, ...)
+- `esperar_respuesta`: el servidor responde a un endpoint (tras una acción)
+- `esperar_quietud_dom`: el DOM deja de cambiar durante una ventana de tiempo
+- `esperar_alerta`: aparece una alerta, o el DOM se aquieta sin que aparezca
+
+Cada espera registra cuánto tardó y, si se indica `reemplaza_ms`, cuánto
+duraba la pausa fija que sustituye; `imprimir_resumen_esperas()` muestra el
+total ahorrado al final de la ejecución.
+"""
+
+import asyncio
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import (
+    AsyncIterator,
+    Callable,
+    List,
+    NamedTuple,
+    Optional,
+    Pattern,
+    Union,
+)
+
+from playwright.async_api import Page, Response
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+
+class MedicionEspera(NamedTuple):
+    """Resultado de una espera: qué se esperó, cuánto tardó y si se cumplió."""
+
+    descripcion: str
+    ms: float
+    cumplida: bool
+    reemplaza_ms: Optional[int] = None
+
+
+_mediciones: List[MedicionEspera] = []
+
+
+def _registrar(
+    descripcion: str, inicio: float, cumplida: bool, reemplaza_ms: Optional[int]
+) -> MedicionEspera:
+    medicion = MedicionEspera(
+        descripcion, (time.perf_counter() - inicio) * 1000, cumplida, reemplaza_ms
+    )
+    _mediciones.append(medicion)
+    estado = "✓" if cumplida else "tope alcanzado"
+    antes = f" (antes {reemplaza_ms} ms fijos)" if reemplaza_ms else ""
+    print(f"⏱️ {descripcion}: {medicion.ms:.0f} ms [{estado}]{antes}")
+    return medicion
+
+
+def reiniciar_mediciones() -> None:
+    """Descarta las esperas registradas (p.ej. al empezar otra operación del demonio)."""
+    _mediciones.clear()
+
+
+def imprimir_resumen_esperas() -> None:
+    """Tiempo total de espera y ahorro frente a las pausas fijas reemplazadas."""
+    if not _mediciones:
+        return
+    total = sum(m.ms for m in _mediciones)
+    comparables = [m for m in _mediciones if m.reemplaza_ms]
+    antes = sum(m.reemplaza_ms for m in comparables)
+    ahora = sum(m.ms for m in comparables)
+    print(
+        f"\n⏱️ Esperas: {len(_mediciones)} | "
+        f"tiempo total esperando: {total / 1000:.1f} s"
+    )
+    if comparables:
+        print(
+            f"   Pausas fijas reemplazadas: {antes / 1000:.1f} s → {ahora / 1000:.1f} s "
+            f"(ahorro {(antes - ahora) / 1000:.1f} s)"
+        )
+
+
+# ====================================================================
+# CONDICIONES
+# ====================================================================
+
+
+async def esperar_selector(
+    page: Page,
+    selector: str,
+    estado: str = "visible",
+    tope_ms: int = 30000,
+    descripcion: Optional[str] = None,
+    reemplaza_ms: Optional[int] = None,
+) -> bool:
+    """Espera a que `selector` llegue a `estado` (attached, detached, visible, hidden)."""
+    inicio = time.perf_counter()
+    try:
+        await page.wait_for_selector(selector, state=estado, timeout=tope_ms)
+        cumplida = True
+    except PlaywrightTimeoutError:
+        cumplida = False
+    _registrar(descripcion or f"{selector} {estado}", inicio, cumplida, reemplaza_ms)
+    return cumplida
+
+
+PatronUrl = Union[str, Pattern[str], Callable[[Response], bool]]
+
+
+def _predicado_respuesta(
+    patron: PatronUrl, metodo: Optional[str]
+) -> Callable[[Response], bool]:
+    if callable(patron):
+        coincide_url = patron
+    elif isinstance(patron, str):
+        coincide_url = lambda r: patron in r.url  # noqa: E731
+    else:
+        coincide_url = lambda r: bool(patron.search(r.url))  # noqa: E731
+
+    def predicado(respuesta: Response) -> bool:
+        if metodo and respuesta.request.method.upper() != metodo.upper():
+            return False
+        return coincide_url(respuesta)
+
+    return predicado
+
+
+@asynccontextmanager
+async def esperar_respuesta(
+    page: Page,
+    patron: PatronUrl,
+    metodo: Optional[str] = None,
+    tope_ms: int = 30000,
+    descripcion: Optional[str] = None,
+    reemplaza_ms: Optional[int] = None,
+) -> AsyncIterator[List[Response]]:
+    """Espera la respuesta de un endpoint provocada por lo que se haga dentro del bloque.
+
+    `patron` puede ser una subcadena de la URL, una expresión regular o un
+    predicado sobre la `Response`. Al salir del bloque se espera la
+    respuesta (hasta `tope_ms`); la lista entregada queda con la respuesta,
+    o vacía si se alcanzó el tope:
+
+        async with esperar_respuesta(page, "/Reservar", metodo="POST") as r:
+            await page.click("#btnReservar")
+        if r: print(r[0].status)
+    """
+    recibidas: List[Response] = []
+    inicio = time.perf_counter()
+    espera = asyncio.ensure_future(
+        page.wait_for_event(
+            "response", predicate=_predicado_respuesta(patron, metodo), timeout=tope_ms
+        )
+    )
+    # Dejar que el listener se registre antes de ejecutar la acción
+    await asyncio.sleep(0)
+    try:
+        yield recibidas
+    except BaseException:
+        espera.cancel()
+        raise
+    try:
+        recibidas.append(await espera)
+    except PlaywrightTimeoutError:
+        pass
+    if isinstance(patron, (str, re.Pattern)):
+        texto = patron if isinstance(patron, str) else patron.pattern
+    else:
+        texto = "respuesta"
+    _registrar(
+        descripcion or f"respuesta {texto}", inicio, bool(recibidas), reemplaza_ms
+    )
+
+
+# Se ejecuta en la página. Resuelve "alerta" si `selector` es visible,
+# "quieto" cuando el DOM pasa `quietudMs` sin cambios, o "tope" al llegar a
+# `topeMs`. Con selector null sólo espera la quietud; con quietudMs null
+# sólo la alerta.
+_JS_OBSERVAR_DOM = """
+({ selector, quietudMs, topeMs }) => new Promise((resolve) => {
+    const visible = () => {
+        const el = selector && document.querySelector(selector);
+        return !!el && !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length);
+    };
+    if (visible()) return resolve("alerta");
+    let quietud = null;
+    let tope = null;
+    let observador = null;
+    const fin = (motivo) => {
+        if (observador) observador.disconnect();
+        clearTimeout(quietud);
+        clearTimeout(tope);
+        resolve(motivo);
+    };
+    const reiniciar = () => {
+        if (quietudMs == null) return;
+        clearTimeout(quietud);
+        quietud = setTimeout(() => fin("quieto"), quietudMs);
+    };
+    observador = new MutationObserver(() => (visible() ? fin("alerta") : reiniciar()));
+    observador.observe(document, {
+        subtree: true, childList: true, attributes: true, characterData: true,
+    });
+    reiniciar();
+    tope = setTimeout(() => fin("tope"), topeMs);
+})
+"""
+
+
+async def _observar_dom(
+    page: Page, selector: Optional[str], quietud_ms: Optional[int], tope_ms: int
+) -> str:
+    try:
+        return await page.evaluate(
+            _JS_OBSERVAR_DOM,
+            {"selector": selector, "quietudMs": quietud_ms, "topeMs": tope_ms},
+        )
+    except Exception as e:
+        # Una navegación destruye el contexto de ejecución: la página cambió
+        if "context was destroyed" in str(e) or "navigat" in str(e):
+            return "navegacion"
+        raise
+
+
+async def esperar_quietud_dom(
+    page: Page,
+    quietud_ms: int = 500,
+    tope_ms: int = 10000,
+    descripcion: Optional[str] = None,
+    reemplaza_ms: Optional[int] = None,
+) -> bool:
+    """Espera a que el DOM pase `quietud_ms` sin mutaciones (p.ej. tras cargar un grid)."""
+    inicio = time.perf_counter()
+    motivo = await _observar_dom(page, None, quietud_ms, tope_ms)
+    cumplida = motivo != "tope"
+    _registrar(descripcion or "DOM sin cambios", inicio, cumplida, reemplaza_ms)
+    return cumplida
+
+
+async def esperar_alerta(
+    page: Page,
+    selector: str,
+    quietud_ms: Optional[int] = 500,
+    tope_ms: int = 3000,
+    descripcion: Optional[str] = None,
+) -> bool:
+    """True si `selector` se hace visible antes de que el DOM se aquiete (o del tope).
+
+    Sirve para acciones cuyo único aviso de fallo es una alerta: en el caso
+    exitoso no se espera el tope completo, sólo la ventana de quietud. Con
+    `quietud_ms=None` se espera la alerta (o una navegación) hasta el tope.
+    """
+    inicio = time.perf_counter()
+    motivo = await _observar_dom(page, selector, quietud_ms, tope_ms)
+    _registrar(descripcion or f"alerta {selector}", inicio, motivo != "tope", None)
+    return motivo == "alerta"
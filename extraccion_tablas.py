@@ -0,0 +1,126 @@
+"""
+Extracción masiva de tablas HTML con una sola evaluación en la página.
+
+Leer una tabla celda por celda (`locator("td").all()` y luego `inner_text()`
+por celda) cuesta un viaje de ida y vuelta al navegador por celda: unas 550
+para un grid de 50 filas × 10 columnas. `extraer_tabla` recorre las filas
+dentro de la página y devuelve todos los textos (o sólo las columnas pedidas)
+en una única llamada.
+
+Para grids de Kendo UI, `extraer_filas_kendo` lee directamente el
+`dataSource` del widget: incluye las filas de todas las páginas del grid, no
+sólo las que están pintadas. Si los registros no se pueden llevar a las
+columnas del HTML (datos agrupados, columnas sin `field`, fechas que no son
+DD/MM/YYYY) devuelve None y el llamador lee la tabla con `extraer_tabla`.
+
+Uso típico:
+
+    filas = await extraer_tabla(page.locator("#gridmisreservas table tbody tr"))
+    fechas = await extraer_columna(page.locator("tbody tr"), 0)
+    filas = await extraer_filas_kendo(page.locator("#gridmisreservas"))
+"""
+
+from typing import List, Optional, Sequence
+
+from playwright.async_api import Locator
+
+from calendario_reservas import parsear_fecha
+
+
+# Se ejecuta en la página: una lista de textos por fila. Con `columnas`, sólo
+# esas posiciones (cadena vacía si la fila no tiene esa celda).
+_JS_EXTRAER_FILAS = """
+(filas, columnas) => filas.map((fila) => {
+    const celdas = Array.from(fila.querySelectorAll(":scope > td"));
+    const texto = (celda) => (celda ? celda.innerText : "").trim();
+    return columnas === null
+        ? celdas.map(texto)
+        : columnas.map((i) => texto(celdas[i]));
+})
+"""
+
+
+async def extraer_tabla(
+    filas: Locator, columnas: Optional[Sequence[int]] = None
+) -> List[List[str]]:
+    """Devuelve el texto de las celdas `td` de cada fila de `filas`.
+
+    La posición de cada fila en el resultado es la misma que en el locator,
+    así que `filas.nth(i)` sirve para interactuar después con la fila i.
+    """
+    return await filas.evaluate_all(
+        _JS_EXTRAER_FILAS, list(columnas) if columnas is not None else None
+    )
+
+
+async def extraer_columna(filas: Locator, columna: int) -> List[str]:
+    """Texto de una sola columna (índice desde 0) de cada fila."""
+    return [fila[0] for fila in await extraer_tabla(filas, [columna])]
+
+
+# Se ejecuta en la página sobre el elemento del grid. Devuelve null si no hay
+# widget Kendo (o no aparece en `esperaMs`), si los datos están agrupados
+# (`data()` trae grupos, no registros) o si ninguna columna tiene `field`; si
+# no, una lista de textos por registro en el orden de las columnas visibles en
+# el HTML (las fechas como DD/MM/YYYY, las columnas sin `field` vacías). Con
+# paginado en el servidor pide todos los registros en una sola consulta.
+_JS_FILAS_KENDO = """
+async (elemento, esperaMs) => {
+    const jq = window.jQuery || (window.kendo && window.kendo.jQuery);
+    if (!jq) return null;
+    let grid = jq(elemento).data("kendoGrid");
+    for (let t = 0; !grid && t < esperaMs; t += 100) {
+        await new Promise((r) => setTimeout(r, 100));
+        grid = jq(elemento).data("kendoGrid");
+    }
+    if (!grid || !grid.dataSource) return null;
+    const ds = grid.dataSource;
+    await ds.fetch();
+    if (ds.options.serverPaging && ds.total() > ds.data().length) {
+        await ds.query({
+            page: 1, pageSize: ds.total(),
+            sort: ds.sort(), filter: ds.filter(), group: ds.group(),
+        });
+    }
+    if (ds.group().length) return null;
+    const hojas = (cols) => cols.flatMap((c) => (c.columns ? hojas(c.columns) : [c]));
+    const campos = hojas(grid.columns).map((c) => c.field || null);
+    if (!campos.some((campo) => campo)) return null;
+    const dos = (n) => String(n).padStart(2, "0");
+    const texto = (v) => {
+        if (v === null || v === undefined) return "";
+        if (v instanceof Date)
+            return `${dos(v.getDate())}/${dos(v.getMonth() + 1)}/${v.getFullYear()}`;
+        return String(v).trim();
+    };
+    const valor = (item, campo) =>
+        typeof item.get === "function" ? item.get(campo) : item[campo];
+    return Array.from(ds.data()).map((item) =>
+        campos.map((campo) => (campo ? texto(valor(item, campo)) : ""))
+    );
+}
+"""
+
+
+async def extraer_filas_kendo(
+    grid: Locator, espera_ms: int = 5000, columna_fecha: Optional[int] = None
+) -> Optional[List[List[str]]]:
+    """Filas del `dataSource` de un grid Kendo, con el mismo orden de columnas que el HTML.
+
+    Devuelve todos los registros sin importar el paginado del grid, o None
+    si el elemento no tiene un widget Kendo o sus registros no se pueden
+    mapear a las columnas (para leer el HTML en su lugar). Con
+    `columna_fecha`, cada registro tiene que traer ahí una fecha DD/MM/YYYY.
+    El orden es el de los datos, no necesariamente el del grid ordenado.
+    """
+    filas = await grid.evaluate(_JS_FILAS_KENDO, espera_ms)
+    if filas is None or columna_fecha is None:
+        return filas
+    for fila in filas:
+        if len(fila) <= columna_fecha or parsear_fecha(fila[columna_fecha]) is None:
+            print(
+                "⚠️ El modelo del grid no tiene fechas DD/MM/YYYY en la columna "
+                f"{columna_fecha + 1}; se lee la tabla HTML"
+            )
+            return None
+    return filas
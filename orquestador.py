@@ -0,0 +1,242 @@
+"""
+Orquestador de reservas para varias personas.
+
+Cada persona del equipo tenía su propio `.env` y las reservas corrían una
+tras otra en procesos separados. El orquestador lee un directorio de
+perfiles (`PERFILES_DIR`, `perfiles/` por omisión) con un `.env` por
+persona:
+
+    perfiles/
+      ana.env       # LUGARES_RESERVA=..., DIAS_RESERVA=...
+      luis.env
+
+El nombre del archivo es el usuario. Cada perfil corre el mismo proceso que
+`CargaLugar.py` en su propio contexto del navegador (aislado: cookies y
+storage state propios, guardados en `perfiles/<usuario>.sesion.json` o en
+el `ARCHIVO_SESION` del perfil). Los perfiles se reparten entre un pool
+acotado de procesos de Chromium (`ORQUESTADOR_NAVEGADORES`), cada uno con
+hasta `ORQUESTADOR_CONTEXTOS` perfiles a la vez. Todos escriben en la misma
+base, cada uno en su partición (`usuario`, ver `repositorio_reservaciones`).
+Al final se imprime un resumen por usuario y el tiempo total.
+
+La primera vez, cada perfil tiene que iniciar sesión a mano en su ventana
+(sin `--headless`); las siguientes reutilizan su sesión guardada.
+
+Uso:
+  python orquestador.py [--headless] [directorio_de_perfiles]
+"""
+
+import asyncio
+import glob
+import os
+import sys
+import time
+from datetime import date
+from typing import Dict, List, NamedTuple
+
+from dotenv import dotenv_values, load_dotenv
+from playwright.async_api import Browser, async_playwright
+
+from CargaLugar import (
+    configurar_variables_entorno,
+    inicializar_base_datos,
+    reservar_en_pagina,
+)
+from esperas_pagina import imprimir_resumen_esperas
+from perfil_navegador import crear_contexto
+from persistencia_async import cerrar_persistencias, obtener_persistencia
+from repositorio_reservaciones import cerrar_repositorios, fijar_usuario, usuario_actual
+from sesion_navegador import GestorSesion
+
+load_dotenv()
+
+URL_RESERVACION = "https://intranet.mx.deloitte.com/ReservacionesHoteling/Reservacion"
+
+PERFILES_DIR = "perfiles"
+
+
+class PerfilUsuario(NamedTuple):
+    """Configuración de reserva de una persona (su `.env` en `PERFILES_DIR`)."""
+
+    usuario: str
+    lugares: List[str]
+    dias: List[int]
+    archivo_sesion: str
+
+
+class ResumenUsuario(NamedTuple):
+    """Resultado de un perfil (`nuevas` y `activas`: reservas vigentes en la base)."""
+
+    usuario: str
+    exito: bool
+    nuevas: int
+    activas: int
+    segundos: float
+    error: str = ""
+
+
+def _entero(nombre: str, base: int) -> int:
+    return max(1, int(os.getenv(nombre, str(base))))
+
+
+def cargar_perfiles(directorio: str) -> List[PerfilUsuario]:
+    """Un perfil por cada `<usuario>.env` del directorio, en orden alfabético."""
+    perfiles = []
+    for ruta in sorted(glob.glob(os.path.join(directorio, "*.env"))):
+        usuario = os.path.splitext(os.path.basename(ruta))[0]
+        valores = dotenv_values(ruta)
+        print(f"👤 Perfil {usuario}:")
+        lugares, dias = configurar_variables_entorno(valores)
+        sesion = valores.get("ARCHIVO_SESION") or os.path.join(
+            directorio, f"{usuario}.sesion.json"
+        )
+        perfiles.append(PerfilUsuario(usuario, lugares, dias, sesion))
+    return perfiles
+
+
+class _SalidaPorUsuario:
+    """Antepone `[usuario]` a cada línea impresa desde la tarea de un perfil.
+
+    Si una tarea imprime una línea por partes (`print(..., end="")`) y otra
+    escribe en medio, cada usuario conserva su propio estado de inicio de línea.
+    """
+
+    def __init__(self, original) -> None:
+        self.original = original
+        self._inicio_linea: Dict[str, bool] = {}
+
+    def write(self, texto: str) -> int:
+        usuario = usuario_actual()
+        inicio_linea = self._inicio_linea.get(usuario, True)
+        partes = []
+        for linea in texto.splitlines(keepends=True):
+            if inicio_linea and usuario:
+                partes.append(f"[{usuario}] ")
+            partes.append(linea)
+            inicio_linea = linea.endswith("\n")
+        self._inicio_linea[usuario] = inicio_linea
+        self.original.write("".join(partes))
+        return len(texto)
+
+    def flush(self) -> None:
+        self.original.flush()
+
+
+# ====================================================================
+# EJECUCIÓN DE UN PERFIL
+# ====================================================================
+
+
+async def _reservas_activas() -> int:
+    persistencia = obtener_persistencia()
+    await persistencia.vaciar()
+    dias = await persistencia.ejecutar(persistencia.repo.dias_reservados, date.today())
+    return len(dias)
+
+
+async def reservar_perfil(
+    perfil: PerfilUsuario, turnos: "asyncio.Queue[Browser]"
+) -> ResumenUsuario:
+    """Reserva para `perfil` en un contexto propio de un navegador del pool."""
+    # Esta tarea (y las que cree) lee y escribe la partición del usuario
+    fijar_usuario(perfil.usuario)
+    antes = await _reservas_activas()
+    browser = await turnos.get()
+    inicio = time.perf_counter()
+    exito, error = False, ""
+    context = None
+    try:
+        sesion = GestorSesion(perfil.archivo_sesion)
+        context = await crear_contexto(browser, **await sesion.opciones_contexto())
+        page = await context.new_page()
+        print("🌐 Navegando al sitio de reservas...")
+        await page.goto(URL_RESERVACION, timeout=90000)
+        await page.wait_for_selector(
+            "xpath=//h3[contains(text(),'Solicitar reservación')]", timeout=90000
+        )
+        await sesion.guardar(
+            context, page, "xpath=//h3[contains(text(),'Solicitar reservación')]"
+        )
+        exito = await reservar_en_pagina(page, perfil.lugares, perfil.dias)
+    except Exception as e:
+        error = str(e).splitlines()[0] if str(e) else type(e).__name__
+        print(f"❌ Error durante el proceso de reserva: {error}")
+    finally:
+        if context is not None:
+            await context.close()
+        turnos.put_nowait(browser)
+    segundos = time.perf_counter() - inicio
+    despues = await _reservas_activas()
+    return ResumenUsuario(
+        perfil.usuario, exito, max(0, despues - antes), despues, segundos, error
+    )
+
+
+def imprimir_resumen(resumenes: List[ResumenUsuario], total_s: float) -> None:
+    print("\n📊 Resumen por usuario:")
+    ancho = max(len(r.usuario) for r in resumenes)
+    for r in resumenes:
+        icono = "✅" if r.exito else ("❌" if r.error else "⚠️")
+        linea = (
+            f"  {icono} {r.usuario:<{ancho}}  nuevas={r.nuevas:<3} "
+            f"activas={r.activas:<3} {r.segundos:6.1f} s"
+        )
+        print(linea + (f"  ({r.error})" if r.error else ""))
+    secuencial = sum(r.segundos for r in resumenes)
+    print(
+        f"⏱️ Tiempo total: {total_s:.1f} s para {len(resumenes)} usuarios "
+        f"(uno tras otro: {secuencial:.1f} s)"
+    )
+
+
+async def orquestar(directorio: str, headless: bool = False) -> None:
+    perfiles = cargar_perfiles(directorio)
+    if not perfiles:
+        print(f"❌ No hay perfiles (*.env) en {directorio}")
+        return
+
+    inicializar_base_datos()
+    navegadores = min(_entero("ORQUESTADOR_NAVEGADORES", 2), len(perfiles))
+    contextos = _entero("ORQUESTADOR_CONTEXTOS", 2)
+    print(
+        f"🚀 {len(perfiles)} perfiles en {navegadores} navegador(es), "
+        f"hasta {contextos} por navegador"
+    )
+
+    inicio = time.perf_counter()
+    async with async_playwright() as playwright:
+        # Se lanza siempre un Chromium propio (no CDP): los contextos tienen
+        # que estar aislados entre usuarios
+        browsers = [
+            await playwright.chromium.launch(headless=headless)
+            for _ in range(navegadores)
+        ]
+        # Un turno por contexto permitido en cada navegador: tomar uno es
+        # tomar turno, así nunca hay más de navegadores × contextos perfiles
+        turnos: "asyncio.Queue[Browser]" = asyncio.Queue()
+        for _ in range(contextos):
+            for browser in browsers:
+                turnos.put_nowait(browser)
+        try:
+            resumenes = await asyncio.gather(
+                *(reservar_perfil(p, turnos) for p in perfiles)
+            )
+        finally:
+            for browser in browsers:
+                await browser.close()
+
+    imprimir_resumen(list(resumenes), time.perf_counter() - inicio)
+    imprimir_resumen_esperas()
+
+
+if __name__ == "__main__":
+    argumentos = [a for a in sys.argv[1:] if not a.startswith("--")]
+    directorio = (
+        argumentos[0] if argumentos else os.getenv("PERFILES_DIR", PERFILES_DIR)
+    )
+    sys.stdout = _SalidaPorUsuario(sys.stdout)
+    try:
+        asyncio.run(orquestar(directorio, headless="--headless" in sys.argv))
+    finally:
+        cerrar_persistencias()
+        cerrar_repositorios()
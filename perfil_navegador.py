@@ -0,0 +1,443 @@
+"""
+Perfil del contexto del navegador: menos recursos y menos trabajo de render.
+
+La automatización sólo necesita el HTML, los scripts, las hojas de estilo y
+las peticiones XHR del sitio. Cada carga de `ReservacionesHoteling` además
+descarga imágenes, fuentes y analítica, y los dropdowns de select2 y las
+alertas de Bootstrap se animan antes de que `page.click` pueda usarlos.
+`crear_contexto` abre el contexto con:
+
+- bloqueo por ruta de tipos de recurso (imágenes, media, fuentes) y de URLs
+  de analítica
+- `prefers-reduced-motion`, transiciones/animaciones CSS en 0 s y
+  `jQuery.fx.off` (animaciones de jQuery instantáneas)
+- un viewport más chico
+- service workers bloqueados
+
+Al cerrar el contexto se imprime cuántas peticiones se bloquearon y cuántos
+bytes se evitaron. El tamaño de lo bloqueado no se conoce sin descargarlo:
+se estima con el Content-Length que esa URL tuvo en una ejecución anterior
+(guardado en `NAVEGADOR_TAMANOS_ARCHIVO`) o, si nunca se vio, con un tamaño
+típico por tipo de recurso. Una ejecución con `PERFIL_NAVEGADOR=completo`
+registra los tamaños de todo lo que descarga.
+
+`PERFIL_NAVEGADOR=completo` abre el contexto como antes (sin bloqueos). Los
+demás valores se ajustan desde el .env (ver `.env.example`).
+
+`abrir_navegador` se conecta por CDP a un Chromium ya abierto si se define
+`NAVEGADOR_CDP_URL`; en ese caso se reutilizan su contexto y sus pestañas
+(`obtener_pagina`) y el perfil se aplica sólo a la pestaña de trabajo.
+"""
+
+import json
+import os
+import re
+import tempfile
+import weakref
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+from dotenv import load_dotenv
+from playwright.async_api import (
+    Browser,
+    BrowserContext,
+    Page,
+    Playwright,
+    Request,
+    Route,
+)
+
+
+load_dotenv()
+
+
+class PerfilNavegador(NamedTuple):
+    """Opciones aplicadas a cada contexto del navegador."""
+
+    tipos_bloqueados: Tuple[str, ...] = ("image", "media", "font")
+    # Subcadenas de URL bloqueadas sin importar el tipo (analítica, telemetría)
+    urls_bloqueadas: Tuple[str, ...] = (
+        "google-analytics.com",
+        "googletagmanager.com",
+        "doubleclick.net",
+        "clarity.ms",
+        "hotjar.com",
+        "newrelic.com",
+        "nr-data.net",
+        "applicationinsights",
+        "dc.services.visualstudio.com",
+    )
+    sin_animaciones: bool = True
+    viewport: Optional[Tuple[int, int]] = (1280, 800)
+    bloquear_service_workers: bool = True
+
+
+# Perfil sin cambios: el contexto se abre igual que antes de este módulo
+PERFIL_COMPLETO = PerfilNavegador(
+    tipos_bloqueados=(),
+    urls_bloqueadas=(),
+    sin_animaciones=False,
+    viewport=None,
+    bloquear_service_workers=False,
+)
+
+
+def _lista(valor: Optional[str], base: Tuple[str, ...]) -> Tuple[str, ...]:
+    if valor is None:
+        return base
+    return tuple(s.strip() for s in valor.split(",") if s.strip())
+
+
+def _viewport(
+    valor: Optional[str], base: Optional[Tuple[int, int]]
+) -> Optional[Tuple[int, int]]:
+    if valor is None:
+        return base
+    coincidencia = re.fullmatch(r"\s*(\d+)\s*[xX]\s*(\d+)\s*", valor)
+    return (int(coincidencia[1]), int(coincidencia[2])) if coincidencia else None
+
+
+def _bandera(nombre: str, base: bool) -> bool:
+    valor = os.getenv(nombre)
+    if valor is None:
+        return base
+    return valor.strip().lower() in ("1", "true", "si", "sí")
+
+
+def cargar_perfil_navegador() -> PerfilNavegador:
+    """Construye el perfil desde variables de entorno (con valores por omisión)."""
+    if os.getenv("PERFIL_NAVEGADOR", "ligero").strip().lower() == "completo":
+        return PERFIL_COMPLETO
+    base = PerfilNavegador()
+    return PerfilNavegador(
+        tipos_bloqueados=_lista(
+            os.getenv("NAVEGADOR_BLOQUEAR_TIPOS"), base.tipos_bloqueados
+        ),
+        urls_bloqueadas=_lista(
+            os.getenv("NAVEGADOR_BLOQUEAR_URLS"), base.urls_bloqueadas
+        ),
+        sin_animaciones=_bandera("NAVEGADOR_SIN_ANIMACIONES", base.sin_animaciones),
+        viewport=_viewport(os.getenv("NAVEGADOR_VIEWPORT"), base.viewport),
+        bloquear_service_workers=_bandera(
+            "NAVEGADOR_BLOQUEAR_SERVICE_WORKERS", base.bloquear_service_workers
+        ),
+    )
+
+
+PERFIL_NAVEGADOR = cargar_perfil_navegador()
+
+# Se inyecta en cada documento antes de sus scripts
+_JS_SIN_ANIMACIONES = """
+(() => {
+    const css = `*, *::before, *::after {
+        animation-duration: 0s !important; animation-delay: 0s !important;
+        transition-duration: 0s !important; transition-delay: 0s !important;
+        scroll-behavior: auto !important;
+    }`;
+    const aplicar = () => {
+        const estilo = document.createElement("style");
+        estilo.textContent = css;
+        (document.head || document.documentElement).appendChild(estilo);
+        if (window.jQuery) window.jQuery.fx.off = true;
+    };
+    if (document.readyState === "loading") {
+        document.addEventListener("DOMContentLoaded", aplicar);
+    } else {
+        aplicar();
+    }
+})();
+"""
+
+
+# ====================================================================
+# CONTADORES DE AHORRO
+# ====================================================================
+
+
+ARCHIVO_TAMANOS = "tamanos_recursos.json"
+# URLs recordadas como máximo (se descartan las vistas hace más tiempo)
+MAX_TAMANOS = 2000
+
+# Tamaño típico por tipo de recurso (bytes) cuando la URL nunca se descargó
+TAMANO_TIPICO = {
+    "image": 25 * 1024,
+    "media": 300 * 1024,
+    "font": 40 * 1024,
+    "script": 50 * 1024,
+    "stylesheet": 20 * 1024,
+}
+TAMANO_OTRO = 5 * 1024
+
+# URL (sin query) -> último Content-Length visto
+_tamanos: Optional[Dict[str, int]] = None
+
+
+def archivo_tamanos() -> str:
+    return os.getenv("NAVEGADOR_TAMANOS_ARCHIVO", ARCHIVO_TAMANOS)
+
+
+def _clave_url(url: str) -> str:
+    # Sin la query: los parámetros anti-caché cambian en cada carga
+    return url.split("?", 1)[0]
+
+
+def _cargar_tamanos() -> Dict[str, int]:
+    global _tamanos
+    if _tamanos is None:
+        try:
+            with open(archivo_tamanos(), encoding="utf-8") as f:
+                _tamanos = {k: int(v) for k, v in json.load(f).items()}
+        except (OSError, ValueError, AttributeError):
+            _tamanos = {}
+    return _tamanos
+
+
+def registrar_tamano(respuesta) -> int:
+    """Recuerda el Content-Length de `respuesta` para estimar bloqueos futuros."""
+    tamano = _tamano_respuesta(respuesta)
+    if tamano:
+        tamanos = _cargar_tamanos()
+        clave = _clave_url(respuesta.url)
+        # Reinsertar la deja al final: las primeras son las menos recientes
+        tamanos.pop(clave, None)
+        tamanos[clave] = tamano
+    return tamano
+
+
+def guardar_tamanos() -> None:
+    """Escribe los tamaños recordados (escritura atómica)."""
+    if not _tamanos:
+        return
+    recientes = dict(list(_tamanos.items())[-MAX_TAMANOS:])
+    ruta = archivo_tamanos()
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    try:
+        fd, temporal = tempfile.mkstemp(dir=directorio, suffix=".tmp")
+    except OSError as e:
+        print(f"⚠️ No se pudieron guardar los tamaños de recursos: {e}")
+        return
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(recientes, f)
+        os.replace(temporal, ruta)
+    except BaseException:
+        os.unlink(temporal)
+        raise
+
+
+class AhorroRecursos:
+    """Peticiones bloqueadas y bytes descargados/evitados (estimados) en un contexto."""
+
+    def __init__(self) -> None:
+        self.peticiones = 0
+        self.bloqueadas: Counter = Counter()
+        self.bytes_descargados = 0
+        self.bytes_evitados = 0
+        self.por_tamano_tipico = 0
+
+    def registrar_bloqueo(self, peticion: Request) -> None:
+        tipo = peticion.resource_type
+        self.bloqueadas[tipo] += 1
+        tamano = _cargar_tamanos().get(_clave_url(peticion.url))
+        if tamano is None:
+            tamano = TAMANO_TIPICO.get(tipo, TAMANO_OTRO)
+            self.por_tamano_tipico += 1
+        self.bytes_evitados += tamano
+
+    def registrar_respuesta(self, respuesta) -> None:
+        self.bytes_descargados += registrar_tamano(respuesta)
+
+    def imprimir(self) -> None:
+        guardar_tamanos()
+        if not self.peticiones:
+            return
+        total_bloqueadas = sum(self.bloqueadas.values())
+        detalle = ", ".join(f"{t}: {n}" for t, n in self.bloqueadas.most_common())
+        print(
+            f"\n🧹 Perfil del navegador: {total_bloqueadas}/{self.peticiones} "
+            f"peticiones bloqueadas" + (f" ({detalle})" if detalle else "")
+        )
+        print(
+            f"   Descargado (Content-Length): {self.bytes_descargados / 1024:.0f} KiB"
+        )
+        if total_bloqueadas:
+            tipicos = (
+                f", {self.por_tamano_tipico} con tamaño típico"
+                if self.por_tamano_tipico
+                else ""
+            )
+            print(
+                f"   Evitado (estimado): {self.bytes_evitados / 1024:.0f} KiB{tipicos}"
+            )
+
+
+def _tamano_respuesta(respuesta) -> int:
+    try:
+        return int(respuesta.headers.get("content-length", "0"))
+    except ValueError:
+        return 0
+
+
+# ====================================================================
+# NAVEGADOR
+# ====================================================================
+
+# Navegadores conectados por CDP y contextos suyos que se reutilizan (no se
+# crearon aquí): el perfil se aplica por página para no afectar las demás
+# pestañas del usuario, y al terminar sólo se desconecta
+_navegadores_cdp: "weakref.WeakSet[Browser]" = weakref.WeakSet()
+_contextos_prestados: "weakref.WeakSet[BrowserContext]" = weakref.WeakSet()
+# En los contextos prestados `obtener_pagina` se llama una vez por operación
+# (el demonio): el perfil se instala una sola vez por página y el ahorro se
+# acumula y se reporta una sola vez por contexto
+_paginas_con_perfil: "weakref.WeakSet[Page]" = weakref.WeakSet()
+_ahorro_prestado: "weakref.WeakKeyDictionary[BrowserContext, AhorroRecursos]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def es_contexto_prestado(contexto: BrowserContext) -> bool:
+    """True si el contexto es el del navegador del usuario (conectado por CDP)."""
+    return contexto in _contextos_prestados
+
+
+def url_cdp() -> Optional[str]:
+    """Endpoint CDP de un Chromium ya abierto (`NAVEGADOR_CDP_URL`), si lo hay."""
+    return os.getenv("NAVEGADOR_CDP_URL", "").strip() or None
+
+
+async def abrir_navegador(playwright: Playwright, headless: bool = False) -> Browser:
+    """Se conecta por CDP al Chromium indicado en `NAVEGADOR_CDP_URL` o lanza uno nuevo.
+
+    Conectarse evita arrancar otro proceso e iniciar sesión otra vez: se usa
+    el navegador donde el usuario ya entró a la intranet (abierto con
+    `--remote-debugging-port=9222`), con su caché caliente. `browser.close()`
+    sobre ese navegador sólo se desconecta; no lo cierra.
+    """
+    endpoint = url_cdp()
+    if endpoint:
+        try:
+            browser = await playwright.chromium.connect_over_cdp(
+                endpoint, timeout=10000
+            )
+        except Exception as e:
+            print(f"⚠️ No se pudo conectar por CDP a {endpoint} ({e})")
+            print("🚀 Lanzando un Chromium nuevo")
+        else:
+            _navegadores_cdp.add(browser)
+            print(f"🔌 Conectado por CDP a {endpoint}")
+            return browser
+    return await playwright.chromium.launch(headless=headless)
+
+
+async def obtener_pagina(
+    contexto: BrowserContext,
+    perfil: PerfilNavegador = PERFIL_NAVEGADOR,
+    reutilizar: str = "ReservacionesHoteling",
+) -> Page:
+    """Página de trabajo del contexto.
+
+    En un contexto prestado (CDP) se reutiliza la pestaña que ya esté en una
+    URL que contenga `reutilizar` (la que dejó la ejecución anterior) y se
+    deja abierta al terminar; si no hay, se abre una. En un contexto propio
+    siempre es una página nueva.
+    """
+    if contexto not in _contextos_prestados:
+        return await contexto.new_page()
+    page = next(
+        (p for p in contexto.pages if reutilizar and reutilizar in p.url), None
+    )
+    if page is None:
+        page = await contexto.new_page()
+    else:
+        print(f"♻️ Reutilizando pestaña abierta: {page.url}")
+    if perfil != PERFIL_COMPLETO and page not in _paginas_con_perfil:
+        ahorro = _ahorro_prestado.get(contexto)
+        if ahorro is None:
+            ahorro = _ahorro_prestado[contexto] = AhorroRecursos()
+            if contexto.browser is not None:
+                contexto.browser.on(
+                    "disconnected", lambda _browser: ahorro.imprimir()
+                )
+        await _instalar_perfil(page, contexto, perfil, ahorro)
+        _paginas_con_perfil.add(page)
+    return page
+
+
+# ====================================================================
+# CONTEXTO
+# ====================================================================
+
+
+async def _instalar_perfil(
+    objetivo: Union[BrowserContext, Page],
+    contexto: BrowserContext,
+    perfil: PerfilNavegador,
+    ahorro: Optional[AhorroRecursos] = None,
+) -> AhorroRecursos:
+    """Bloqueos, animaciones y contadores sobre un contexto o una sola página.
+
+    `ahorro` permite acumular varias páginas en los mismos contadores.
+    """
+    if perfil.sin_animaciones:
+        await objetivo.add_init_script(_JS_SIN_ANIMACIONES)
+        if isinstance(objetivo, Page) and objetivo.url != "about:blank":
+            # Página ya cargada: el init script sólo aplica a la siguiente carga
+            await objetivo.evaluate(_JS_SIN_ANIMACIONES)
+
+    if ahorro is None:
+        ahorro = AhorroRecursos()
+    tipos = frozenset(perfil.tipos_bloqueados)
+    urls: List[str] = list(perfil.urls_bloqueadas)
+
+    async def filtrar(ruta: Route, peticion: Request) -> None:
+        if peticion.resource_type in tipos or any(u in peticion.url for u in urls):
+            ahorro.registrar_bloqueo(peticion)
+            await ruta.abort("blockedbyclient")
+        else:
+            await ruta.continue_()
+
+    def contar_peticion(_peticion: Request) -> None:
+        ahorro.peticiones += 1
+
+    if tipos or urls:
+        await objetivo.route("**/*", filtrar)
+    objetivo.on("request", contar_peticion)
+    objetivo.on("response", ahorro.registrar_respuesta)
+    return ahorro
+
+
+async def crear_contexto(
+    browser: Browser, perfil: PerfilNavegador = PERFIL_NAVEGADOR, **opciones
+) -> BrowserContext:
+    """`browser.new_context` con el perfil aplicado y el reporte de ahorro al cerrar.
+
+    `opciones` se pasan tal cual a `new_context` (p.ej. `storage_state`).
+    Con un navegador conectado por CDP se reutiliza su contexto (cookies y
+    caché del usuario) y se ignoran las opciones; el perfil se aplica a cada
+    página de `obtener_pagina`.
+    """
+    if browser in _navegadores_cdp and browser.contexts:
+        contexto = browser.contexts[0]
+        _contextos_prestados.add(contexto)
+        return contexto
+
+    opciones.setdefault("ignore_https_errors", True)
+    if perfil.viewport:
+        ancho, alto = perfil.viewport
+        opciones.setdefault("viewport", {"width": ancho, "height": alto})
+    if perfil.sin_animaciones:
+        opciones.setdefault("reduced_motion", "reduce")
+    if perfil.bloquear_service_workers:
+        opciones.setdefault("service_workers", "block")
+
+    contexto = await browser.new_context(**opciones)
+    if perfil == PERFIL_COMPLETO:
+        # Sin bloqueos se descarga todo: sirve para aprender los tamaños
+        contexto.on("response", registrar_tamano)
+        contexto.on("close", lambda _contexto: guardar_tamanos())
+        return contexto
+
+    ahorro = await _instalar_perfil(contexto, contexto, perfil)
+    contexto.on("close", lambda _contexto: ahorro.imprimir())
+    return contexto
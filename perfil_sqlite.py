@@ -0,0 +1,115 @@
+"""
+Perfil de almacenamiento SQLite compartido por todas las conexiones.
+
+`CargaLugar.py`, `carga_lugar_por_fecha.py` y `consultar_db.py` pueden usar
+el mismo `reservaciones.db` al mismo tiempo. Para que eso no termine en
+"database is locked", cada conexión se abre con:
+
+- journal en modo WAL: los lectores nunca bloquean al escritor ni viceversa
+- `synchronous=NORMAL`: en WAL sólo sincroniza a disco en los checkpoints
+- caché de páginas y `mmap_size` más grandes que los valores por omisión
+- `busy_timeout` para esperar al escritor de otro proceso en lugar de fallar
+- reintentos con espera creciente al abrir transacciones de escritura
+
+Todos los valores se pueden ajustar desde el .env (ver `.env.example`).
+"""
+
+import os
+import random
+import sqlite3
+import time
+from typing import NamedTuple
+
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+
+class PerfilAlmacenamiento(NamedTuple):
+    """Parámetros aplicados a cada conexión SQLite."""
+
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    # Negativo = KiB (convención de SQLite); -16000 ≈ 16 MB de caché
+    cache_size: int = -16000
+    mmap_size: int = 64 * 1024 * 1024
+    busy_timeout_ms: int = 10000
+    reintentos: int = 5
+    espera_inicial_s: float = 0.05
+
+
+def cargar_perfil() -> PerfilAlmacenamiento:
+    """Construye el perfil a partir de variables de entorno (con valores por omisión)."""
+    base = PerfilAlmacenamiento()
+    return PerfilAlmacenamiento(
+        journal_mode=os.getenv("SQLITE_JOURNAL_MODE", base.journal_mode).upper(),
+        synchronous=os.getenv("SQLITE_SYNCHRONOUS", base.synchronous).upper(),
+        cache_size=int(os.getenv("SQLITE_CACHE_SIZE", str(base.cache_size))),
+        mmap_size=int(os.getenv("SQLITE_MMAP_SIZE", str(base.mmap_size))),
+        busy_timeout_ms=int(
+            os.getenv("SQLITE_BUSY_TIMEOUT_MS", str(base.busy_timeout_ms))
+        ),
+        reintentos=int(os.getenv("SQLITE_REINTENTOS", str(base.reintentos))),
+        espera_inicial_s=base.espera_inicial_s,
+    )
+
+
+PERFIL = cargar_perfil()
+
+
+def conectar(
+    db_name: str, perfil: PerfilAlmacenamiento = PERFIL, **kwargs
+) -> sqlite3.Connection:
+    """Abre una conexión a `db_name` con el perfil de almacenamiento aplicado."""
+    conn = sqlite3.connect(db_name, timeout=perfil.busy_timeout_ms / 1000, **kwargs)
+    aplicar_perfil(conn, perfil)
+    return conn
+
+
+def aplicar_perfil(
+    conn: sqlite3.Connection, perfil: PerfilAlmacenamiento = PERFIL
+) -> None:
+    """Aplica los PRAGMA del perfil a una conexión recién abierta."""
+    conn.execute(f"PRAGMA busy_timeout = {int(perfil.busy_timeout_ms)}")
+    # journal_mode es persistente en el archivo; cambiarlo requiere un lock
+    # exclusivo momentáneo, así que se reintenta si otro proceso lo tiene
+    ejecutar_con_reintentos(
+        conn, f"PRAGMA journal_mode = {perfil.journal_mode}", perfil=perfil
+    )
+    conn.execute(f"PRAGMA synchronous = {perfil.synchronous}")
+    conn.execute(f"PRAGMA cache_size = {int(perfil.cache_size)}")
+    conn.execute(f"PRAGMA mmap_size = {int(perfil.mmap_size)}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+
+
+def _es_bloqueo(error: sqlite3.OperationalError) -> bool:
+    mensaje = str(error).lower()
+    return "locked" in mensaje or "busy" in mensaje
+
+
+def ejecutar_con_reintentos(
+    conn: sqlite3.Connection,
+    sql: str,
+    parametros: tuple = (),
+    perfil: PerfilAlmacenamiento = PERFIL,
+) -> sqlite3.Cursor:
+    """Ejecuta `sql` reintentando con espera exponencial si la base está bloqueada.
+
+    `busy_timeout` cubre la mayoría de las esperas, pero SQLite devuelve
+    SQLITE_BUSY de inmediato en algunos casos (p.ej. cambio de journal_mode o
+    un BEGIN IMMEDIATE que compite con un checkpoint); este reintento los cubre.
+    """
+    espera = perfil.espera_inicial_s
+    intento = 0
+    while True:
+        try:
+            return conn.execute(sql, parametros)
+        except sqlite3.OperationalError as e:
+            if not _es_bloqueo(e) or intento >= perfil.reintentos:
+                raise
+            intento += 1
+            print(f"⏳ Base de datos ocupada, reintento {intento}/{perfil.reintentos}")
+            # Jitter para que varios procesos no reintenten a la vez
+            time.sleep(espera * (1 + random.random()))
+            espera *= 2
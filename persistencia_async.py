@@ -0,0 +1,150 @@
+"""
+Persistencia asíncrona: SQLite detrás de un hilo escritor dedicado.
+
+Las corrutinas de Playwright no deben llamar a SQLite directamente: cada
+commit (y su fsync) congela el event loop y con él a todas las páginas
+abiertas. Este módulo pone al repositorio detrás de un hilo y una cola:
+
+- `await persistencia.ejecutar(fn, ...)`: ejecuta `fn` en el hilo escritor y
+  devuelve su resultado (lecturas, o escrituras cuyo resultado importa)
+- `persistencia.encolar_guardado(reservas)`: escritura "dispara y olvida"; las
+  que se acumulan en la cola se agrupan en una sola transacción
+- `await persistencia.vaciar()`: espera a que se apliquen las escrituras encoladas
+
+Todas las operaciones se aplican en orden de llegada, así que una lectura ve
+las escrituras encoladas antes que ella.
+"""
+
+import asyncio
+import queue
+import threading
+from concurrent.futures import Future
+from functools import partial
+from typing import Any, Callable, Iterable, List, NamedTuple, Optional, Union
+
+from repositorio_reservaciones import (
+    DB_NAME,
+    RepositorioReservaciones,
+    Reserva,
+    obtener_repositorio,
+    usuario_actual,
+)
+
+
+class _Tarea(NamedTuple):
+    funcion: Optional[Callable[[], Any]]
+    reservas: List[Reserva]
+    futuro: Optional[Future]
+
+
+class PersistenciaAsync:
+    """Cola de operaciones sobre un `RepositorioReservaciones` atendida por un hilo."""
+
+    def __init__(self, repo: RepositorioReservaciones, max_lote: int = 500) -> None:
+        self.repo = repo
+        self.max_lote = max_lote
+        self._cola: "queue.Queue[Optional[_Tarea]]" = queue.Queue()
+        nombre = "escritor-sqlite" + (f"-{repo.usuario}" if repo.usuario else "")
+        self._hilo = threading.Thread(target=self._atender, name=nombre, daemon=True)
+        self._hilo.start()
+
+    # ----------------------------------------------------------------
+    # API para corrutinas
+    # ----------------------------------------------------------------
+
+    async def ejecutar(self, funcion: Callable[..., Any], *args, **kwargs) -> Any:
+        """Ejecuta `funcion(*args, **kwargs)` en el hilo escritor y espera el resultado."""
+        futuro: Future = Future()
+        self._cola.put(_Tarea(partial(funcion, *args, **kwargs), [], futuro))
+        return await asyncio.wrap_future(futuro)
+
+    def encolar_guardado(self, reservas: Union[Reserva, Iterable[Reserva]]) -> None:
+        """Encola reservas para guardarlas sin esperar (dispara y olvida)."""
+        if isinstance(reservas, Reserva):
+            reservas = [reservas]
+        self._cola.put(_Tarea(None, list(reservas), None))
+
+    async def vaciar(self) -> None:
+        """Espera a que se apliquen todas las operaciones encoladas hasta ahora."""
+        await self.ejecutar(lambda: None)
+
+    def cerrar(self) -> None:
+        """Aplica lo pendiente y detiene el hilo escritor."""
+        if self._hilo.is_alive():
+            self._cola.put(None)
+            self._hilo.join()
+
+    # ----------------------------------------------------------------
+    # Hilo escritor
+    # ----------------------------------------------------------------
+
+    def _atender(self) -> None:
+        pendientes: List[Optional[_Tarea]] = []
+        while True:
+            tarea = pendientes.pop() if pendientes else self._cola.get()
+            if tarea is None:
+                return
+
+            if tarea.funcion is not None:
+                self._resolver(tarea)
+                continue
+
+            # Agrupar las escrituras "dispara y olvida" consecutivas en un lote
+            lote = list(tarea.reservas)
+            while len(lote) < self.max_lote:
+                try:
+                    siguiente = self._cola.get_nowait()
+                except queue.Empty:
+                    break
+                if siguiente is None or siguiente.funcion is not None:
+                    # Operación que no es de guardado: se atiende después del lote
+                    pendientes.append(siguiente)
+                    break
+                lote.extend(siguiente.reservas)
+
+            try:
+                self.repo.guardar_lote(lote)
+            except Exception as e:
+                print(
+                    f"❌ Error al guardar {len(lote)} reservaciones en segundo plano: {e}"
+                )
+
+    @staticmethod
+    def _resolver(tarea: _Tarea) -> None:
+        futuro = tarea.futuro
+        if futuro is None or not futuro.set_running_or_notify_cancel():
+            return
+        try:
+            futuro.set_result(tarea.funcion())
+        except BaseException as e:
+            futuro.set_exception(e)
+
+
+# Instancias compartidas por proceso (una por archivo de base de datos y usuario)
+_persistencias: dict = {}
+_persistencias_lock = threading.Lock()
+
+
+def obtener_persistencia(
+    db_name: str = DB_NAME, usuario: Optional[str] = None
+) -> PersistenciaAsync:
+    """Devuelve la persistencia asíncrona compartida para `db_name`.
+
+    `usuario` None significa el de la tarea actual (ver `fijar_usuario`).
+    """
+    if usuario is None:
+        usuario = usuario_actual()
+    with _persistencias_lock:
+        persistencia = _persistencias.get((db_name, usuario))
+        if persistencia is None:
+            persistencia = PersistenciaAsync(obtener_repositorio(db_name, usuario))
+            _persistencias[(db_name, usuario)] = persistencia
+        return persistencia
+
+
+def cerrar_persistencias() -> None:
+    """Aplica las escrituras pendientes y detiene los hilos escritores."""
+    with _persistencias_lock:
+        for persistencia in _persistencias.values():
+            persistencia.cerrar()
+        _persistencias.clear()
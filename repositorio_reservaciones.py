@@ -0,0 +1,1405 @@
+"""
+Repositorio de reservaciones sobre SQLite.
+
+Centraliza el acceso a la base de datos local de reservaciones. En lugar de
+abrir y cerrar una conexión en cada operación, el repositorio mantiene una
+única conexión durante toda la ejecución del script, de modo que guardar una
+fila cuesta la ejecución de una sentencia y no la apertura del archivo más un
+commit a disco. Cada conexión se abre con el perfil de `perfil_sqlite` (WAL,
+busy timeout, reintentos) para poder compartir el archivo entre procesos.
+
+Esquema (normalizado):
+
+    lugares  (id, codigo)                          -- dimensión de lugares
+    reservas (id, lugar_id, dia, franja, estado,   -- una fila por reserva
+              detalle, hash, actualizado, usuario)
+              UNIQUE (lugar_id, dia, franja)
+
+`dia` es el ordinal de la fecha (`date.toordinal()`), `estado` un código
+entero (ver `ESTADOS`) y `detalle` el resto de las columnas del grid que no
+tienen columna propia. `hash` resume el contenido (estado + detalle) para que
+una sincronización sólo escriba las filas nuevas o que cambiaron. La vista `v_reservas` expone lugar y fecha legibles
+para consultas manuales. `resumen_ocupacion` y `resumen_intentos` guardan
+conteos agregados que se mantienen en cada escritura, para que los reportes
+no tengan que recorrer `reservas`.
+
+Varias personas pueden compartir la base: `usuario` indica de quién es cada
+reserva y cada repositorio lee y sincroniza sólo las de su usuario
+(`obtener_repositorio(usuario=...)`, o el fijado con `fijar_usuario` para la
+tarea actual). `""` es el usuario de los scripts de una sola persona. Los
+resúmenes, la búsqueda y el archivo son de toda la base.
+
+Las reservas pasadas se mueven con `archivar` a un archivo aparte
+(`reservaciones_archivo.db`), de modo que `reservas` sólo contiene el
+periodo vigente. Las consultas por rango (`paginar`, `consultar_por_fecha`)
+incluyen el archivo automáticamente cuando el rango llega a fechas archivadas.
+
+Uso típico:
+
+    repo = obtener_repositorio()
+    repo.inicializar()
+    repo.guardar_lote([reserva_desde_celdas(celdas) for celdas in filas])
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from perfil_sqlite import conectar, ejecutar_con_reintentos
+
+
+# Base de datos SQLite compartida por los scripts
+DB_NAME = "reservaciones.db"
+
+# Formato en el que el sitio muestra las fechas de reserva
+FORMATO_FECHA_SITIO = "%d/%m/%Y"
+
+# Posiciones de lugar y fecha en las filas del grid `gridmisreservas`
+INDICE_LUGAR_GRID = 6
+INDICE_FECHA_GRID = 7
+
+# Códigos de estado de una reserva
+ESTADO_ACTIVA = 1
+ESTADO_CANCELADA = 2
+# Ya no aparece en el grid del sitio (cancelada desde otro lugar)
+ESTADO_INACTIVA = 3
+
+ESTADOS = {
+    ESTADO_ACTIVA: "Activa",
+    ESTADO_CANCELADA: "Cancelada",
+    ESTADO_INACTIVA: "Inactiva",
+}
+
+# Diferencia entre `date.toordinal()` y el día juliano de SQLite: permite usar
+# date()/strftime() de SQLite sobre la columna `dia` (date(dia + ORDINAL_A_JULIANO)).
+ORDINAL_A_JULIANO = 1721424.5
+
+
+class Reserva(NamedTuple):
+    """Una reserva de un lugar en un día (y franja horaria, si aplica)."""
+
+    lugar: str
+    fecha: date
+    franja: str = ""
+    estado: int = ESTADO_ACTIVA
+    detalle: str = ""
+    id: Optional[int] = None
+    actualizado: Optional[str] = None
+
+    @property
+    def fecha_str(self) -> str:
+        """Fecha en el formato del sitio (DD/MM/YYYY)."""
+        return self.fecha.strftime(FORMATO_FECHA_SITIO)
+
+    @property
+    def estado_str(self) -> str:
+        return ESTADOS.get(self.estado, str(self.estado))
+
+
+class ResultadoLote(NamedTuple):
+    """Conteos devueltos por una ingesta masiva de filas.
+
+    `desaparecidas` sólo se llena en sincronizaciones completas: reservas
+    activas que ya no vienen en el grid y se marcaron como inactivas.
+    """
+
+    insertadas: int
+    actualizadas: int
+    sin_cambios: int
+    desaparecidas: Tuple[Reserva, ...] = ()
+
+    @property
+    def total(self) -> int:
+        return self.insertadas + self.actualizadas + self.sin_cambios
+
+
+class FilaOcupacion(NamedTuple):
+    """Fila de `resumen_ocupacion` (dia_semana: 0 = lunes)."""
+
+    lugar: str
+    mes: str
+    dia_semana: int
+    cantidad: int
+
+
+class FilaIntentos(NamedTuple):
+    """Fila de `resumen_intentos` (prioridad: 1 = primer lugar configurado)."""
+
+    lugar: str
+    prioridad: int
+    dia_semana: int
+    exitos: int
+    fallos: int
+
+
+def fecha_a_iso(fecha_str: str) -> Optional[str]:
+    """Convierte una fecha DD/MM/YYYY del sitio a ISO (YYYY-MM-DD); None si no es válida."""
+    try:
+        fecha = datetime.strptime(fecha_str.strip(), FORMATO_FECHA_SITIO).date()
+        return fecha.isoformat()
+    except (ValueError, AttributeError):
+        return None
+
+
+def hash_reserva(estado: int, detalle: str) -> str:
+    """Hash del contenido no-clave de una reserva (registrado también en SQLite)."""
+    contenido = f"{estado}\x1f{detalle}".encode("utf-8")
+    return hashlib.blake2b(contenido, digest_size=8).hexdigest()
+
+
+# Fecha al inicio de un valor del detalle ("15/06/2024 10:30" -> "15/06/2024")
+_FECHA_DETALLE = re.compile(r"^(\d{2}/\d{2}/\d{4})\b")
+
+
+def detalle_reserva(valores: Iterable[str]) -> str:
+    """`detalle` de una reserva a partir de sus campos que no son lugar ni fecha.
+
+    Las celdas del grid y los registros JSON que lo llenan traen los mismos
+    datos en otro orden y formato. Ambas lecturas pasan por aquí (espacios
+    colapsados, fechas sin hora, sin vacíos ni repetidos, en orden
+    alfabético) para que el hash no cambie al alternar entre ellas.
+    """
+    normalizados = set()
+    for valor in valores:
+        texto = " ".join(valor.split())
+        coincidencia = _FECHA_DETALLE.match(texto)
+        if coincidencia:
+            texto = coincidencia[1]
+        if texto:
+            normalizados.add(texto)
+    return " | ".join(sorted(normalizados, key=lambda t: (t.casefold(), t)))
+
+
+def reserva_desde_celdas(celdas: Sequence[str]) -> Optional[Reserva]:
+    """Construye una `Reserva` a partir de los textos de una fila del grid.
+
+    Devuelve None si la fila no tiene lugar y fecha válidos.
+    """
+    if len(celdas) <= INDICE_FECHA_GRID:
+        return None
+
+    lugar = celdas[INDICE_LUGAR_GRID].strip()
+    fecha_iso = fecha_a_iso(celdas[INDICE_FECHA_GRID].split(" ")[0])
+    if not lugar or not fecha_iso:
+        return None
+
+    # Lo que no es lugar ni fecha se conserva como detalle (sin duplicar datos)
+    resto = [
+        c
+        for i, c in enumerate(celdas)
+        if i not in (INDICE_LUGAR_GRID, INDICE_FECHA_GRID)
+    ]
+    estado = (
+        ESTADO_CANCELADA
+        if any("cancelad" in c.lower() for c in resto)
+        else ESTADO_ACTIVA
+    )
+    return Reserva(
+        lugar=lugar,
+        fecha=date.fromisoformat(fecha_iso),
+        estado=estado,
+        detalle=detalle_reserva(resto),
+    )
+
+
+def _fila_a_reserva(fila: tuple) -> Reserva:
+    """Convierte una fila de `v_reservas` en `Reserva`."""
+    id_, lugar, dia, franja, estado, detalle, actualizado = fila
+    return Reserva(
+        lugar=lugar,
+        fecha=date.fromordinal(dia),
+        franja=franja,
+        estado=estado,
+        detalle=detalle,
+        id=id_,
+        actualizado=actualizado,
+    )
+
+
+_COLUMNAS_VISTA = "id, lugar, dia, franja, estado, detalle, actualizado"
+
+# Índice de texto completo: `lugar`, `fecha` (ISO), `estado` (texto) y
+# `detalle` se indexan; el resto se guarda sin indexar para devolver la
+# reserva sin volver a la tabla. Con '-' como parte de los tokens un código
+# como P17-1204 o una fecha 2025-03-05 es un solo término (prefijos P17-*, 2025-03*).
+_COLUMNAS_FTS = (
+    "lugar, fecha, estado, detalle, "
+    "id UNINDEXED, dia UNINDEXED, franja UNINDEXED, actualizado UNINDEXED"
+)
+_TOKENIZADOR_FTS = "unicode61 remove_diacritics 2 tokenchars '-'"
+
+
+def _estado_como_texto(columna: str) -> str:
+    """Expresión SQL que traduce un código de estado a su nombre (ver `ESTADOS`)."""
+    casos = " ".join(
+        f"WHEN {codigo} THEN '{nombre}'" for codigo, nombre in ESTADOS.items()
+    )
+    return f"CASE {columna} {casos} ELSE CAST({columna} AS TEXT) END"
+
+
+def consulta_fts(texto: str) -> str:
+    """Convierte una búsqueda escrita por el usuario en una consulta FTS5.
+
+    - `"piso 17"`: frase exacta
+    - `P17-*` o `P17-`: prefijo (un término que termina en '-' también lo es)
+    - el resto de las palabras deben aparecer todas (AND implícito)
+
+    Cada término se entrecomilla, así que caracteres como '-' o ':' no se
+    interpretan como operadores de FTS5.
+    """
+    terminos = []
+    for frase, palabra in re.findall(r'"([^"]*)"|(\S+)', texto):
+        if frase:
+            terminos.append('"' + frase.replace('"', "") + '"')
+            continue
+        prefijo = palabra.endswith("*") or palabra.endswith("-")
+        palabra = palabra.rstrip("*").replace('"', "")
+        if palabra:
+            terminos.append(f'"{palabra}"' + ("*" if prefijo else ""))
+    return " ".join(terminos)
+
+
+class RepositorioReservaciones:
+    """Acceso a las tablas de reservas a través de una conexión de larga vida.
+
+    La conexión se abre de forma perezosa la primera vez que se necesita y se
+    comparte entre hilos protegida por un candado, por lo que también sirve
+    para los flujos concurrentes (varias páginas de Playwright en el mismo
+    proceso). Los errores de SQLite se propagan como `sqlite3.Error` para que
+    cada script decida cómo reportarlos.
+    """
+
+    def __init__(
+        self,
+        db_name: str = DB_NAME,
+        db_archivo: Optional[str] = None,
+        usuario: str = "",
+    ) -> None:
+        self.db_name = db_name
+        self.db_archivo = db_archivo or ruta_archivo(db_name)
+        self.usuario = usuario
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+        self._profundidad_transaccion = 0
+        self._archivo_adjunto = False
+
+    # ----------------------------------------------------------------
+    # Ciclo de vida de la conexión
+    # ----------------------------------------------------------------
+
+    @property
+    def conexion(self) -> sqlite3.Connection:
+        """Devuelve la conexión abierta, creándola si aún no existe."""
+        if self._conn is None:
+            self._conn = conectar(self.db_name, check_same_thread=False)
+            self._conn.create_function(
+                "hash_reserva", 2, hash_reserva, deterministic=True
+            )
+            self._archivo_adjunto = False
+            if os.path.exists(self.db_archivo):
+                self._adjuntar_archivo(self._conn)
+        return self._conn
+
+    def cerrar(self) -> None:
+        """Confirma cambios pendientes y cierra la conexión."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.commit()
+                self._conn.close()
+                self._conn = None
+                self._archivo_adjunto = False
+
+    def __enter__(self) -> "RepositorioReservaciones":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.cerrar()
+
+    @contextmanager
+    def transaccion(self) -> Iterator[sqlite3.Connection]:
+        """Agrupa varias escrituras en una única transacción (un solo commit).
+
+        Las transacciones anidadas se integran en la exterior: sólo la más
+        externa confirma o revierte. La externa se abre con BEGIN IMMEDIATE
+        para tomar el lock de escritura al inicio (con reintentos) y no fallar
+        a mitad de camino al competir con otro proceso.
+        """
+        with self._lock:
+            conn = self.conexion
+            if self._profundidad_transaccion == 0 and not conn.in_transaction:
+                ejecutar_con_reintentos(conn, "BEGIN IMMEDIATE")
+            self._profundidad_transaccion += 1
+            try:
+                yield conn
+            except BaseException:
+                self._profundidad_transaccion -= 1
+                if self._profundidad_transaccion == 0:
+                    conn.rollback()
+                raise
+            else:
+                self._profundidad_transaccion -= 1
+                if self._profundidad_transaccion == 0:
+                    conn.commit()
+
+    # ----------------------------------------------------------------
+    # Esquema
+    # ----------------------------------------------------------------
+
+    def inicializar(self) -> None:
+        """Crea o migra el esquema hasta la última versión."""
+        with self.transaccion() as conn:
+            aplicadas = self._aplicar_migraciones(conn)
+
+        if _VERSION_ESQUEMA_NORMALIZADO in aplicadas:
+            # La tabla anterior se eliminó: compactar el archivo (fuera de la transacción)
+            with self._lock:
+                self.conexion.execute("VACUUM")
+
+    def _aplicar_migraciones(self, conn: sqlite3.Connection) -> List[int]:
+        """Aplica, en orden, las migraciones pendientes según `PRAGMA user_version`."""
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        aplicadas = []
+        for numero, migracion in enumerate(_MIGRACIONES, start=1):
+            if numero <= version:
+                continue
+            migracion(conn)
+            conn.execute(f"PRAGMA user_version = {numero}")
+            aplicadas.append(numero)
+            print(f"🛠️ Migración de base de datos aplicada: v{numero}")
+        return aplicadas
+
+    # ----------------------------------------------------------------
+    # Escritura
+    # ----------------------------------------------------------------
+
+    def guardar(self, reserva: Reserva) -> None:
+        """Inserta o actualiza una reserva (clave: lugar, día, franja)."""
+        self.guardar_lote([reserva])
+
+    def guardar_lote(
+        self,
+        reservas: Iterable[Reserva],
+        completo_desde: Optional[date] = None,
+    ) -> ResultadoLote:
+        """Ingesta masiva de reservas en una transacción.
+
+        Las filas se cargan con `executemany` en una tabla temporal y desde ahí
+        se clasifican por hash y se aplican con sentencias sobre conjuntos, por
+        lo que el costo no depende de límites de parámetros por sentencia ni del
+        número de filas del grid. Las filas cuyo hash no cambió no se reescriben
+        y las existentes conservan su id.
+
+        Si `completo_desde` se indica, el lote se considera la foto completa
+        del grid a partir de esa fecha: las reservas activas de ese rango que
+        no vienen en el lote se marcan como `ESTADO_INACTIVA` y se devuelven en
+        `desaparecidas`.
+
+        Las reservas se guardan a nombre de `self.usuario`; una reserva que ya
+        existe con otro usuario pasa a éste (el lugar y día los tiene quien lo
+        reservó por última vez), salvo que `self.usuario` sea `""`.
+        """
+        actualizado = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        parametros = [
+            (
+                r.lugar,
+                r.fecha.toordinal(),
+                r.franja,
+                r.estado,
+                r.detalle,
+                hash_reserva(r.estado, r.detalle),
+                actualizado,
+            )
+            for r in reservas
+        ]
+
+        with self.transaccion() as conn:
+            conn.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS reservas_lote (
+                    lugar TEXT NOT NULL,
+                    dia INTEGER NOT NULL,
+                    franja TEXT NOT NULL,
+                    estado INTEGER NOT NULL,
+                    detalle TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    actualizado TEXT NOT NULL,
+                    UNIQUE (lugar, dia, franja)
+                )
+            """)
+            conn.execute("DELETE FROM reservas_lote")
+            # Si el grid repite una clave, prevalece la última fila leída
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO reservas_lote
+                (lugar, dia, franja, estado, detalle, hash, actualizado)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+                parametros,
+            )
+
+            conn.execute("""
+                INSERT OR IGNORE INTO lugares (codigo)
+                SELECT DISTINCT lugar FROM reservas_lote
+            """)
+
+            # Cambia si cambió el contenido o si la reserva pasa a este usuario
+            insertadas, actualizadas, sin_cambios = conn.execute(
+                """
+                SELECT
+                    COALESCE(SUM(r.id IS NULL), 0),
+                    COALESCE(SUM(r.id IS NOT NULL AND cambio), 0),
+                    COALESCE(SUM(r.id IS NOT NULL AND NOT cambio), 0)
+                FROM (
+                    SELECT r.id,
+                           r.hash IS NOT l.hash OR :usuario NOT IN ('', r.usuario)
+                               AS cambio
+                    FROM reservas_lote AS l
+                    JOIN lugares AS g ON g.codigo = l.lugar
+                    LEFT JOIN reservas AS r
+                        ON r.lugar_id = g.id AND r.dia = l.dia
+                       AND r.franja = l.franja
+                ) AS r
+            """,
+                {"usuario": self.usuario},
+            ).fetchone()
+
+            # Upsert sobre conjuntos: sólo escribe filas nuevas o cuyo hash cambió
+            if insertadas or actualizadas:
+                conn.execute(
+                    """
+                    INSERT INTO reservas
+                    (lugar_id, dia, franja, estado, detalle, hash, actualizado,
+                     usuario)
+                    SELECT g.id, l.dia, l.franja, l.estado, l.detalle, l.hash,
+                           l.actualizado, :usuario
+                    FROM reservas_lote AS l
+                    JOIN lugares AS g ON g.codigo = l.lugar
+                    WHERE true
+                    ON CONFLICT (lugar_id, dia, franja) DO UPDATE SET
+                        estado = excluded.estado,
+                        detalle = excluded.detalle,
+                        hash = excluded.hash,
+                        actualizado = excluded.actualizado,
+                        usuario = COALESCE(NULLIF(excluded.usuario, ''),
+                                           reservas.usuario)
+                    WHERE reservas.hash IS NOT excluded.hash
+                       OR excluded.usuario NOT IN ('', reservas.usuario)
+                """,
+                    {"usuario": self.usuario},
+                )
+
+            desaparecidas: Tuple[Reserva, ...] = ()
+            if completo_desde is not None:
+                desaparecidas = self._marcar_desaparecidas(
+                    conn, completo_desde, actualizado
+                )
+
+            conn.execute("DELETE FROM reservas_lote")
+
+        return ResultadoLote(insertadas, actualizadas, sin_cambios, desaparecidas)
+
+    def _marcar_desaparecidas(
+        self, conn: sqlite3.Connection, desde: date, actualizado: str
+    ) -> Tuple[Reserva, ...]:
+        """Marca como inactivas las reservas activas >= `desde` ausentes del lote.
+
+        Sólo las de `self.usuario`: el grid de una persona no dice nada de las
+        reservas de las demás.
+        """
+        filtro = """
+            FROM v_reservas AS r
+            WHERE r.dia >= ? AND r.estado = ? AND r.usuario = ?
+              AND NOT EXISTS (
+                  SELECT 1 FROM reservas_lote AS l
+                  WHERE l.lugar = r.lugar AND l.dia = r.dia AND l.franja = r.franja
+              )
+        """
+        parametros = (desde.toordinal(), ESTADO_ACTIVA, self.usuario)
+        desaparecidas = tuple(
+            _fila_a_reserva(fila)
+            for fila in conn.execute(
+                f"SELECT {_COLUMNAS_VISTA} {filtro}", parametros
+            )
+        )
+        if desaparecidas:
+            conn.execute(
+                f"""
+                UPDATE reservas
+                SET estado = ?, hash = hash_reserva(?, detalle), actualizado = ?
+                WHERE id IN (SELECT r.id {filtro})
+            """,
+                (ESTADO_INACTIVA, ESTADO_INACTIVA, actualizado) + parametros,
+            )
+        return desaparecidas
+
+    def registrar_intentos(
+        self,
+        lugar: str,
+        prioridad: int,
+        exitosas: Iterable[date],
+        fallidas: Iterable[date],
+    ) -> None:
+        """Suma al resumen de intentos las fechas reservadas y fallidas en `lugar`.
+
+        `prioridad` es la posición del lugar en la lista configurada (1 = primero).
+        """
+        conteos: dict = {}
+        for fechas, columna in ((exitosas, 0), (fallidas, 1)):
+            for fecha in fechas:
+                conteo = conteos.setdefault(fecha.weekday(), [0, 0])
+                conteo[columna] += 1
+        if not conteos:
+            return
+
+        with self.transaccion() as conn:
+            conn.execute("INSERT OR IGNORE INTO lugares (codigo) VALUES (?)", (lugar,))
+            conn.executemany(
+                """
+                INSERT INTO resumen_intentos
+                    (lugar_id, prioridad, dia_semana, exitos, fallos)
+                VALUES ((SELECT id FROM lugares WHERE codigo = ?), ?, ?, ?, ?)
+                ON CONFLICT (lugar_id, prioridad, dia_semana) DO UPDATE SET
+                    exitos = exitos + excluded.exitos,
+                    fallos = fallos + excluded.fallos
+            """,
+                [
+                    (lugar, prioridad, dia_semana, exitos, fallos)
+                    for dia_semana, (exitos, fallos) in sorted(conteos.items())
+                ],
+            )
+
+    # ----------------------------------------------------------------
+    # Lectura
+    # ----------------------------------------------------------------
+
+    def listar(self) -> List[Reserva]:
+        """Devuelve las reservas no archivadas del usuario, de la más reciente primero."""
+        with self._lock:
+            cursor = self.conexion.execute(
+                f"""
+                SELECT {_COLUMNAS_VISTA}
+                FROM v_reservas
+                WHERE usuario = ?
+                ORDER BY dia DESC
+            """,
+                (self.usuario,),
+            )
+            return [_fila_a_reserva(fila) for fila in cursor]
+
+    def ultima_fecha_reservada(self) -> Optional[date]:
+        """Devuelve la última fecha reservada (activa) del usuario desde hoy, o None."""
+        with self._lock:
+            # Rango sobre idx_reservas_usuario_dia
+            cursor = self.conexion.execute(
+                """
+                SELECT MAX(dia)
+                FROM reservas
+                WHERE usuario = ? AND dia >= ? AND estado = ?
+            """,
+                (self.usuario, date.today().toordinal(), ESTADO_ACTIVA),
+            )
+            resultado = cursor.fetchone()
+        if resultado and resultado[0]:
+            return date.fromordinal(resultado[0])
+        return None
+
+    def dias_reservados(self, desde: date) -> List[Tuple[str, int]]:
+        """Devuelve (lugar, ordinal de día) de las reservas activas del usuario desde `desde`."""
+        with self._lock:
+            cursor = self.conexion.execute(
+                """
+                SELECT lugar, dia
+                FROM v_reservas
+                WHERE usuario = ? AND dia >= ? AND estado = ?
+            """,
+                (self.usuario, desde.toordinal(), ESTADO_ACTIVA),
+            )
+            return cursor.fetchall()
+
+    def consultar_por_fecha(
+        self, fecha_inicio: Optional[date] = None, fecha_fin: Optional[date] = None
+    ) -> List[Reserva]:
+        """Devuelve las reservas, opcionalmente dentro de un rango de fechas."""
+        with self._lock:
+            fuente = self._fuente(fecha_inicio if fecha_fin else None)
+            if fecha_inicio and fecha_fin:
+                cursor = self.conexion.execute(
+                    f"""
+                    SELECT {_COLUMNAS_VISTA}
+                    FROM {fuente}
+                    WHERE dia BETWEEN ? AND ?
+                    ORDER BY dia ASC
+                """,
+                    (fecha_inicio.toordinal(), fecha_fin.toordinal()),
+                )
+            else:
+                cursor = self.conexion.execute(f"""
+                    SELECT {_COLUMNAS_VISTA}
+                    FROM {fuente}
+                    ORDER BY dia ASC
+                """)
+            return [_fila_a_reserva(fila) for fila in cursor]
+
+    def paginar(
+        self,
+        filtro: Optional["FiltroReservas"] = None,
+        tamano_pagina: int = 500,
+        despues_de: Optional["CursorPagina"] = None,
+    ) -> Iterator[List[Reserva]]:
+        """Recorre las reservas que cumplen `filtro` en páginas, ordenadas por (dia, id).
+
+        Usa paginación por clave (keyset): cada página pide `(dia, id) > última
+        fila entregada` sobre idx_reservas_dia, así que el costo de una página
+        no crece con el número de páginas ya leídas y el candado de la conexión
+        sólo se retiene mientras se lee una página. `despues_de` permite
+        continuar desde el cursor de una ejecución anterior (ver `cursor_de`).
+        Si el rango incluye fechas archivadas, se lee también el archivo.
+        """
+        filtro = filtro or FiltroReservas()
+        with self._lock:
+            fuente = self._fuente(filtro.desde)
+        condiciones: List[str] = []
+        parametros: list = []
+        if filtro.desde:
+            condiciones.append("dia >= ?")
+            parametros.append(filtro.desde.toordinal())
+        if filtro.hasta:
+            condiciones.append("dia <= ?")
+            parametros.append(filtro.hasta.toordinal())
+        if filtro.lugar:
+            condiciones.append("lugar = ?")
+            parametros.append(filtro.lugar)
+        if filtro.estado is not None:
+            condiciones.append("estado = ?")
+            parametros.append(filtro.estado)
+
+        ultimo = despues_de
+        while True:
+            where = list(condiciones)
+            valores = list(parametros)
+            if ultimo is not None:
+                where.append("(dia, id) > (?, ?)")
+                valores.extend(ultimo)
+            sql = f"""
+                SELECT {_COLUMNAS_VISTA}
+                FROM {fuente}
+                {"WHERE " + " AND ".join(where) if where else ""}
+                ORDER BY dia, id
+                LIMIT ?
+            """
+            with self._lock:
+                pagina = [
+                    _fila_a_reserva(fila)
+                    for fila in self.conexion.execute(sql, valores + [tamano_pagina])
+                ]
+            if not pagina:
+                return
+            yield pagina
+            if len(pagina) < tamano_pagina:
+                return
+            ultimo = cursor_de(pagina[-1])
+
+    # ----------------------------------------------------------------
+    # Archivo (reservas pasadas fuera de la tabla activa)
+    # ----------------------------------------------------------------
+
+    def _adjuntar_archivo(self, conn: sqlite3.Connection) -> None:
+        """Adjunta el archivo como esquema `archivo` y crea la vista combinada.
+
+        ATTACH no puede ejecutarse dentro de una transacción.
+        """
+        if self._archivo_adjunto:
+            return
+        conn.execute("ATTACH DATABASE ? AS archivo", (self.db_archivo,))
+        ejecutar_con_reintentos(conn, "PRAGMA archivo.journal_mode = WAL")
+        conn.execute("PRAGMA archivo.synchronous = NORMAL")
+        sin_fts = not conn.execute(
+            "SELECT 1 FROM archivo.sqlite_master WHERE name = 'reservas_archivo_fts'"
+        ).fetchone()
+        columnas = {
+            fila[1]
+            for fila in conn.execute("PRAGMA archivo.table_info(reservas_archivo)")
+        }
+        if columnas and "usuario" not in columnas:
+            # Archivo creado antes de compartir la base entre usuarios
+            conn.execute(
+                "ALTER TABLE archivo.reservas_archivo "
+                "ADD COLUMN usuario TEXT NOT NULL DEFAULT ''"
+            )
+            conn.commit()
+        for sentencia in _DDL_ARCHIVO:
+            conn.execute(sentencia)
+        if sin_fts:
+            # Archivo creado antes del índice de texto completo
+            conn.execute(f"""
+                INSERT INTO archivo.reservas_archivo_fts
+                    (lugar, fecha, estado, detalle, id, dia, franja, actualizado)
+                SELECT lugar, date(dia + {ORDINAL_A_JULIANO}),
+                       {_estado_como_texto("estado")}, detalle,
+                       id, dia, franja, actualizado
+                FROM archivo.reservas_archivo
+            """)
+            conn.commit()
+        self._archivo_adjunto = True
+
+    def _fuente(self, desde: Optional[date]) -> str:
+        """Vista a consultar: sólo la tabla activa, o activa + archivo.
+
+        El archivo sólo se incluye si está adjunto y el rango pedido empieza
+        antes de (o en) la última fecha archivada.
+        """
+        conn = self.conexion  # abre la conexión (y adjunta el archivo) si hace falta
+        if not self._archivo_adjunto:
+            return "v_reservas"
+        if desde is not None:
+            ultimo = conn.execute(
+                "SELECT MAX(dia) FROM archivo.reservas_archivo"
+            ).fetchone()[0]
+            if ultimo is None or desde.toordinal() > ultimo:
+                return "v_reservas"
+        return "v_reservas_historico"
+
+    def archivar(self, antes_de: date) -> int:
+        """Mueve al archivo las reservas con fecha anterior a `antes_de`.
+
+        Devuelve el número de reservas movidas. Los resúmenes de ocupación
+        conservan los conteos de las reservas archivadas. La copia al archivo
+        es idempotente (clave lugar, día, franja), así que si el proceso se
+        interrumpe entre la copia y el borrado, la siguiente ejecución termina
+        el trabajo sin duplicar filas.
+        """
+        limite = antes_de.toordinal()
+        with self._lock:
+            conn = self.conexion
+            pendientes = conn.execute(
+                "SELECT COUNT(*) FROM reservas WHERE dia < ?", (limite,)
+            ).fetchone()[0]
+            if not pendientes:
+                return 0
+            self._adjuntar_archivo(conn)
+
+            archivado = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            with self.transaccion():
+                # Entradas de búsqueda: las de claves ya archivadas se
+                # reemplazan, igual que sus filas con el INSERT OR REPLACE
+                conn.execute(
+                    """
+                    DELETE FROM archivo.reservas_archivo_fts
+                    WHERE rowid IN (
+                        SELECT a.rowid
+                        FROM archivo.reservas_archivo_fts AS a
+                        JOIN reservas AS r
+                          ON r.dia = a.dia AND r.franja = a.franja
+                        JOIN lugares AS g
+                          ON g.id = r.lugar_id AND g.codigo = a.lugar
+                        WHERE r.dia < ?
+                    )
+                """,
+                    (limite,),
+                )
+                conn.execute(
+                    """
+                    INSERT INTO archivo.reservas_archivo_fts
+                        (lugar, fecha, estado, detalle, id, dia, franja, actualizado)
+                    SELECT f.lugar, f.fecha, f.estado, f.detalle,
+                           f.id, f.dia, f.franja, f.actualizado
+                    FROM reservas_fts AS f
+                    JOIN reservas AS r ON r.id = f.rowid
+                    WHERE r.dia < ?
+                """,
+                    (limite,),
+                )
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO archivo.reservas_archivo
+                        (id, lugar, dia, franja, estado, detalle, hash,
+                         actualizado, archivado, usuario)
+                    SELECT r.id, g.codigo, r.dia, r.franja, r.estado, r.detalle,
+                           r.hash, r.actualizado, ?, r.usuario
+                    FROM reservas AS r
+                    JOIN lugares AS g ON g.id = r.lugar_id
+                    WHERE r.dia < ?
+                """,
+                    (archivado, limite),
+                )
+                # El trigger de borrado descuenta del resumen: se compensa
+                # antes para que el histórico siga contando en los reportes
+                conn.execute(
+                    f"""
+                    INSERT INTO resumen_ocupacion
+                        (lugar_id, mes, dia_semana, estado, cantidad)
+                    SELECT lugar_id,
+                           strftime('%Y-%m', dia + {ORDINAL_A_JULIANO}),
+                           (dia - 1) % 7,
+                           estado,
+                           COUNT(*)
+                    FROM reservas
+                    WHERE dia < ?
+                    GROUP BY 1, 2, 3, 4
+                    ON CONFLICT (mes, lugar_id, dia_semana, estado)
+                    DO UPDATE SET cantidad = cantidad + excluded.cantidad
+                """,
+                    (limite,),
+                )
+                conn.execute("DELETE FROM reservas WHERE dia < ?", (limite,))
+        return pendientes
+
+    # ----------------------------------------------------------------
+    # Búsqueda de texto completo
+    # ----------------------------------------------------------------
+
+    def buscar(self, texto: str, limite: int = 50) -> List[Reserva]:
+        """Busca reservas por lugar, fecha, estado o detalle (ver `consulta_fts`).
+
+        Incluye las reservas archivadas. Devuelve las más recientes primero.
+        """
+        consulta = consulta_fts(texto)
+        if not consulta:
+            return []
+        columnas = "id, lugar, dia, franja, estado, detalle, actualizado"
+        with self._lock:
+            conn = self.conexion
+            sql = f"SELECT {columnas} FROM reservas_fts WHERE reservas_fts MATCH ?"
+            parametros = [consulta]
+            if self._archivo_adjunto:
+                sql += f"""
+                    UNION ALL
+                    SELECT {columnas} FROM archivo.reservas_archivo_fts
+                    WHERE reservas_archivo_fts MATCH ?
+                """
+                parametros.append(consulta)
+            cursor = conn.execute(
+                f"SELECT * FROM ({sql}) ORDER BY dia DESC, id DESC LIMIT ?",
+                parametros + [limite],
+            )
+            codigos = {nombre: codigo for codigo, nombre in ESTADOS.items()}
+            return [
+                _fila_a_reserva(fila[:4] + (codigos.get(fila[4], 0),) + fila[5:])
+                for fila in cursor
+            ]
+
+    # ----------------------------------------------------------------
+    # Resúmenes (se leen de las tablas agregadas, no de `reservas`)
+    # ----------------------------------------------------------------
+
+    def resumen_ocupacion(
+        self,
+        desde_mes: Optional[str] = None,
+        hasta_mes: Optional[str] = None,
+        estado: Optional[int] = ESTADO_ACTIVA,
+    ) -> List[FilaOcupacion]:
+        """Reservas por lugar × mes (YYYY-MM) × día de la semana."""
+        condiciones = ["o.cantidad > 0"]
+        parametros: list = []
+        if desde_mes:
+            condiciones.append("o.mes >= ?")
+            parametros.append(desde_mes)
+        if hasta_mes:
+            condiciones.append("o.mes <= ?")
+            parametros.append(hasta_mes)
+        if estado is not None:
+            condiciones.append("o.estado = ?")
+            parametros.append(estado)
+        with self._lock:
+            cursor = self.conexion.execute(
+                f"""
+                SELECT g.codigo, o.mes, o.dia_semana, SUM(o.cantidad)
+                FROM resumen_ocupacion AS o
+                JOIN lugares AS g ON g.id = o.lugar_id
+                WHERE {" AND ".join(condiciones)}
+                GROUP BY g.codigo, o.mes, o.dia_semana
+                ORDER BY o.mes, g.codigo, o.dia_semana
+            """,
+                parametros,
+            )
+            return [FilaOcupacion(*fila) for fila in cursor]
+
+    def resumen_intentos(self) -> List[FilaIntentos]:
+        """Éxitos y fallos por lugar × prioridad × día de la semana."""
+        with self._lock:
+            cursor = self.conexion.execute("""
+                SELECT g.codigo, i.prioridad, i.dia_semana, i.exitos, i.fallos
+                FROM resumen_intentos AS i
+                JOIN lugares AS g ON g.id = i.lugar_id
+                ORDER BY i.prioridad, g.codigo, i.dia_semana
+            """)
+            return [FilaIntentos(*fila) for fila in cursor]
+
+
+class FiltroReservas(NamedTuple):
+    """Criterios de `RepositorioReservaciones.paginar` (None = sin filtrar)."""
+
+    desde: Optional[date] = None
+    hasta: Optional[date] = None
+    lugar: Optional[str] = None
+    estado: Optional[int] = None
+
+
+def ruta_archivo(db_name: str) -> str:
+    """Ruta del archivo de reservas pasadas asociado a `db_name`."""
+    base, extension = os.path.splitext(db_name)
+    return f"{base}_archivo{extension or '.db'}"
+
+
+# Esquema del archivo (base adjunta como `archivo`). Guarda el código de
+# lugar en lugar de `lugar_id` para que el archivo se pueda leer por sí solo.
+# `v_reservas_historico` es temporal (por conexión): une la tabla activa con
+# el archivo, y una reserva presente en ambos se toma de la tabla activa.
+# `usuario` conserva el dueño de cada reserva también en el archivo.
+_DDL_ARCHIVO = [
+    """
+    CREATE TABLE IF NOT EXISTS archivo.reservas_archivo (
+        id INTEGER NOT NULL,
+        lugar TEXT NOT NULL,
+        dia INTEGER NOT NULL,
+        franja TEXT NOT NULL DEFAULT '',
+        estado INTEGER NOT NULL,
+        detalle TEXT NOT NULL DEFAULT '',
+        hash TEXT,
+        actualizado TEXT NOT NULL,
+        archivado TEXT NOT NULL,
+        usuario TEXT NOT NULL DEFAULT '',
+        PRIMARY KEY (lugar, dia, franja)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS archivo.idx_reservas_archivo_dia
+    ON reservas_archivo (dia, id)
+    """,
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS archivo.reservas_archivo_fts
+    USING fts5({_COLUMNAS_FTS}, tokenize = "{_TOKENIZADOR_FTS}")
+    """,
+    f"""
+    CREATE TEMP VIEW IF NOT EXISTS v_reservas_historico AS
+    SELECT {_COLUMNAS_VISTA}, usuario FROM main.v_reservas
+    UNION ALL
+    SELECT {_COLUMNAS_VISTA}, usuario FROM archivo.reservas_archivo AS a
+    WHERE NOT EXISTS (
+        SELECT 1
+        FROM main.reservas AS r
+        JOIN main.lugares AS g ON g.id = r.lugar_id
+        WHERE g.codigo = a.lugar AND r.dia = a.dia AND r.franja = a.franja
+    )
+    """,
+]
+
+
+# Posición (dia, id) de la última reserva entregada por `paginar`
+CursorPagina = Tuple[int, int]
+
+
+def cursor_de(reserva: Reserva) -> CursorPagina:
+    """Cursor de paginación que apunta justo después de `reserva`."""
+    return (reserva.fecha.toordinal(), reserva.id)
+
+
+# ====================================================================
+# MIGRACIONES (se aplican en orden; el número es PRAGMA user_version)
+# ====================================================================
+
+
+def _existe_tabla(conn: sqlite3.Connection, nombre: str) -> bool:
+    return (
+        conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (nombre,)
+        ).fetchone()
+        is not None
+    )
+
+
+def _migracion_fecha_iso(conn: sqlite3.Connection) -> None:
+    """v1: columnas `fecha_iso` (YYYY-MM-DD) y `lugar` con sus índices.
+
+    `fecha_reserva` se guarda como DD/MM/YYYY, que no ordena ni compara
+    correctamente como texto; `fecha_iso` sí lo hace y permite búsquedas por
+    rango sobre índice. En bases nuevas no hay tabla anterior que migrar.
+    """
+    if not _existe_tabla(conn, "reservaciones"):
+        return
+
+    columnas = {fila[1] for fila in conn.execute("PRAGMA table_info(reservaciones)")}
+    if "fecha_iso" not in columnas:
+        conn.execute("ALTER TABLE reservaciones ADD COLUMN fecha_iso TEXT")
+    if "lugar" not in columnas:
+        conn.execute("ALTER TABLE reservaciones ADD COLUMN lugar TEXT")
+
+    # Backfill desde DD/MM/YYYY
+    conn.execute("""
+        UPDATE reservaciones
+        SET fecha_iso = substr(fecha_reserva, 7, 4) || '-'
+                     || substr(fecha_reserva, 4, 2) || '-'
+                     || substr(fecha_reserva, 1, 2)
+        WHERE fecha_iso IS NULL
+          AND fecha_reserva GLOB '[0-9][0-9]/[0-9][0-9]/[0-9][0-9][0-9][0-9]'
+    """)
+    # Filas del grid: lugar en columna 7; filas de carga_lugar_por_fecha: columna 1
+    conn.execute("""
+        UPDATE reservaciones
+        SET lugar = COALESCE(NULLIF(columna_7, ''), columna_1)
+        WHERE lugar IS NULL
+    """)
+
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_reservaciones_fecha ON reservaciones (fecha_iso)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_reservaciones_lugar_fecha "
+        "ON reservaciones (lugar, fecha_iso)"
+    )
+
+
+def _migracion_esquema_normalizado(conn: sqlite3.Connection) -> None:
+    """v2: tablas `lugares` + `reservas` en lugar de columna_1..10 y fila_completa.
+
+    Las filas de `reservaciones` se copian al nuevo esquema (lugar y fecha
+    tipados, resto de columnas en `detalle`) y la tabla anterior se elimina.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS lugares (
+            id INTEGER PRIMARY KEY,
+            codigo TEXT NOT NULL UNIQUE
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS reservas (
+            id INTEGER PRIMARY KEY,
+            lugar_id INTEGER NOT NULL REFERENCES lugares (id),
+            dia INTEGER NOT NULL,
+            franja TEXT NOT NULL DEFAULT '',
+            estado INTEGER NOT NULL DEFAULT 1,
+            detalle TEXT NOT NULL DEFAULT '',
+            actualizado TEXT NOT NULL,
+            UNIQUE (lugar_id, dia, franja)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reservas_dia ON reservas (dia)")
+    conn.execute(f"""
+        CREATE VIEW IF NOT EXISTS v_reservas AS
+        SELECT r.id,
+               g.codigo AS lugar,
+               r.dia,
+               date(r.dia + {ORDINAL_A_JULIANO}) AS fecha,
+               r.franja,
+               r.estado,
+               r.detalle,
+               r.actualizado
+        FROM reservas AS r
+        JOIN lugares AS g ON g.id = r.lugar_id
+    """)
+
+    if not _existe_tabla(conn, "reservaciones"):
+        return
+
+    filas = conn.execute("""
+        SELECT fecha_consulta, lugar, fecha_iso, fecha_reserva,
+               columna_1, columna_2, columna_3, columna_4, columna_5,
+               columna_6, columna_7, columna_9, columna_10
+        FROM reservaciones
+        WHERE fecha_iso IS NOT NULL AND COALESCE(lugar, '') <> ''
+        ORDER BY fecha_consulta
+    """).fetchall()
+
+    for fila in filas:
+        fecha_consulta, lugar, fecha_iso, fecha_reserva = fila[:4]
+        # Lugar y fecha ya tienen columna propia; el resto pasa a `detalle`
+        resto = [c or "" for c in fila[4:] if c not in (lugar, fecha_reserva)]
+        while resto and not resto[-1]:
+            resto.pop()
+        # Mismo criterio que `reserva_desde_celdas`
+        estado = (
+            ESTADO_CANCELADA
+            if any("cancelad" in c.lower() for c in resto)
+            else ESTADO_ACTIVA
+        )
+        conn.execute("INSERT OR IGNORE INTO lugares (codigo) VALUES (?)", (lugar,))
+        conn.execute(
+            """
+            INSERT INTO reservas (lugar_id, dia, franja, estado, detalle, actualizado)
+            VALUES ((SELECT id FROM lugares WHERE codigo = ?), ?, '', ?, ?, ?)
+            ON CONFLICT (lugar_id, dia, franja) DO UPDATE SET
+                estado = excluded.estado,
+                detalle = excluded.detalle,
+                actualizado = excluded.actualizado
+        """,
+            (
+                lugar,
+                date.fromisoformat(fecha_iso).toordinal(),
+                estado,
+                " | ".join(resto),
+                fecha_consulta,
+            ),
+        )
+
+    conn.execute("DROP TABLE reservaciones")
+
+
+def _migracion_hash_contenido(conn: sqlite3.Connection) -> None:
+    """v3: columna `hash` con el resumen del contenido de cada reserva."""
+    columnas = {fila[1] for fila in conn.execute("PRAGMA table_info(reservas)")}
+    if "hash" not in columnas:
+        conn.execute("ALTER TABLE reservas ADD COLUMN hash TEXT")
+    # Usa la función registrada en la conexión (misma que en Python)
+    conn.execute("UPDATE reservas SET hash = hash_reserva(estado, detalle)")
+
+
+def _sumar_ocupacion(fila: str, delta: int) -> str:
+    """Sentencia de trigger que suma `delta` al resumen de la fila `new`/`old`."""
+    return f"""
+        INSERT INTO resumen_ocupacion (lugar_id, mes, dia_semana, estado, cantidad)
+        VALUES ({fila}.lugar_id,
+                strftime('%Y-%m', {fila}.dia + {ORDINAL_A_JULIANO}),
+                ({fila}.dia - 1) % 7,
+                {fila}.estado,
+                {delta})
+        ON CONFLICT (mes, lugar_id, dia_semana, estado)
+        DO UPDATE SET cantidad = cantidad + ({delta});
+    """
+
+
+def _migracion_resumenes(conn: sqlite3.Connection) -> None:
+    """v4: tablas de resumen mantenidas de forma incremental.
+
+    - `resumen_ocupacion`: reservas por lugar × mes × día de la semana × estado,
+      actualizada por triggers en cada inserción/cambio/borrado de `reservas`
+    - `resumen_intentos`: éxitos y fallos por lugar × prioridad × día de la
+      semana, alimentada por `registrar_intentos`
+
+    `dia_semana` sigue la convención de `date.weekday()` (0 = lunes), que es
+    `(dia - 1) % 7` sobre el ordinal.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS resumen_ocupacion (
+            lugar_id INTEGER NOT NULL,
+            mes TEXT NOT NULL,
+            dia_semana INTEGER NOT NULL,
+            estado INTEGER NOT NULL,
+            cantidad INTEGER NOT NULL,
+            -- mes primero: los reportes filtran por rango de meses
+            PRIMARY KEY (mes, lugar_id, dia_semana, estado)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS resumen_intentos (
+            lugar_id INTEGER NOT NULL,
+            prioridad INTEGER NOT NULL,
+            dia_semana INTEGER NOT NULL,
+            exitos INTEGER NOT NULL DEFAULT 0,
+            fallos INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (lugar_id, prioridad, dia_semana)
+        ) WITHOUT ROWID
+    """)
+
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_reservas_resumen_insert
+        AFTER INSERT ON reservas
+        BEGIN
+            {_sumar_ocupacion("new", 1)}
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_reservas_resumen_delete
+        AFTER DELETE ON reservas
+        BEGIN
+            {_sumar_ocupacion("old", -1)}
+        END
+    """)
+    # Sólo cuando cambia algo que afecta al resumen (no en cambios de detalle)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_reservas_resumen_update
+        AFTER UPDATE OF lugar_id, dia, estado ON reservas
+        WHEN old.lugar_id IS NOT new.lugar_id
+          OR old.dia IS NOT new.dia
+          OR old.estado IS NOT new.estado
+        BEGIN
+            {_sumar_ocupacion("old", -1)}
+            {_sumar_ocupacion("new", 1)}
+        END
+    """)
+
+    # Carga inicial desde las reservas existentes
+    conn.execute("DELETE FROM resumen_ocupacion")
+    conn.execute(f"""
+        INSERT INTO resumen_ocupacion (lugar_id, mes, dia_semana, estado, cantidad)
+        SELECT lugar_id,
+               strftime('%Y-%m', dia + {ORDINAL_A_JULIANO}),
+               (dia - 1) % 7,
+               estado,
+               COUNT(*)
+        FROM reservas
+        GROUP BY 1, 2, 3, 4
+    """)
+
+
+def _fila_fts(fila: str) -> str:
+    """Valores de `reservas_fts` para la fila `new` de un trigger."""
+    return f"""
+        {fila}.id,
+        (SELECT codigo FROM lugares WHERE id = {fila}.lugar_id),
+        date({fila}.dia + {ORDINAL_A_JULIANO}),
+        {_estado_como_texto(f"{fila}.estado")},
+        {fila}.detalle,
+        {fila}.id, {fila}.dia, {fila}.franja, {fila}.actualizado
+    """
+
+
+def _migracion_texto_completo(conn: sqlite3.Connection) -> None:
+    """v5: índice FTS5 `reservas_fts` sincronizado con `reservas` por triggers.
+
+    El rowid de `reservas_fts` es el id de la reserva, así que los triggers
+    de borrado y actualización localizan su entrada sin recorrer el índice.
+    """
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS reservas_fts
+        USING fts5({_COLUMNAS_FTS}, tokenize = "{_TOKENIZADOR_FTS}")
+    """)
+    insertar = f"""
+        INSERT INTO reservas_fts
+            (rowid, lugar, fecha, estado, detalle, id, dia, franja, actualizado)
+        VALUES ({_fila_fts("new")});
+    """
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_reservas_fts_insert
+        AFTER INSERT ON reservas
+        BEGIN
+            {insertar}
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_reservas_fts_delete
+        AFTER DELETE ON reservas
+        BEGIN
+            DELETE FROM reservas_fts WHERE rowid = old.id;
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_reservas_fts_update
+        AFTER UPDATE ON reservas
+        BEGIN
+            DELETE FROM reservas_fts WHERE rowid = old.id;
+            {insertar}
+        END
+    """)
+
+    conn.execute("DELETE FROM reservas_fts")
+    conn.execute(f"""
+        INSERT INTO reservas_fts
+            (rowid, lugar, fecha, estado, detalle, id, dia, franja, actualizado)
+        SELECT id, lugar, fecha, {_estado_como_texto("estado")}, detalle,
+               id, dia, franja, actualizado
+        FROM v_reservas
+    """)
+
+
+def _migracion_usuario(conn: sqlite3.Connection) -> None:
+    """v6: columna `usuario` (dueño de cada reserva) para compartir la base.
+
+    Las reservas existentes quedan con `""`, el usuario de los scripts de
+    una sola persona. `v_reservas` se recrea para exponer la columna.
+    """
+    columnas = {fila[1] for fila in conn.execute("PRAGMA table_info(reservas)")}
+    if "usuario" not in columnas:
+        conn.execute(
+            "ALTER TABLE reservas ADD COLUMN usuario TEXT NOT NULL DEFAULT ''"
+        )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_reservas_usuario_dia ON reservas (usuario, dia)"
+    )
+    conn.execute("DROP VIEW IF EXISTS v_reservas")
+    conn.execute(f"""
+        CREATE VIEW v_reservas AS
+        SELECT r.id,
+               g.codigo AS lugar,
+               r.dia,
+               date(r.dia + {ORDINAL_A_JULIANO}) AS fecha,
+               r.franja,
+               r.estado,
+               r.detalle,
+               r.actualizado,
+               r.usuario
+        FROM reservas AS r
+        JOIN lugares AS g ON g.id = r.lugar_id
+    """)
+
+
+def _migracion_estado_cancelado(conn: sqlite3.Connection) -> None:
+    """v7: corrige el estado de las filas migradas en v2 como activas.
+
+    v2 marcaba todas las filas de `reservaciones` como activas aunque su
+    detalle dijera "Cancelada"; se les aplica el criterio de
+    `reserva_desde_celdas` (y se recalcula su hash).
+    """
+    conn.execute(
+        """
+        UPDATE reservas
+        SET estado = ?, hash = hash_reserva(?, detalle)
+        WHERE estado = ? AND lower(detalle) LIKE '%cancelad%'
+    """,
+        (ESTADO_CANCELADA, ESTADO_CANCELADA, ESTADO_ACTIVA),
+    )
+
+
+_MIGRACIONES = [
+    _migracion_fecha_iso,
+    _migracion_esquema_normalizado,
+    _migracion_hash_contenido,
+    _migracion_resumenes,
+    _migracion_texto_completo,
+    _migracion_usuario,
+    _migracion_estado_cancelado,
+]
+_VERSION_ESQUEMA_NORMALIZADO = 2
+
+
+# Usuario de la tarea actual (ver `fijar_usuario`); cada tarea de asyncio
+# hereda el de quien la creó
+_usuario_actual: ContextVar[str] = ContextVar("usuario_reservas", default="")
+
+
+def usuario_actual() -> str:
+    return _usuario_actual.get()
+
+
+def fijar_usuario(usuario: str) -> None:
+    """Fija el usuario de las reservas para la tarea actual (y las que cree).
+
+    `obtener_repositorio` y `obtener_persistencia` sin `usuario` devuelven
+    entonces las instancias de ese usuario, así que el flujo de reserva de
+    un solo usuario sirve sin cambios para varios en paralelo.
+    """
+    _usuario_actual.set(usuario)
+
+
+# Instancias compartidas por proceso (una por archivo de base de datos y usuario)
+_repositorios: dict = {}
+_repositorios_lock = threading.Lock()
+
+
+def obtener_repositorio(
+    db_name: str = DB_NAME, usuario: Optional[str] = None
+) -> RepositorioReservaciones:
+    """Devuelve el repositorio compartido para `db_name`, creándolo si hace falta.
+
+    `usuario` None significa el de la tarea actual (`usuario_actual()`).
+    """
+    if usuario is None:
+        usuario = usuario_actual()
+    with _repositorios_lock:
+        repo = _repositorios.get((db_name, usuario))
+        if repo is None:
+            repo = RepositorioReservaciones(db_name, usuario=usuario)
+            _repositorios[(db_name, usuario)] = repo
+        return repo
+
+
+def cerrar_repositorios() -> None:
+    """Cierra todas las conexiones compartidas (llamar al final de cada script)."""
+    with _repositorios_lock:
+        for repo in _repositorios.values():
+            repo.cerrar()
+        _repositorios.clear()
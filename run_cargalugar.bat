@@ -9,12 +9,18 @@ cd /d "C:\Users\lmarinaro\Documents\CargaLugar"
 if exist ".venv\Scripts\python.exe" (
     echo Activating virtual environment...
     call ".venv\Scripts\activate.bat"
+    REM If the resident daemon (demonio.py) is running, let it do the work;
+    REM exit code 3 means it is not running
+    ".venv\Scripts\python.exe" "cliente_demonio.py" %*
+    if not errorlevel 3 exit /b
     echo Running CargaLugar.py with virtual environment python
     ".venv\Scripts\python.exe" "CargaLugar.py" %*
     exit /b %ERRORLEVEL%
 ) else (
     echo Virtual environment not found at .venv\Scripts\python.exe
     echo Falling back to system Python
+    python "cliente_demonio.py" %*
+    if not errorlevel 3 exit /b
     python "CargaLugar.py" %*
     exit /b %ERRORLEVEL%
 )
@@ -0,0 +1,184 @@
+"""
+Selectores con alternativas que aprenden cuál funciona.
+
+Varias acciones de la UI prueban un selector y, si falla, otro (el combobox
+por rol y después `#fechaInicio`; el botón por rol y después
+`button:has-text(...)`). Cada intento fallido cuesta el timeout completo
+antes de pasar al siguiente. Aquí cada acción tiene una lista de
+estrategias y se recuerda cuál ganó y cuánto tardó:
+
+    BUSCAR = registrar_accion(
+        "boton_buscar",
+        Estrategia("rol", lambda r: r.get_by_role("button", name="Buscar")),
+        Estrategia("texto", lambda r: r.locator("button:has-text('Buscar')")),
+    )
+    await actuar(page, BUSCAR, lambda loc, t: loc.click(timeout=t))
+
+- La estrategia con mejor historial va primero y recibe el tope completo;
+  las demás sólo un sondeo corto (`SELECTORES_SONDEO_MS`).
+- Sin historial se sondean todas y, si ninguna responde, se da el tope
+  completo a la primera (como antes).
+- `guardar_aprendizaje()` escribe el historial en `SELECTORES_ARCHIVO` para
+  que la siguiente ejecución empiece con el orden aprendido.
+"""
+
+import json
+import os
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from playwright.async_api import Locator
+
+ARCHIVO_SELECTORES = "selectores_aprendidos.json"
+
+# Peso de la última observación en los promedios móviles
+PESO_RECIENTE = 0.3
+
+
+class Estrategia(NamedTuple):
+    """Una forma de encontrar el elemento de una acción (`raiz` es Page o Locator)."""
+
+    nombre: str
+    localizar: Callable[[Any], Locator]
+
+
+_acciones: Dict[str, Tuple[Estrategia, ...]] = {}
+# accion -> estrategia -> {"exito": promedio móvil 0..1, "ms": promedio móvil, "usos"}
+_historial: Optional[Dict[str, Dict[str, Dict[str, float]]]] = None
+_ms_alternativas_fallidas = 0.0
+
+
+def archivo_selectores() -> str:
+    return os.getenv("SELECTORES_ARCHIVO", ARCHIVO_SELECTORES)
+
+
+def sondeo_ms() -> float:
+    return float(os.getenv("SELECTORES_SONDEO_MS", "1500"))
+
+
+def registrar_accion(accion: str, *estrategias: Estrategia) -> str:
+    """Declara las estrategias de `accion` (en su orden inicial); devuelve `accion`."""
+    _acciones[accion] = estrategias
+    return accion
+
+
+def _cargar() -> Dict[str, Dict[str, Dict[str, float]]]:
+    global _historial
+    if _historial is None:
+        try:
+            with open(archivo_selectores(), encoding="utf-8") as f:
+                _historial = json.load(f)
+        except (OSError, ValueError):
+            _historial = {}
+    return _historial
+
+
+def orden_estrategias(accion: str) -> List[Estrategia]:
+    """Estrategias de `accion` de la más a la menos prometedora.
+
+    Primero la tasa de éxito reciente, después el tiempo promedio; las que
+    no tienen historial quedan en medio y conservan su orden declarado.
+    """
+    historial = _cargar().get(accion, {})
+    estrategias = _acciones[accion]
+
+    def clave(indice: int) -> Tuple[float, float, int]:
+        datos = historial.get(estrategias[indice].nombre)
+        if not datos:
+            return (-0.5, float("inf"), indice)
+        return (-datos["exito"], datos["ms"], indice)
+
+    return [estrategias[i] for i in sorted(range(len(estrategias)), key=clave)]
+
+
+def _anotar(accion: str, nombre: str, exito: bool, ms: float) -> None:
+    datos = _cargar().setdefault(accion, {}).get(nombre)
+    if datos is None:
+        datos = {"exito": float(exito), "ms": ms, "usos": 0}
+        _historial[accion][nombre] = datos
+    else:
+        datos["exito"] += PESO_RECIENTE * (float(exito) - datos["exito"])
+        if exito:
+            datos["ms"] += PESO_RECIENTE * (ms - datos["ms"])
+    datos["usos"] += 1
+
+
+async def actuar(
+    raiz: Any,
+    accion: str,
+    operacion: Callable[[Locator, float], Awaitable[Any]],
+    tope_ms: float = 30000,
+    por_estrategia: Optional[
+        Dict[str, Callable[[Locator, float], Awaitable[Any]]]
+    ] = None,
+) -> Locator:
+    """Ejecuta `operacion(locator, timeout_ms)` con la primera estrategia que funcione.
+
+    `por_estrategia` reemplaza la operación de las estrategias nombradas
+    (p.ej. un input que no necesita el clic que sí necesita el combobox).
+    Una estrategia que falla el sondeo y funciona en el reintento con el tope
+    completo cuenta sólo como éxito. Devuelve el locator que funcionó; si
+    ninguna funciona, relanza el error del último intento.
+    """
+    global _ms_alternativas_fallidas
+    orden = orden_estrategias(accion)
+    favorita = _cargar().get(accion, {}).get(orden[0].nombre)
+    conocida = bool(favorita) and favorita["exito"] > 0.5
+
+    intentos = [
+        (estrategia, tope_ms if conocida and i == 0 else sondeo_ms())
+        for i, estrategia in enumerate(orden)
+    ]
+    if not conocida:
+        # Sin una ganadora conocida, la página puede estar lenta: la primera
+        # recibe al final el tope completo
+        intentos.append((orden[0], tope_ms))
+
+    operaciones = por_estrategia or {}
+    # Fallos por estrategia; se anotan al final para no castigar a la que
+    # termina funcionando en su reintento
+    fallos: Dict[str, float] = {}
+    ultimo_error: Optional[Exception] = None
+    for estrategia, timeout in intentos:
+        locator = estrategia.localizar(raiz)
+        inicio = time.perf_counter()
+        try:
+            await operaciones.get(estrategia.nombre, operacion)(locator, timeout)
+        except Exception as e:
+            ms = (time.perf_counter() - inicio) * 1000
+            _ms_alternativas_fallidas += ms
+            fallos[estrategia.nombre] = ms
+            ultimo_error = e
+            continue
+        fallos.pop(estrategia.nombre, None)
+        for nombre, ms in fallos.items():
+            _anotar(accion, nombre, False, ms)
+        _anotar(accion, estrategia.nombre, True, (time.perf_counter() - inicio) * 1000)
+        if estrategia is not orden[0] or not conocida:
+            print(f"🧭 {accion}: se aprendió la estrategia '{estrategia.nombre}'")
+        return locator
+    for nombre, ms in fallos.items():
+        _anotar(accion, nombre, False, ms)
+    raise ultimo_error
+
+
+def guardar_aprendizaje() -> None:
+    """Escribe el historial de estrategias (escritura atómica) e imprime el costo."""
+    if _historial is None:
+        return
+    ruta = archivo_selectores()
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    fd, temporal = tempfile.mkstemp(dir=directorio, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(_historial, f, indent=2, sort_keys=True)
+        os.replace(temporal, ruta)
+    except BaseException:
+        os.unlink(temporal)
+        raise
+    if _ms_alternativas_fallidas:
+        print(
+            f"🧭 Selectores: {_ms_alternativas_fallidas / 1000:.1f} s en "
+            f"estrategias que fallaron"
+        )
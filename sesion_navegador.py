@@ -0,0 +1,301 @@
+"""
+Sesión autenticada del navegador guardada entre ejecuciones.
+
+Cada punto de entrada abría un contexto nuevo y repetía el inicio de sesión
+de la intranet (y su cadena de redirecciones) antes de la primera página
+útil. `GestorSesion` guarda el storage state de Playwright (cookies y
+localStorage) en `ARCHIVO_SESION` después de una carga exitosa y lo entrega
+al crear el contexto siguiente:
+
+    gestor = GestorSesion()
+    context = await crear_contexto(browser, **await gestor.opciones_contexto())
+    ...  # primera página cargada
+    await gestor.guardar(context, page, "#gridmisreservas")
+    gestor.refrescar_en_segundo_plano(context)
+
+La validación al arrancar es barata: primero la expiración de las cookies
+en el archivo y después una sola petición HTTP sin navegador (ver
+`cliente_http`). Mientras el navegador está abierto, una tarea visita el
+sitio antes de que expiren las cookies y vuelve a guardar el estado; entre
+ejecuciones, `python sesion_navegador.py` hace lo mismo por HTTP (p.ej.
+desde una tarea programada).
+"""
+
+import asyncio
+import calendar
+import json
+import os
+import sys
+import tempfile
+import time
+from http.cookies import CookieError, SimpleCookie
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+from playwright.async_api import BrowserContext, Page
+
+from cliente_http import (
+    RUTA_CONSULTA,
+    ClienteIntranet,
+    ConsultaHttpFallida,
+    SesionExpirada,
+    archivo_sesion,
+    cookies_de_sesion,
+    parece_login,
+    url_intranet,
+)
+from perfil_navegador import es_contexto_prestado
+
+# Se refresca la sesión este tiempo antes de que expire la primera cookie
+MARGEN_REFRESCO_S = 10 * 60
+# Si todas las cookies son de sesión (sin fecha), se visita el sitio con
+# esta frecuencia para mantener viva la expiración deslizante del servidor
+INTERVALO_REFRESCO_S = 30 * 60
+
+
+def _es_del_host(cookie: Dict[str, Any], host: str) -> bool:
+    dominio = cookie.get("domain", "").lstrip(".")
+    return host == dominio or host.endswith("." + dominio)
+
+
+def _formato_duracion(segundos: float) -> str:
+    if segundos >= 3600:
+        return f"{segundos / 3600:.1f} h"
+    return f"{segundos / 60:.0f} min"
+
+
+class GestorSesion:
+    """Guarda, valida y mantiene fresco el storage state de Playwright."""
+
+    def __init__(self, ruta: Optional[str] = None) -> None:
+        self.ruta = ruta or archivo_sesion()
+        self.host = urlsplit(url_intranet()).hostname or ""
+        self._tarea: Optional[asyncio.Task] = None
+
+    def _leer(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.ruta, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _escribir(self, estado: Dict[str, Any]) -> None:
+        # Escritura atómica y sólo legible por el usuario: contiene cookies
+        directorio = os.path.dirname(os.path.abspath(self.ruta))
+        fd, temporal = tempfile.mkstemp(dir=directorio, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(estado, f)
+            os.chmod(temporal, 0o600)
+            os.replace(temporal, self.ruta)
+        except BaseException:
+            os.unlink(temporal)
+            raise
+
+    def expira_en(self) -> Optional[float]:
+        """Segundos hasta que expire la primera cookie con fecha del sitio (o None)."""
+        estado = self._leer() or {}
+        ahora = time.time()
+        expiraciones = [
+            c["expires"] - ahora
+            for c in estado.get("cookies", [])
+            if (c.get("expires") or -1) > ahora and _es_del_host(c, self.host)
+        ]
+        return min(expiraciones) if expiraciones else None
+
+    # ----------------------------------------------------------------
+    # Validación
+    # ----------------------------------------------------------------
+
+    def es_valida(self) -> bool:
+        """True si hay cookies vigentes y el sitio las acepta.
+
+        Un 200 con la página de inicio de sesión (SSO) no cuenta como
+        válida. Si el sitio no responde (red caída, VPN) o la respuesta está
+        malformada se confía en las fechas de expiración: el navegador pedirá
+        login si de verdad hiciera falta.
+        """
+        try:
+            cookies = cookies_de_sesion(self.ruta, self.host)
+        except SesionExpirada:
+            return False
+        try:
+            with ClienteIntranet(cookies, timeout=5.0) as cliente:
+                estado, _, datos = cliente.solicitar("GET", RUTA_CONSULTA)
+        except (OSError, ConsultaHttpFallida):
+            return True
+        return estado < 300 and not parece_login(
+            datos.decode("utf-8", errors="replace")
+        )
+
+    async def opciones_contexto(self) -> Dict[str, Any]:
+        """Opciones para `new_context`: `storage_state` si la sesión guardada sirve."""
+        inicio = time.perf_counter()
+        try:
+            valida = await asyncio.to_thread(self.es_valida)
+        except Exception as e:
+            print(f"⚠️ No se pudo validar la sesión guardada: {e}")
+            valida = False
+        ms = (time.perf_counter() - inicio) * 1000
+        if not valida:
+            print(f"🔐 Sin sesión guardada válida ({ms:.0f} ms); habrá que iniciar sesión")
+            return {}
+        restante = self.expira_en()
+        vigencia = f", expira en {_formato_duracion(restante)}" if restante else ""
+        print(f"🔑 Reutilizando sesión guardada ({ms:.0f} ms{vigencia})")
+        return {"storage_state": self.ruta}
+
+    # ----------------------------------------------------------------
+    # Guardado y refresco
+    # ----------------------------------------------------------------
+
+    async def sesion_iniciada(self, pagina: Page, selector: str) -> bool:
+        """True si `pagina` muestra `selector`, que sólo existe con sesión iniciada.
+
+        Evita guardar el estado de la página de inicio de sesión, que
+        también carga con 200.
+        """
+        try:
+            if await pagina.locator("input[type='password']").count():
+                return False
+            return await pagina.locator(selector).count() > 0
+        except Exception:
+            return False
+
+    async def guardar(
+        self,
+        contexto: BrowserContext,
+        pagina: Optional[Page] = None,
+        selector: str = "",
+    ) -> bool:
+        """Guarda cookies y localStorage del contexto; devuelve si se guardó.
+
+        Con `pagina` y `selector` sólo se guarda si la página muestra ese
+        elemento, que sólo aparece con la sesión iniciada.
+        """
+        if pagina is not None and not await self.sesion_iniciada(pagina, selector):
+            print("⚠️ La página no muestra la sesión iniciada; no se guarda la sesión")
+            return False
+        try:
+            estado = await contexto.storage_state()
+            if es_contexto_prestado(contexto):
+                # Navegador del usuario (CDP): guardar sólo lo de la intranet,
+                # no las cookies del resto de su navegación
+                estado = {
+                    "cookies": [
+                        c for c in estado["cookies"] if _es_del_host(c, self.host)
+                    ],
+                    "origins": [
+                        o for o in estado["origins"] if self.host in o["origin"]
+                    ],
+                }
+            await asyncio.to_thread(self._escribir, estado)
+        except Exception as e:
+            print(f"⚠️ No se pudo guardar la sesión: {e}")
+            return False
+        return True
+
+    def refrescar_en_segundo_plano(self, contexto: BrowserContext) -> None:
+        """Visita el sitio antes de que expire la sesión y guarda el estado renovado.
+
+        La tarea termina sola al cerrarse el contexto.
+        """
+        if self._tarea is None or self._tarea.done():
+            self._tarea = asyncio.ensure_future(self._ciclo_refresco(contexto))
+            contexto.on("close", lambda _contexto: self.detener())
+
+    def detener(self) -> None:
+        if self._tarea is not None:
+            self._tarea.cancel()
+            self._tarea = None
+
+    async def _ciclo_refresco(self, contexto: BrowserContext) -> None:
+        while True:
+            restante = self.expira_en()
+            espera = (
+                INTERVALO_REFRESCO_S
+                if restante is None
+                else min(INTERVALO_REFRESCO_S, restante - MARGEN_REFRESCO_S)
+            )
+            await asyncio.sleep(max(espera, 60))
+            try:
+                # La petición usa el cookie jar del contexto y lo actualiza
+                # con lo que renueve el servidor
+                respuesta = await contexto.request.get(
+                    url_intranet() + RUTA_CONSULTA, ignore_https_errors=True
+                )
+                vigente = (
+                    respuesta.ok
+                    and urlsplit(respuesta.url).hostname == self.host
+                    and not parece_login(await respuesta.text())
+                )
+            except Exception as e:
+                print(f"⚠️ No se pudo refrescar la sesión: {e}")
+                continue
+            if not vigente:
+                # No se sobrescribe la sesión guardada con la del login
+                print("⚠️ El sitio pidió iniciar sesión; no se refrescó la sesión")
+                continue
+            if await self.guardar(contexto):
+                print("🔄 Sesión refrescada")
+
+    def refrescar_por_http(self) -> bool:
+        """Refresca la sesión guardada sin navegador y actualiza el archivo.
+
+        Aplica al storage state las cookies que el sitio renueve (valor y
+        expiración). Devuelve False si la sesión ya no es válida.
+        """
+        estado = self._leer()
+        try:
+            cookies = cookies_de_sesion(self.ruta, self.host)
+        except SesionExpirada:
+            return False
+        try:
+            with ClienteIntranet(cookies) as cliente:
+                codigo, _, datos = cliente.solicitar("GET", RUTA_CONSULTA)
+                recibidas = list(cliente.set_cookie)
+        except (OSError, ConsultaHttpFallida) as e:
+            print(f"⚠️ No se pudo contactar al sitio: {e}")
+            return False
+        texto = datos.decode("utf-8", errors="replace")
+        if codigo >= 300 or parece_login(texto):
+            return False
+
+        por_nombre = {c["name"]: c for c in estado.get("cookies", [])}
+        for cabecera in recibidas:
+            try:
+                galleta = SimpleCookie(cabecera)
+            except CookieError:
+                continue
+            # SimpleCookie no valida el dominio: sólo se actualizan las que ya
+            # estaban guardadas para este sitio
+            for nombre, morsel in galleta.items():
+                cookie = por_nombre.get(nombre)
+                if cookie is None or not _es_del_host(cookie, self.host):
+                    continue
+                cookie["value"] = morsel.value
+                try:
+                    if morsel["max-age"]:
+                        cookie["expires"] = time.time() + int(morsel["max-age"])
+                    elif morsel["expires"]:
+                        cookie["expires"] = calendar.timegm(
+                            time.strptime(
+                                morsel["expires"], "%a, %d %b %Y %H:%M:%S GMT"
+                            )
+                        )
+                except (ValueError, OverflowError):
+                    # Expiración ilegible: se conserva la que ya estaba guardada
+                    pass
+        self._escribir(estado)
+        return True
+
+
+if __name__ == "__main__":
+    gestor = GestorSesion()
+    if gestor.refrescar_por_http():
+        restante = gestor.expira_en()
+        vigencia = f" (expira en {_formato_duracion(restante)})" if restante else ""
+        print(f"🔄 Sesión refrescada{vigencia}")
+    else:
+        print("🔐 La sesión guardada no es válida; ejecuta un script con navegador")
+        sys.exit(1)